@@ -1,7 +1,10 @@
-def compliance_agent(context: str, legal_result: dict, finance_result: dict):
-    compliance_risks = [
-        "Regulatory references are incomplete"
-    ]
+from app.services.rule_engine import hits_for, findings, risks, evidence
+
+
+def compliance_agent(context, legal_result: dict, finance_result: dict):
+    hits = hits_for("compliance", context)
+    checks = findings(hits) or ["Regulatory references are incomplete"]
+    compliance_risks = risks(hits)
 
     # 🔗 Multi-turn dependency
     if any("payment" in r.lower() for r in finance_result["financial_risks"]):
@@ -13,5 +16,7 @@ def compliance_agent(context: str, legal_result: dict, finance_result: dict):
             "legal": legal_result["key_findings"],
             "finance": finance_result["financial_risks"]
         },
-        "checks_performed": compliance_risks
+        "checks_performed": checks,
+        "compliance_risks": compliance_risks,
+        "clauses": evidence(hits)
     }
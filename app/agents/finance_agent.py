@@ -1,14 +1,18 @@
-def finance_agent(context: str, legal_result: dict):
-    risks = [
-        "Delayed payments may affect cash flow"
-    ]
+from app.services.rule_engine import hits_for, findings, risks, evidence
+
+
+def finance_agent(context, legal_result: dict):
+    hits = hits_for("finance", context)
+    risks_found = risks(hits)
 
     # 🔗 Multi-turn dependency
-    if "Identified termination clauses" in legal_result["key_findings"]:
-        risks.append("Termination may trigger penalty or settlement costs")
+    if "termination" in legal_result.get("categories", []):
+        risks_found.append("Termination may trigger penalty or settlement costs")
 
     return {
         "agent": "Finance",
         "used_legal_findings": legal_result["key_findings"],
-        "financial_risks": risks
+        "key_terms": findings(hits),
+        "financial_risks": risks_found,
+        "clauses": evidence(hits)
     }
@@ -1,13 +1,12 @@
-def legal_agent(context: str):
+from app.services.rule_engine import hits_for, findings, risks, categories, evidence
+
+
+def legal_agent(context):
+    hits = hits_for("legal", context)
     return {
         "agent": "Legal",
-        "key_findings": [
-            "Identified termination clauses",
-            "Reviewed contractual obligations",
-            "Checked governing law"
-        ],
-        "risks": [
-            "Early termination risk",
-            "Unclear liability scope"
-        ]
+        "key_findings": findings(hits) or ["No termination, liability or governing law clauses matched"],
+        "risks": risks(hits),
+        "categories": categories(hits),
+        "clauses": evidence(hits)
     }
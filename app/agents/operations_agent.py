@@ -1,12 +1,14 @@
+from app.services.rule_engine import hits_for, findings, risks, evidence
+
+
 def operations_agent(
-    context: str,
+    context,
     legal_result: dict,
     finance_result: dict,
     compliance_result: dict
 ):
-    operational_risks = [
-        "Service delivery depends on payment timelines"
-    ]
+    hits = hits_for("operations", context)
+    operational_risks = risks(hits)
 
     # 🔗 Multi-turn dependency
     if "Early termination risk" in legal_result["risks"]:
@@ -19,5 +21,7 @@ def operations_agent(
             "finance": finance_result["financial_risks"],
             "compliance": compliance_result["checks_performed"]
         },
-        "optimization_suggestions": operational_risks
+        "optimization_suggestions": findings(hits),
+        "operational_risks": operational_risks,
+        "clauses": evidence(hits)
     }
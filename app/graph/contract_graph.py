@@ -1,10 +1,214 @@
-from langgraph.graph import StateGraph
+import asyncio
+import hashlib
+import json
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List
 
-def planner(state):
-    return state
+from app.agents.legal_agent import legal_agent
+from app.agents.finance_agent import finance_agent
+from app.agents.compliance_agent import compliance_agent
+from app.agents.operations_agent import operations_agent
+from app.services.agent_memory import store_agent_result
+from app.services.analysis_cache import get_analysis_cache
+from app.services.rule_engine import get_ruleset
+from app.services.telemetry import span
+from app.services.admission import run_cpu, run_io
 
-graph = StateGraph(dict)
-graph.add_node("planner", planner)
-graph.set_entry_point("planner")
 
-contract_graph = graph.compile()
+@dataclass
+class AgentNode:
+    """
+    One agent in the analysis graph. `deps` lists the upstream agents
+    whose results are passed to `fn` (in order) after the context.
+    """
+    name: str
+    fn: Callable
+    deps: List[str] = field(default_factory=list)
+    # Bump when the agent's logic changes to invalidate its cached results
+    version: str = "1"
+
+
+class ContractGraph:
+    """
+    Dependency-aware executor for the agent chain. Every node is started
+    as soon as all of its dependencies have finished, so independent
+    agents run concurrently. Agent results are persisted to the vector
+    store as fire-and-forget tasks that never block downstream agents.
+
+    Results are cached per doc_id under a fingerprint of the agent's
+    version and the fingerprints of everything upstream of it, so bumping
+    one agent's version re-runs only that agent and its dependents.
+    `salt` is folded into every fingerprint (the rule set's, so editing
+    the rules re-runs every agent).
+
+    Each cached result also records the document version it was computed
+    for and fingerprints of the agent's context and upstream results.
+    After a new version of the document is indexed, an agent whose
+    context and inputs are unchanged is reused instead of re-run, so an
+    amendment only re-runs the agents its changed clauses reach.
+    """
+
+    def __init__(self, nodes: List[AgentNode], salt: str = ""):
+        self.nodes = {node.name: node for node in nodes}
+        self.salt = salt
+        self._validate()
+        self._background = set()
+        self.fingerprints = {}
+        for name in self.nodes:
+            self._fingerprint(name)
+
+    def _fingerprint(self, name: str) -> str:
+        if name not in self.fingerprints:
+            node = self.nodes[name]
+            parts = [node.name, node.version, self.salt] + [self._fingerprint(dep) for dep in node.deps]
+            self.fingerprints[name] = hashlib.sha256("|".join(parts).encode()).hexdigest()[:16]
+        return self.fingerprints[name]
+
+    def cache_key(self, name: str) -> str:
+        return f"{name}-{self.fingerprints[name]}"
+
+    def _lookup(self, doc_id: str) -> Dict:
+        cache = get_analysis_cache()
+        found = {}
+        for name in self.nodes:
+            entry = cache.get(doc_id, self.cache_key(name))
+            # Entries from before versioning carry no fingerprints
+            if isinstance(entry, dict) and "doc_version" in entry and "result" in entry:
+                found[name] = entry
+        return found
+
+    @staticmethod
+    def _digest(value) -> str:
+        return hashlib.sha256(json.dumps(value, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+    @classmethod
+    def context_fingerprint(cls, context) -> str:
+        """
+        What an agent's output depends on in its context: the rule hits
+        when it has them (ignoring character offsets, which move whenever
+        earlier text changes), otherwise the retrieved text.
+        """
+        if isinstance(context, dict):
+            if context.get("hits") is not None:
+                return cls._digest([
+                    (hit["rule"], hit.get("page"), hit.get("match"), hit.get("clause")) for hit in context["hits"]
+                ])
+            context = context.get("text", "")
+        return cls._digest(context or "")
+
+    def _validate(self):
+        # Reject unknown dependencies and cycles up front
+        state = {}
+
+        def visit(name, path):
+            if name not in self.nodes:
+                raise ValueError(f"Unknown dependency '{name}' in {' -> '.join(path)}")
+            if state.get(name) == "done":
+                return
+            if state.get(name) == "visiting":
+                raise ValueError(f"Cycle detected: {' -> '.join(path + [name])}")
+            state[name] = "visiting"
+            for dep in self.nodes[name].deps:
+                visit(dep, path + [name])
+            state[name] = "done"
+
+        for name in self.nodes:
+            visit(name, [])
+
+    def _persist(self, doc_id: str, name: str, result: dict):
+        task = asyncio.create_task(run_io(store_agent_result, doc_id, name, result))
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def iter_results(self, doc_id: str, context, persist: bool = True, use_cache: bool = True,
+                           timings: Dict = None, doc_version: int = None):
+        """
+        Execute every node, yielding (name, result) in node order as soon
+        as each result is available, so callers can act on early agents
+        while later ones are still running. `context` is one context
+        shared by all agents, a dict of per-agent contexts keyed by node
+        name, or a zero-argument callable returning either. A context is
+        the retrieved text, or {"text": ..., "hits": ...} carrying the
+        agent's rule hits from the ingest scan. A callable is only
+        invoked if some agent has no result for `doc_version` cached.
+        Per-node timings go into `timings`: milliseconds relative to the
+        start of the run, so the critical path can be read straight off
+        the start/end values. Nodes whose result was carried over from
+        an earlier version are marked "reused".
+        """
+        started = time.perf_counter()
+        tasks: Dict[str, asyncio.Task] = {}
+        timings = {} if timings is None else timings
+
+        cached = await run_io(self._lookup, doc_id) if use_cache else {}
+        current = {name for name, entry in cached.items() if entry["doc_version"] == doc_version}
+        if callable(context) and len(current) < len(self.nodes):
+            context = await run_io(context)
+
+        async def run_node(node: AgentNode):
+            if node.name in current:
+                timings[node.name] = {"cached": True, "deps": node.deps}
+                return cached[node.name]["result"]
+
+            upstream = [await tasks[dep] for dep in node.deps]
+            node_context = context.get(node.name, "") if isinstance(context, dict) else context
+            entry = {
+                "doc_version": doc_version,
+                "context_fingerprint": self.context_fingerprint(node_context),
+                "inputs_fingerprint": self._digest(upstream)
+            }
+            previous = cached.get(node.name)
+            if previous is not None and all(previous.get(k) == entry[k] for k in
+                                            ("context_fingerprint", "inputs_fingerprint")):
+                # Same clauses and same upstream results as the last version
+                timings[node.name] = {"cached": True, "reused": True, "deps": node.deps}
+                entry["result"] = previous["result"]
+                await run_io(get_analysis_cache().put, doc_id, self.cache_key(node.name), entry)
+                return previous["result"]
+
+            t0 = time.perf_counter()
+            with span(f"agent.{node.name}"):
+                result = await run_cpu(node.fn, node_context, *upstream)
+            t1 = time.perf_counter()
+            timings[node.name] = {
+                "start_ms": round((t0 - started) * 1000, 2),
+                "end_ms": round((t1 - started) * 1000, 2),
+                "duration_ms": round((t1 - t0) * 1000, 2),
+                "deps": node.deps
+            }
+            if use_cache:
+                entry["result"] = result
+                await run_io(get_analysis_cache().put, doc_id, self.cache_key(node.name), entry)
+            if persist:
+                self._persist(doc_id, node.name, result)
+            return result
+
+        for node in self.nodes.values():
+            tasks[node.name] = asyncio.create_task(run_node(node))
+
+        for name, task in tasks.items():
+            yield name, await task
+
+        timings["total_ms"] = round((time.perf_counter() - started) * 1000, 2)
+
+    async def run(self, doc_id: str, context, persist: bool = True, use_cache: bool = True,
+                  doc_version: int = None) -> Dict:
+        """
+        Execute every node and return {"results": {...}, "timings": {...}};
+        see iter_results for `context` and `doc_version`.
+        """
+        timings: Dict[str, Dict] = {}
+        results = {}
+        async for name, result in self.iter_results(doc_id, context, persist, use_cache, timings, doc_version):
+            results[name] = result
+        return {"results": results, "timings": timings}
+
+AGENT_NODES = [
+    AgentNode("legal", legal_agent, version="3"),
+    AgentNode("finance", finance_agent, deps=["legal"], version="3"),
+    AgentNode("compliance", compliance_agent, deps=["legal", "finance"], version="3"),
+    AgentNode("operations", operations_agent, deps=["legal", "finance", "compliance"], version="3"),
+]
+
+contract_graph = ContractGraph(AGENT_NODES, salt=get_ruleset().fingerprint)
@@ -1,24 +1,55 @@
-from fastapi import FastAPI, UploadFile, BackgroundTasks
+from fastapi import FastAPI, UploadFile, Request, Response, HTTPException, Depends
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, PlainTextResponse
+from pydantic import BaseModel
 from typing import List, Optional
+import os
 import asyncio
+import datetime
 import uuid
+import numpy as np
 
-from app.services.parser import parse_pdf
-from app.services.classifier import classify_contract
-from app.services.embeddings import store_embeddings
-from app.services.retriever import retrieve_context
-from app.services.report_generator import generate_report
+from app.services.retriever import retrieve_agent_contexts
+from app.services.rule_engine import get_rule_hits
+from app.services.corpus_index import get_corpus_index
+from app.services.embeddings import encode_texts
+from app.services.text_store import get_text_store
+from app.services.report_generator import (
+    generate_report, compile_template, ReportRenderer, REPORT_FORMATS, REPORT_MEDIA_TYPES
+)
+from app.services.batch_scheduler import (
+    iter_batch_results, to_ndjson, to_sse, DocumentNotFound, BATCH_CONCURRENCY, BATCH_DOC_TIMEOUT, STREAM_FORMATS
+)
 
-from app.agents.legal_agent import legal_agent
-from app.agents.finance_agent import finance_agent
-from app.agents.compliance_agent import compliance_agent
-from app.agents.operations_agent import operations_agent
-from app.services.agent_memory import store_agent_result
-from app.services.history_manager import add_action, get_history
+from app.graph.contract_graph import contract_graph
+from app.services.analysis_cache import get_analysis_cache
+from app.services.history_manager import add_action, get_history, pending_writes
+from app.services.embedding_worker import get_embedding_worker
+from app.services.upsert_writer import get_upsert_writer
+from app.services.content_cache import (
+    hash_upload, lookup_document, cache_stats, document_exists, get_document_version, list_document_versions
+)
+from app.services.pipeline import save_upload, ingest_upload, discard_upload
+from app.services.job_queue import (
+    submit_job, get_job, wait_for_stage, wait_for_doc, pending_jobs_for_doc,
+    register_handler, start_workers, queue_depth, JobDeferred
+)
+from app.services.warmup import warm_up, readiness, is_warming, READY_GATE
+from app.services.cluster import CLUSTER_ROUTED
+from app.services.admission import AdmissionMiddleware, get_admission, charge, run_cpu, run_io
+from app.services.telemetry import (
+    TelemetryMiddleware, render_metrics, get_trace, span, Gauge, Counter
+)
 
 app = FastAPI(title="ClauseSense AI")
 
+# Interactive /upload jobs jump ahead of bulk /jobs/upload submissions
+INTERACTIVE_PRIORITY = 10
+# How long /upload waits for classification before answering "processing"
+UPLOAD_RESPONSE_TIMEOUT = float(os.getenv("UPLOAD_RESPONSE_TIMEOUT", "120"))
+# How long /analyze waits for a document's indexing job to finish
+ANALYZE_INDEX_TIMEOUT = float(os.getenv("ANALYZE_INDEX_TIMEOUT", "60"))
+
 # CORS configuration
 app.add_middleware(
     CORSMiddleware,
@@ -26,7 +57,40 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Trace-Id", "Server-Timing"],
 )
+# Telemetry wraps admission, so shed requests are traced and counted too
+app.add_middleware(AdmissionMiddleware)
+app.add_middleware(TelemetryMiddleware)
+
+# Scrape-time views of the counters each service already keeps
+Gauge("clausesense_job_queue_depth", "Jobs by status",
+      ["status"], callback=lambda: {(status,): n for status, n in queue_depth().items()})
+Gauge("clausesense_embedding_queue_depth", "Encode requests waiting for the embedding worker",
+      callback=lambda: {(): get_embedding_worker().stats()["queue_depth"]})
+Gauge("clausesense_embedding_avg_batch_size", "Average texts per embedding batch",
+      callback=lambda: {(): get_embedding_worker().stats()["avg_batch_size"]})
+Gauge("clausesense_history_pending_writes", "Activity log entries waiting to be written",
+      callback=lambda: {(): pending_writes()})
+
+def _cache_lookups():
+    stats = cache_stats()
+    return {
+        (kind, result): stats[f"{kind}_{result}s"]
+        for kind in ("document", "embedding") for result in ("hit", "miss")
+    }
+
+def _cache_hit_rates():
+    stats = cache_stats()
+    return {
+        ("document",): stats["document_hit_rate"],
+        ("embedding",): stats["embedding_hit_rate"],
+        ("analysis",): get_analysis_cache().stats()["hit_rate"]
+    }
+
+Counter("clausesense_content_cache_lookups_total", "Content cache lookups by kind and result",
+        ["kind", "result"], callback=_cache_lookups)
+Gauge("clausesense_cache_hit_rate", "Hit rate of each cache since startup", ["cache"], callback=_cache_hit_rates)
 
 @app.on_event("startup")
 async def startup_event():
@@ -37,114 +101,434 @@ async def startup_event():
     print("Initializing ClauseSense AI Backend...")
     
     async def load_models():
-        from app.services.embeddings import get_model
-        from app.services.classifier import get_classifier
-        
         try:
-            # We call these to trigger the lazy loading
-            await asyncio.to_thread(get_model)
-            await asyncio.to_thread(get_classifier)
+            # Models, vector store and the per-agent query embeddings.
+            # Anything a preloading parent already loaded is reused as is;
+            # /ready reports progress per component.
+            await asyncio.to_thread(warm_up)
             print("Successfully initialized AI models.")
         except Exception as e:
             print(f"Non-critical error during model warm-up: {e}")
     
     asyncio.create_task(load_models())
+    start_workers()
+
+async def require_warm():
+    """
+    Fail fast with 503 while models are still loading rather than
+    holding the request until the lazy loaders finish.
+    """
+    if READY_GATE and is_warming():
+        raise HTTPException(status_code=503, detail="Models are still loading", headers={"Retry-After": "5"})
+
+@app.get("/ready")
+async def ready(response: Response):
+    """
+    Readiness probe: per-component warm-up status, cold-start time and
+    this worker's memory. 503 until every required component is loaded.
+    """
+    status = await asyncio.to_thread(readiness)
+    if not status["ready"]:
+        response.status_code = 503
+    return status
 
 @app.get("/")
 async def root():
     return {"status": "online", "name": "ClauseSense AI API"}
 
-@app.post("/upload")
-async def upload_contract(file: UploadFile, background_tasks: BackgroundTasks):
-    # Get text from PDF
-    text = await asyncio.to_thread(parse_pdf, file)
-    
-    # Run classification on the first few pages/paragraphs
-    classification = await asyncio.to_thread(classify_contract, text[:2000])
+async def _submit_upload(file: UploadFile, priority: int, parent_doc_id: Optional[str] = None,
+                         doc_id: Optional[str] = None):
+    """
+    Dedup by content hash, otherwise spool the file and queue an ingest
+    job. With `parent_doc_id` the file is a new version of that document
+    and is indexed under the same doc_id. `doc_id` is the id a cluster
+    router assigned to a new document. Returns (existing document or
+    None, job_id, doc_id, version).
+    """
+    if doc_id is not None and not CLUSTER_ROUTED:
+        raise HTTPException(status_code=400, detail="doc_id is only accepted from a cluster router")
+    version = 1
+    if parent_doc_id is not None:
+        if not await run_io(document_exists, parent_doc_id):
+            raise HTTPException(status_code=404, detail="Parent document not found")
+        if await run_io(pending_jobs_for_doc, parent_doc_id, "upload"):
+            raise HTTPException(status_code=409, detail="A version of this document is still being indexed")
+        # Documents indexed before versioning count as version 1
+        version = (await run_io(get_document_version, parent_doc_id) or 1) + 1
 
-    doc_id = str(uuid.uuid4())
-    
-    # Process embeddings in background
-    background_tasks.add_task(store_embeddings, text, doc_id)
+    # Identical files map to the same doc_id, classification and vectors
+    file_hash = await run_io(hash_upload, file.file)
+    existing = await run_io(lookup_document, file_hash)
+    if existing is not None and parent_doc_id in (None, existing["doc_id"]):
+        add_action("UPLOAD", {
+            "filename": file.filename,
+            "doc_id": existing["doc_id"],
+            "classification": existing["classification"],
+            "deduplicated": True
+        })
+        current = await run_io(get_document_version, existing["doc_id"])
+        return existing, None, existing["doc_id"], current or 1
 
-    add_action("UPLOAD", {
-        "filename": file.filename,
-        "doc_id": doc_id,
-        "classification": classification
-    })
+    doc_id = parent_doc_id or doc_id or str(uuid.uuid4())
+    path = await run_io(save_upload, file)
+    job_id = await run_io(
+        submit_job,
+        "upload",
+        {"path": path, "filename": file.filename, "file_hash": file_hash, "version": version},
+        doc_id,
+        priority
+    )
+    return None, job_id, doc_id, version
+
+@app.post("/upload", dependencies=[Depends(require_warm)])
+async def upload_contract(file: UploadFile, parent_doc_id: Optional[str] = None, doc_id: Optional[str] = None):
+    """
+    Upload a contract. Pass `parent_doc_id` to upload an amended version
+    of an existing document: it keeps its doc_id, only changed chunks are
+    re-embedded, and the next analysis re-runs only the affected agents.
+    """
+    existing, job_id, doc_id, version = await _submit_upload(file, INTERACTIVE_PRIORITY, parent_doc_id, doc_id)
+    if existing is not None:
+        return {
+            "status": "success",
+            "doc_id": doc_id,
+            "version": version,
+            "classification": existing["classification"],
+            "preview": existing["preview"],
+            "deduplicated": True
+        }
+
+    # Respond once the document is classified; embedding carries on in
+    # the job and /analyze waits for it
+    job = await wait_for_stage(job_id, "classified", UPLOAD_RESPONSE_TIMEOUT)
+    if job["status"] == "failed":
+        raise HTTPException(status_code=500, detail=f"Upload processing failed: {job['error']}")
+    if "classified" not in job["stages"]:
+        return {"status": "processing", "doc_id": doc_id, "version": version, "job_id": job_id}
 
     return {
         "status": "success",
         "doc_id": doc_id,
-        "classification": classification,
-        "preview": text[:500]
+        "version": version,
+        "job_id": job_id,
+        "classification": job["result"]["classification"],
+        "preview": job["result"]["preview"]
     }
 
-@app.post("/analyze")
-async def analyze_contract(
+@app.post("/jobs/upload")
+async def submit_upload_job(file: UploadFile, priority: int = 0, parent_doc_id: Optional[str] = None,
+                            doc_id: Optional[str] = None):
+    existing, job_id, doc_id, version = await _submit_upload(file, priority, parent_doc_id, doc_id)
+    if existing is not None:
+        return {"status": "succeeded", "doc_id": doc_id, "version": version, "job_id": None, "deduplicated": True}
+    return {"status": "queued", "doc_id": doc_id, "version": version, "job_id": job_id}
+
+@app.get("/documents/{doc_id}/versions")
+async def document_versions(doc_id: str):
+    versions = await asyncio.to_thread(list_document_versions, doc_id)
+    if not versions and not await asyncio.to_thread(document_exists, doc_id):
+        raise HTTPException(status_code=404, detail="Document not found")
+    return {"doc_id": doc_id, "versions": versions}
+
+@app.post("/jobs/analyze")
+async def submit_analyze_job(
     doc_id: str,
     tone: str = "formal",
     focus: str = "full",
-    structure: str = "structured"
+    structure: str = "structured",
+    format: str = "text",
+    priority: int = 0
 ):
-    # Fetch relevant chunks from vector store
-    context = await asyncio.to_thread(retrieve_context, doc_id)
+    if format not in REPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(REPORT_FORMATS)}")
+    if not await run_io(document_exists, doc_id) and not await run_io(pending_jobs_for_doc, doc_id, "upload"):
+        raise HTTPException(status_code=404, detail="Document not found")
+    job_id = await run_io(
+        submit_job,
+        "analyze",
+        {"tone": tone, "focus": focus, "structure": structure, "format": format},
+        doc_id,
+        priority
+    )
+    return {"status": "queued", "doc_id": doc_id, "job_id": job_id}
 
-    # Sequence of specialized agents
-    # Legal analyzes first
-    legal = await asyncio.to_thread(legal_agent, context)
-    await asyncio.to_thread(store_agent_result, doc_id, "legal", legal)
+@app.get("/jobs/{job_id}")
+async def fetch_job(job_id: str):
+    job = await asyncio.to_thread(get_job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    job.pop("payload", None)
+    return job
 
-    # Finance builds on legal
-    finance = await asyncio.to_thread(finance_agent, context, legal)
-    await asyncio.to_thread(store_agent_result, doc_id, "finance", finance)
+def _agent_contexts(doc_id: str, version: int = None) -> dict:
+    # Retrieved text per agent plus the clause hits routed to it at ingest
+    texts = retrieve_agent_contexts(doc_id)
+    routed = get_rule_hits(doc_id, version)
+    return {
+        name: {"text": texts.get(name, ""), "hits": None if routed is None else routed.get(name, [])}
+        for name in contract_graph.nodes
+    }
 
-    # Compliance checks both
-    compliance = await asyncio.to_thread(compliance_agent, context, legal, finance)
-    await asyncio.to_thread(store_agent_result, doc_id, "compliance", compliance)
+@app.post("/analyze", dependencies=[Depends(require_warm)])
+async def analyze_contract(
+    doc_id: str,
+    tone: str = "formal",
+    focus: str = "full",
+    structure: str = "structured",
+    format: str = "text",
+    stream: bool = False
+):
+    """
+    Run the agents and compile the report. `format` picks the report
+    format (text, markdown, html or json). With stream=true the response
+    is just the report, sent section by section as each agent finishes.
+    """
+    if format not in REPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(REPORT_FORMATS)}")
 
-    # Operations looks at the whole picture
-    operations = await asyncio.to_thread(operations_agent, context, legal, finance, compliance)
-    await asyncio.to_thread(store_agent_result, doc_id, "operations", operations)
+    # Don't analyze a half-indexed document
+    indexing = await wait_for_doc(doc_id, "upload", ANALYZE_INDEX_TIMEOUT)
+    if indexing is not None and indexing["status"] in ("queued", "running"):
+        raise HTTPException(
+            status_code=503,
+            detail="Document is still being indexed",
+            headers={"Retry-After": "5"}
+        )
+    if indexing is not None and indexing["status"] == "failed":
+        raise HTTPException(status_code=409, detail=f"Document indexing failed: {indexing['error']}")
+    doc_version = await run_io(get_document_version, doc_id)
+    # Unknown ids would otherwise get (and cache) an analysis of nothing
+    if doc_version is None and not await run_io(document_exists, doc_id):
+        raise HTTPException(status_code=404, detail="Document not found")
 
-    # Compile the final report
-    report = generate_report(
-        legal=legal,
-        finance=finance,
-        compliance=compliance,
-        operations=operations,
-        tone=tone,
-        focus=focus,
-        structure=structure
-    )
-
-    add_action("ANALYZE", {
+    history_details = {
         "doc_id": doc_id,
+        "version": doc_version,
         "tone": tone,
         "focus": focus,
-        "structure": structure
-    })
+        "structure": structure,
+        "format": format
+    }
+
+    if stream:
+        async def report_stream():
+            renderer = ReportRenderer(compile_template(tone, structure, focus, format))
+            yield renderer.begin()
+            async for name, result in contract_graph.iter_results(
+                doc_id, lambda: _agent_contexts(doc_id, doc_version), doc_version=doc_version
+            ):
+                piece = renderer.section(name, result)
+                if piece:
+                    yield piece
+            yield renderer.end()
+            add_action("ANALYZE", history_details)
+
+        return StreamingResponse(report_stream(), media_type=REPORT_MEDIA_TYPES[format])
+
+    # Agents run as soon as their inputs are ready; persistence of each
+    # agent result happens in the background. Cached agent results are
+    # reused (after an amendment, those whose clauses did not change), and
+    # retrieval (one batched search for every agent's chunks) only happens
+    # if some agent has no result for the current version.
+    run = await contract_graph.run(doc_id, lambda: _agent_contexts(doc_id, doc_version), doc_version=doc_version)
+    results = run["results"]
+    legal = results["legal"]
+    finance = results["finance"]
+    compliance = results["compliance"]
+    operations = results["operations"]
+
+    # Compile the final report
+    with span("report"):
+        report = generate_report(
+            legal=legal,
+            finance=finance,
+            compliance=compliance,
+            operations=operations,
+            tone=tone,
+            focus=focus,
+            structure=structure,
+            format=format
+        )
+
+    add_action("ANALYZE", history_details)
 
     return {
         "doc_id": doc_id,
+        "version": doc_version,
         "analysis": {
             "legal": legal,
             "finance": finance,
             "compliance": compliance,
             "operations": operations
         },
+        "timings": run["timings"],
         "report": report
     }
 
-@app.post("/batch-analyze")
+async def _run_analyze_job(job: dict, stage):
+    if await run_io(pending_jobs_for_doc, job["doc_id"], "upload"):
+        raise JobDeferred(2.0, "waiting for indexing")
+    payload = job["payload"]
+    result = await analyze_contract(
+        job["doc_id"], payload["tone"], payload["focus"], payload["structure"], payload.get("format", "text")
+    )
+    await stage("analyzed")
+    return result
+
+register_handler("upload", ingest_upload, on_failure=discard_upload)
+register_handler("analyze", _run_analyze_job)
+
+@app.post("/batch-analyze", dependencies=[Depends(require_warm)])
 async def batch_analyze(
+    http_request: Request,
     doc_ids: List[str],
     tone: str = "formal",
     focus: str = "full",
-    structure: str = "structured"
+    structure: str = "structured",
+    stream_format: str = "json",
+    report_format: str = "text",
+    concurrency: Optional[int] = None,
+    timeout: float = BATCH_DOC_TIMEOUT
 ):
-    tasks = [analyze_contract(doc_id, tone, focus, structure) for doc_id in doc_ids]
-    return await asyncio.gather(*tasks)
+    """
+    Analyze many documents with bounded concurrency.
+    `report_format` is the format of each document's report.
+    stream_format=json returns the full list in request order once
+    everything is done; stream_format=ndjson or stream_format=sse streams
+    each document's result as soon as it completes. `concurrency` can only lower the server
+    limit (BATCH_CONCURRENCY), never raise it. Every document beyond
+    the first costs one more rate-limit token.
+    """
+    if stream_format not in STREAM_FORMATS:
+        raise HTTPException(status_code=400, detail=f"stream_format must be one of {', '.join(STREAM_FORMATS)}")
+    if report_format not in REPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"report_format must be one of {', '.join(REPORT_FORMATS)}")
+    charge(http_request, len(doc_ids) - 1)
+    concurrency = min(concurrency or BATCH_CONCURRENCY, BATCH_CONCURRENCY)
+
+    async def analyze(doc_id: str):
+        try:
+            return await analyze_contract(doc_id, tone, focus, structure, report_format)
+        except HTTPException as e:
+            if e.status_code == 404:
+                raise DocumentNotFound(e.detail)
+            raise
+
+    results = iter_batch_results(doc_ids, analyze, concurrency=concurrency, timeout=timeout)
+
+    if stream_format == "ndjson":
+        return StreamingResponse(
+            (to_ndjson(envelope) async for envelope in results),
+            media_type="application/x-ndjson"
+        )
+    if stream_format == "sse":
+        return StreamingResponse(
+            (to_sse(envelope) async for envelope in results),
+            media_type="text/event-stream"
+        )
+
+    ordered = [None] * len(doc_ids)
+    async for envelope in results:
+        if envelope["status"] == "success":
+            ordered[envelope["index"]] = envelope["result"]
+        else:
+            ordered[envelope["index"]] = {k: v for k, v in envelope.items() if k != "index"}
+    return ordered
+
+class SearchRequest(BaseModel):
+    query: Optional[str] = None
+    clause_id: Optional[str] = None
+    top_k: int = 10
+    contract_type: Optional[List[str]] = None
+    date_from: Optional[str] = None
+    date_to: Optional[str] = None
+    per_doc: int = 1
+    include_source_doc: bool = False
+    # An already embedded query (a cluster router passes the clause's
+    # vector to the nodes that don't hold it)
+    vector: Optional[List[float]] = None
+
+def _parse_date(value: Optional[str], field: str, end: bool = False):
+    # ISO date or datetime (UTC unless an offset is given); a bare end date is inclusive
+    if value is None:
+        return None
+    try:
+        parsed = datetime.datetime.fromisoformat(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"{field} must be an ISO date, got '{value}'")
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+    if end and len(value) == 10:
+        parsed += datetime.timedelta(days=1)
+    return parsed.timestamp()
+
+@app.post("/search", dependencies=[Depends(require_warm)])
+async def search_corpus(request: SearchRequest):
+    """
+    Clauses across every indexed document closest to free text (`query`),
+    to an existing chunk (`clause_id`, a chunk id from an earlier
+    result) or to an already embedded `vector`. Filters on contract type and indexing date; `per_doc` caps
+    clauses returned per document. A clause_id search leaves out its own
+    document unless include_source_doc is set.
+    """
+    if sum(1 for given in (request.query, request.clause_id, request.vector) if given) != 1:
+        raise HTTPException(status_code=400, detail="Pass exactly one of query, clause_id or vector")
+    top_k = max(1, min(request.top_k, 100))
+    date_from = _parse_date(request.date_from, "date_from")
+    date_to = _parse_date(request.date_to, "date_to", end=True)
+    corpus = get_corpus_index()
+
+    exclude = []
+    if request.clause_id:
+        found = await run_io(corpus.vector_for, request.clause_id)
+        if found is None:
+            raise HTTPException(status_code=404, detail="Clause not found")
+        vector, source_doc = found
+        if not request.include_source_doc:
+            exclude.append(source_doc)
+    elif request.vector:
+        vector = np.asarray(request.vector, dtype=np.float32)
+    else:
+        vector = (await run_cpu(encode_texts, [request.query]))[0]
+
+    result = await run_cpu(
+        corpus.search, vector, top_k, request.contract_type, date_from, date_to, exclude, max(0, request.per_doc)
+    )
+
+    by_doc = {}
+    for match in result["matches"]:
+        by_doc.setdefault(match["doc_id"], []).append(match["id"])
+    texts = {}
+    for doc_id, ids in by_doc.items():
+        texts.update(await run_io(get_text_store().get, doc_id, ids))
+    for match in result["matches"]:
+        match["text"] = texts.get(match["id"], "")
+        match["indexed_at"] = datetime.datetime.fromtimestamp(
+            match["indexed_at"] or 0, datetime.timezone.utc
+        ).isoformat()
+
+    add_action("SEARCH", {
+        "query": request.query,
+        "clause_id": request.clause_id,
+        "results": len(result["matches"])
+    })
+    return result
+
+@app.get("/clauses/{clause_id}")
+async def fetch_clause(clause_id: str, include_vector: bool = False):
+    """
+    A chunk from the corpus index: its document, text and, on request,
+    its stored vector.
+    """
+    found = await run_io(get_corpus_index().vector_for, clause_id)
+    if found is None:
+        raise HTTPException(status_code=404, detail="Clause not found")
+    vector, doc_id = found
+    texts = await run_io(get_text_store().get, doc_id, [clause_id])
+    clause = {"id": clause_id, "doc_id": doc_id, "text": texts.get(clause_id, "")}
+    if include_vector:
+        clause["vector"] = [float(x) for x in vector]
+    return clause
 
 @app.post("/feedback")
 async def submit_feedback(
@@ -163,6 +547,51 @@ async def submit_feedback(
     
     return {"status": "success"}
 
+@app.get("/stats")
+async def fetch_stats():
+    return {
+        "content_cache": await asyncio.to_thread(cache_stats),
+        "embedding_worker": get_embedding_worker().stats(),
+        "analysis_cache": get_analysis_cache().stats(),
+        "upsert_writer": get_upsert_writer().stats(),
+        "corpus_index": get_corpus_index().stats(),
+        "admission": get_admission().stats(),
+        "jobs": await asyncio.to_thread(queue_depth)
+    }
+
 @app.get("/history")
-async def fetch_history():
-    return get_history()
+async def fetch_history(
+    response: Response,
+    limit: int = 50,
+    cursor: Optional[int] = None,
+    type: Optional[str] = None,
+    doc_id: Optional[str] = None
+):
+    """
+    Paginated activity log, newest first. Pass the X-Next-Cursor header
+    value back as `cursor` to fetch the next page.
+    """
+    limit = max(1, min(limit, 500))
+    history = await asyncio.to_thread(get_history, limit, cursor, type, doc_id)
+    if len(history) == limit:
+        response.headers["X-Next-Cursor"] = str(history[-1]["id"])
+    return history
+
+@app.get("/metrics")
+async def metrics():
+    """
+    Prometheus scrape endpoint for this process.
+    """
+    body = await asyncio.to_thread(render_metrics)
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4")
+
+@app.get("/traces/{trace_id}")
+async def fetch_trace(trace_id: str):
+    """
+    Spans (and the sampling profile, if one was requested) recorded for
+    a recent request; the id comes from its X-Trace-Id header.
+    """
+    trace = get_trace(trace_id)
+    if trace is None:
+        raise HTTPException(status_code=404, detail="Trace not found")
+    return trace
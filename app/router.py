@@ -0,0 +1,361 @@
+"""
+Cluster router: a thin front for several ClauseSense nodes. Documents
+are placed on nodes by consistent hashing of their doc_id, and each
+node keeps its own vector index shard, caches, job queue and history.
+
+    CLUSTER_NODES=http://10.0.0.1:8001,http://10.0.0.2:8001 uvicorn app.router:app --port 8000
+
+Nodes run the normal app (app.main) with CLUSTER_ROUTED=1. Requests for
+one document go to the node that owns it; corpus search, batches,
+history and stats are fanned out and merged. The router loads no
+models and holds no document state.
+"""
+import os
+import json
+import asyncio
+from typing import List, Optional
+
+import httpx
+from fastapi import FastAPI, UploadFile, Request, Response, HTTPException
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
+
+from app.services.cluster import get_ring, doc_id_for_upload, doc_id_of_chunk
+from app.services.content_cache import hash_upload
+from app.services.batch_scheduler import to_ndjson, to_sse, BATCH_DOC_TIMEOUT, STREAM_FORMATS
+
+# Per-request timeout towards a node; uploads and analyses can be slow
+CLUSTER_TIMEOUT = float(os.getenv("CLUSTER_TIMEOUT", "300"))
+# Headers passed through to nodes (API keys keep their own rate limits)
+FORWARD_HEADERS = ("x-api-key", "x-profile", "authorization")
+
+app = FastAPI(title="ClauseSense AI Router")
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Trace-Id", "Server-Timing", "X-Cluster-Node"],
+)
+
+_client = None
+
+
+def get_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(timeout=CLUSTER_TIMEOUT, limits=httpx.Limits(max_connections=200))
+    return _client
+
+
+def _headers(request: Request) -> dict:
+    return {name: value for name, value in request.headers.items() if name.lower() in FORWARD_HEADERS}
+
+
+def _relay(response: httpx.Response, node: str) -> Response:
+    headers = {name: value for name, value in response.headers.items()
+               if name.lower() in ("retry-after", "x-next-cursor", "x-trace-id", "server-timing")}
+    headers["X-Cluster-Node"] = node
+    return Response(response.content, status_code=response.status_code, headers=headers,
+                    media_type=response.headers.get("content-type"))
+
+
+async def _call_or_error(node: str, method: str, path: str, request: Request = None, **kwargs):
+    try:
+        return await get_client().request(method, node + path, headers=_headers(request) if request else None,
+                                          **kwargs)
+    except httpx.HTTPError as e:
+        return e
+
+
+async def _call(node: str, method: str, path: str, request: Request = None, **kwargs) -> httpx.Response:
+    reply = await _call_or_error(node, method, path, request, **kwargs)
+    if isinstance(reply, Exception):
+        raise HTTPException(status_code=503, detail=f"Node {node} unavailable: {reply}", headers={"Retry-After": "5"})
+    return reply
+
+
+async def _forward(node: str, request: Request, path: str = None, **kwargs) -> Response:
+    response = await _call(node, request.method, path or request.url.path, request,
+                           params=kwargs.pop("params", request.query_params), **kwargs)
+    return _relay(response, node)
+
+
+async def _scatter(method: str, path: str, request: Request = None, **kwargs) -> dict:
+    """
+    Send the same request to every node. Returns {node: response or
+    exception} so one dead node doesn't fail a corpus-wide query.
+    """
+    nodes = get_ring().nodes
+    replies = await asyncio.gather(*(_call_or_error(node, method, path, request, **kwargs) for node in nodes))
+    return dict(zip(nodes, replies))
+
+
+@app.on_event("shutdown")
+async def close_client():
+    if _client is not None:
+        await _client.aclose()
+
+
+@app.get("/")
+async def root():
+    return {"message": "ClauseSense AI Router", "nodes": get_ring().nodes}
+
+
+@app.get("/cluster")
+async def cluster_info():
+    """
+    Nodes and the share of the doc_id hash space each one owns.
+    """
+    ring = get_ring()
+    return {"nodes": ring.nodes, "vnodes": ring.vnodes, "shares": ring.shares()}
+
+
+@app.get("/cluster/owner/{doc_id}")
+async def owner(doc_id: str):
+    return {"doc_id": doc_id, "node": get_ring().node_for(doc_id)}
+
+
+@app.get("/ready")
+async def ready(response: Response):
+    """
+    Ready once every node is ready.
+    """
+    replies = await _scatter("GET", "/ready")
+    nodes = {}
+    for node, reply in replies.items():
+        nodes[node] = reply.json() if isinstance(reply, httpx.Response) else {"ready": False, "error": str(reply)}
+    all_ready = all(isinstance(r, httpx.Response) and r.status_code == 200 for r in replies.values())
+    if not all_ready:
+        response.status_code = 503
+    return {"ready": all_ready, "nodes": nodes}
+
+
+async def _upload(request: Request, path: str, file: UploadFile, parent_doc_id: Optional[str]) -> Response:
+    params = dict(request.query_params)
+    if parent_doc_id:
+        doc_id = parent_doc_id
+    else:
+        file_hash = await asyncio.to_thread(hash_upload, file.file)
+        doc_id = params["doc_id"] = doc_id_for_upload(file_hash)
+    node = get_ring().node_for(doc_id)
+    # The spooled file object itself, so httpx streams it to the node in
+    # chunks instead of the router holding the whole upload in memory
+    file.file.seek(0)
+    return await _forward(node, request, path, params=params,
+                          files={"file": (file.filename, file.file, file.content_type or "application/pdf")})
+
+
+@app.post("/upload")
+async def upload_contract(request: Request, file: UploadFile, parent_doc_id: Optional[str] = None):
+    return await _upload(request, "/upload", file, parent_doc_id)
+
+
+@app.post("/jobs/upload")
+async def submit_upload_job(request: Request, file: UploadFile, parent_doc_id: Optional[str] = None):
+    return await _upload(request, "/jobs/upload", file, parent_doc_id)
+
+
+@app.post("/analyze")
+async def analyze_contract(request: Request, doc_id: str, stream: bool = False):
+    node = get_ring().node_for(doc_id)
+    if not stream:
+        return await _forward(node, request)
+    client = get_client()
+    try:
+        upstream = await client.send(
+            client.build_request("POST", node + request.url.path, params=request.query_params,
+                                 headers=_headers(request)),
+            stream=True
+        )
+    except httpx.HTTPError as e:
+        raise HTTPException(status_code=503, detail=f"Node {node} unavailable: {e}", headers={"Retry-After": "5"})
+    if upstream.status_code != 200:
+        await upstream.aread()
+        await upstream.aclose()
+        return _relay(upstream, node)
+
+    async def body():
+        try:
+            async for chunk in upstream.aiter_raw():
+                yield chunk
+        finally:
+            await upstream.aclose()
+    return StreamingResponse(body(), media_type=upstream.headers.get("content-type"),
+                             headers={"X-Cluster-Node": node})
+
+
+@app.post("/jobs/analyze")
+async def submit_analyze_job(request: Request, doc_id: str):
+    return await _forward(get_ring().node_for(doc_id), request)
+
+
+@app.get("/documents/{doc_id}/versions")
+async def document_versions(request: Request, doc_id: str):
+    return await _forward(get_ring().node_for(doc_id), request)
+
+
+@app.get("/clauses/{clause_id}")
+async def fetch_clause(request: Request, clause_id: str):
+    return await _forward(get_ring().node_for(doc_id_of_chunk(clause_id)), request)
+
+
+@app.post("/feedback")
+async def submit_feedback(request: Request, doc_id: str):
+    return await _forward(get_ring().node_for(doc_id), request)
+
+
+@app.get("/jobs/{job_id}")
+async def fetch_job(job_id: str):
+    # Job ids are per node; ask every node
+    for node, reply in (await _scatter("GET", f"/jobs/{job_id}")).items():
+        if isinstance(reply, httpx.Response) and reply.status_code == 200:
+            return _relay(reply, node)
+    raise HTTPException(status_code=404, detail="Job not found")
+
+
+@app.post("/batch-analyze")
+async def batch_analyze(request: Request, doc_ids: List[str], stream_format: str = "json",
+                        timeout: float = BATCH_DOC_TIMEOUT):
+    """
+    Split the batch by owning node, run each part on its node (streamed
+    as NDJSON) and merge the results back into request order, or stream
+    them on as they arrive with stream_format=ndjson or stream_format=sse.
+    """
+    if stream_format not in STREAM_FORMATS:
+        raise HTTPException(status_code=400, detail=f"stream_format must be one of {', '.join(STREAM_FORMATS)}")
+    groups = get_ring().group(doc_ids)
+    params = dict(request.query_params)
+    params["stream_format"] = "ndjson"
+    queue = asyncio.Queue()
+
+    async def run_part(node: str, positions: List[int]):
+        part = [doc_ids[i] for i in positions]
+        try:
+            async with get_client().stream("POST", node + "/batch-analyze", params=params, json=part,
+                                           headers=_headers(request)) as upstream:
+                if upstream.status_code != 200:
+                    detail = (await upstream.aread()).decode(errors="replace")
+                    raise RuntimeError(f"{upstream.status_code}: {detail}")
+                async for line in upstream.aiter_lines():
+                    if line.strip():
+                        envelope = json.loads(line)
+                        envelope["index"] = positions[envelope["index"]]
+                        await queue.put(envelope)
+        except Exception as e:
+            for position in positions:
+                await queue.put({"index": position, "doc_id": doc_ids[position], "status": "error",
+                                 "error": f"Node {node} failed: {e}"})
+        finally:
+            await queue.put(None)
+
+    async def merged():
+        tasks = [asyncio.create_task(run_part(node, positions)) for node, positions in groups.items()]
+        # Each part reports its documents (or an error per document)
+        # before its end marker
+        seen, finished = set(), 0
+        try:
+            while finished < len(tasks):
+                envelope = await queue.get()
+                if envelope is None:
+                    finished += 1
+                elif envelope["index"] not in seen:
+                    seen.add(envelope["index"])
+                    yield envelope
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    if stream_format == "ndjson":
+        return StreamingResponse((to_ndjson(e) async for e in merged()), media_type="application/x-ndjson")
+    if stream_format == "sse":
+        return StreamingResponse((to_sse(e) async for e in merged()), media_type="text/event-stream")
+    ordered = [None] * len(doc_ids)
+    async for envelope in merged():
+        if envelope["status"] == "success":
+            ordered[envelope["index"]] = envelope["result"]
+        else:
+            ordered[envelope["index"]] = {k: v for k, v in envelope.items() if k != "index"}
+    return ordered
+
+
+@app.post("/search")
+async def search_corpus(request: Request):
+    """
+    Scatter the search to every node and merge the top-k by score.
+    Documents live on exactly one node, so per-node `per_doc` limits
+    hold for the merged list too. A clause_id search is resolved on the
+    clause's own node, which passes the clause vector to the others.
+    """
+    body = await request.json()
+    top_k = max(1, min(int(body.get("top_k", 10)), 100))
+    bodies = {node: body for node in get_ring().nodes}
+    if body.get("clause_id"):
+        source = get_ring().node_for(doc_id_of_chunk(body["clause_id"]))
+        clause = await _call(source, "GET", f"/clauses/{body['clause_id']}", request,
+                             params={"include_vector": "true"})
+        if clause.status_code != 200:
+            return _relay(clause, source)
+        by_vector = {k: v for k, v in body.items() if k != "clause_id"}
+        by_vector["vector"] = clause.json()["vector"]
+        bodies = {node: body if node == source else by_vector for node in bodies}
+
+    nodes = list(bodies)
+    replies = await asyncio.gather(*(
+        _call_or_error(node, "POST", "/search", request, json=bodies[node]) for node in nodes
+    ))
+    matches, searched, failed = [], {}, {}
+    for node, reply in zip(nodes, replies):
+        if isinstance(reply, Exception) or reply.status_code != 200:
+            failed[node] = str(reply) if isinstance(reply, Exception) else reply.text
+            continue
+        result = reply.json()
+        for match in result["matches"]:
+            match["node"] = node
+        matches.extend(result["matches"])
+        for key, value in result.get("searched", {}).items():
+            if isinstance(value, (int, float)):
+                searched[key] = searched.get(key, 0) + value
+    if len(failed) == len(nodes):
+        # Every node refused (e.g. a bad request): pass the first answer on
+        first = replies[0]
+        if isinstance(first, httpx.Response):
+            return _relay(first, nodes[0])
+        raise HTTPException(status_code=503, detail="No node answered", headers={"Retry-After": "5"})
+    matches.sort(key=lambda m: m["score"], reverse=True)
+    result = {"matches": matches[:top_k], "searched": searched}
+    if failed:
+        result["failed_nodes"] = failed
+    return result
+
+
+@app.get("/history")
+async def fetch_history(request: Request, limit: int = 50, cursor: Optional[int] = None,
+                        doc_id: Optional[str] = None):
+    """
+    A document's history comes from its node, with the node's cursor.
+    Without doc_id the newest `limit` entries of every node are merged
+    by time; cursors are per node, so they need a doc_id.
+    """
+    if doc_id:
+        return await _forward(get_ring().node_for(doc_id), request)
+    if cursor is not None:
+        raise HTTPException(status_code=400, detail="cursor needs doc_id in cluster mode")
+    replies = await _scatter("GET", "/history", request, params=request.query_params)
+    merged = []
+    for node, reply in replies.items():
+        if isinstance(reply, httpx.Response) and reply.status_code == 200:
+            merged.extend(dict(entry, node=node) for entry in reply.json())
+    merged.sort(key=lambda entry: entry.get("timestamp", ""), reverse=True)
+    return merged[:max(1, min(limit, 500))]
+
+
+@app.get("/stats")
+async def fetch_stats():
+    replies = await _scatter("GET", "/stats")
+    return {
+        "cluster": get_ring().shares(),
+        "nodes": {node: reply.json() if isinstance(reply, httpx.Response) and reply.status_code == 200
+                  else {"error": str(reply)} for node, reply in replies.items()}
+    }
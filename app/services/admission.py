@@ -0,0 +1,387 @@
+import os
+import json
+import math
+import time
+import queue
+import asyncio
+import itertools
+import functools
+import threading
+import contextvars
+import collections
+import concurrent.futures
+
+from fastapi import HTTPException, Request
+from fastapi.responses import JSONResponse
+
+from app.services.telemetry import Counter, Gauge
+
+# Set to 0 to turn off rate limiting and load shedding (the executors
+# are still used)
+ADMISSION_CONTROL = os.getenv("ADMISSION_CONTROL", "1") in ("1", "true", "True")
+# Requests carrying one of the API_KEY_LIMITS keys in this header are
+# accounted to that key; all others to the client address, so made-up
+# keys can't be rotated to dodge the limits
+API_KEY_HEADER = os.getenv("API_KEY_HEADER", "X-API-Key")
+# Token bucket per API key: sustained requests per second and burst size
+RATE_LIMIT_RPS = float(os.getenv("RATE_LIMIT_RPS", "10"))
+RATE_LIMIT_BURST = float(os.getenv("RATE_LIMIT_BURST", "30"))
+# Per-key overrides as JSON: {"key": [rps, burst], ...}
+API_KEY_LIMITS = json.loads(os.getenv("API_KEY_LIMITS", "{}"))
+# Buckets kept; the least recently used one is dropped beyond this
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "10000"))
+# Threads for model/scoring work and for vector store, SQLite
+# and file access. Neither shares the default executor.
+CPU_EXECUTOR_THREADS = int(os.getenv("CPU_EXECUTOR_THREADS", str(max(2, os.cpu_count() or 2))))
+IO_EXECUTOR_THREADS = int(os.getenv("IO_EXECUTOR_THREADS", "16"))
+# Admitted requests allowed in flight per lane before new ones get 429
+MAX_INFLIGHT_INTERACTIVE = int(os.getenv("MAX_INFLIGHT_INTERACTIVE", "64"))
+MAX_INFLIGHT_BULK = int(os.getenv("MAX_INFLIGHT_BULK", "8"))
+# Tasks waiting in the executors at which interactive requests are shed;
+# bulk requests are shed at BULK_SHED_FRACTION of it
+SHED_QUEUE_DEPTH = int(os.getenv("SHED_QUEUE_DEPTH", "256"))
+BULK_SHED_FRACTION = float(os.getenv("BULK_SHED_FRACTION", "0.5"))
+# Longest Retry-After ever suggested, in seconds
+MAX_RETRY_AFTER = int(os.getenv("MAX_RETRY_AFTER", "60"))
+
+# Executor work is taken strictly in this order
+LANES = ("interactive", "bulk", "background")
+# Admission-controlled routes: (lane, token cost)
+ROUTE_POLICIES = {
+    "/upload": ("interactive", 1),
+    "/analyze": ("interactive", 1),
+    "/search": ("interactive", 1),
+    "/batch-analyze": ("bulk", 1),  # plus one token per extra document, see charge()
+    "/jobs/upload": ("bulk", 1),
+    "/jobs/analyze": ("bulk", 1),
+}
+
+_lane = contextvars.ContextVar("admission_lane", default="bulk")
+_cpu_executor = None
+_io_executor = None
+_controller = None
+_lock = threading.Lock()
+
+REJECTED = Counter("clausesense_admission_rejected_total", "Requests turned away by admission control, by reason and lane",
+                   ["reason", "lane"])
+
+
+def current_lane() -> str:
+    return _lane.get()
+
+
+def set_lane(lane: str):
+    """
+    Run the rest of the current task (and executor work it starts) in
+    `lane`. Returns a token for reset_lane.
+    """
+    return _lane.set(lane)
+
+
+def reset_lane(token):
+    _lane.reset(token)
+
+
+class TokenBucket:
+    """
+    `rate` tokens per second up to `burst`. take() returns 0 when the
+    tokens were taken, otherwise the seconds until they would be there.
+    """
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self, cost: float = 1.0) -> float:
+        self._refill(time.monotonic())
+        if cost <= self.tokens:
+            self.tokens -= cost
+            return 0.0
+        if self.rate <= 0 or cost > self.burst:
+            return float("inf")
+        return (cost - self.tokens) / self.rate
+
+
+class LaneExecutor:
+    """
+    Fixed pool of threads fed from a priority queue: queued interactive
+    work always starts before bulk work, bulk before background. Within
+    a lane tasks run in submission order. Keeps a moving average of task
+    time to estimate how long the backlog takes to drain.
+    """
+
+    def __init__(self, name: str, workers: int):
+        self.name = name
+        self.workers = max(1, workers)
+        self._queue = queue.PriorityQueue()
+        self._seq = itertools.count()
+        self._queued = {lane: 0 for lane in LANES}
+        self._busy = 0
+        self._completed = 0
+        self._avg_seconds = 0.0
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def _start(self):
+        with self._lock:
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._run, name=f"{self.name}-{len(self._threads)}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, lane: str, fn, *args) -> concurrent.futures.Future:
+        if len(self._threads) < self.workers:
+            self._start()
+        future = concurrent.futures.Future()
+        rank = LANES.index(lane) if lane in LANES else len(LANES)
+        with self._lock:
+            self._queued[lane] = self._queued.get(lane, 0) + 1
+        self._queue.put((rank, next(self._seq), lane, fn, args, future))
+        return future
+
+    def _run(self):
+        while True:
+            _, _, lane, fn, args, future = self._queue.get()
+            with self._lock:
+                self._queued[lane] -= 1
+                self._busy += 1
+            t0 = time.perf_counter()
+            try:
+                # Skipped if the awaiting request was cancelled meanwhile
+                if future.set_running_or_notify_cancel():
+                    try:
+                        future.set_result(fn(*args))
+                    except BaseException as e:
+                        future.set_exception(e)
+            finally:
+                elapsed = time.perf_counter() - t0
+                with self._lock:
+                    self._busy -= 1
+                    self._completed += 1
+                    self._avg_seconds += (elapsed - self._avg_seconds) * 0.05
+
+    def backlog(self, lane: str = None) -> int:
+        """
+        Tasks queued ahead of new work in `lane` (all queued tasks if None).
+        """
+        with self._lock:
+            if lane is None:
+                return sum(self._queued.values())
+            rank = LANES.index(lane)
+            return sum(n for name, n in self._queued.items() if name in LANES[:rank + 1])
+
+    def drain_seconds(self, lane: str = None) -> float:
+        return self.backlog(lane) * self._avg_seconds / self.workers
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "busy": self._busy,
+                "queued": dict(self._queued),
+                "completed": self._completed,
+                "avg_task_ms": round(self._avg_seconds * 1000, 3)
+            }
+
+
+def get_cpu_executor() -> LaneExecutor:
+    global _cpu_executor
+    if _cpu_executor is None:
+        with _lock:
+            if _cpu_executor is None:
+                _cpu_executor = LaneExecutor("cpu", CPU_EXECUTOR_THREADS)
+    return _cpu_executor
+
+
+def get_io_executor() -> LaneExecutor:
+    global _io_executor
+    if _io_executor is None:
+        with _lock:
+            if _io_executor is None:
+                _io_executor = LaneExecutor("io", IO_EXECUTOR_THREADS)
+    return _io_executor
+
+
+async def _run(executor: LaneExecutor, fn, args, kwargs):
+    # Like asyncio.to_thread: the call sees the caller's context
+    # variables (trace, lane)
+    ctx = contextvars.copy_context()
+    call = functools.partial(ctx.run, fn, *args, **kwargs)
+    return await asyncio.wrap_future(executor.submit(current_lane(), call))
+
+
+async def run_cpu(fn, *args, **kwargs):
+    """
+    Run model inference, rule scanning, agents and other CPU
+    work on the bounded CPU executor in the current lane.
+    """
+    return await _run(get_cpu_executor(), fn, args, kwargs)
+
+
+async def run_io(fn, *args, **kwargs):
+    """
+    Run vector store, text store, SQLite and file access on the bounded
+    I/O executor in the current lane.
+    """
+    return await _run(get_io_executor(), fn, args, kwargs)
+
+
+class AdmissionController:
+    """
+    Decides whether a request may start: per-key token buckets first,
+    then load shedding on the lane's in-flight count and on the executor
+    backlog ahead of it. Bulk requests are shed at a lower backlog than
+    interactive ones. Limits are per process.
+    """
+
+    def __init__(self):
+        self._buckets = collections.OrderedDict()
+        self._inflight = {lane: 0 for lane in LANES}
+        self._limits = {"interactive": MAX_INFLIGHT_INTERACTIVE, "bulk": MAX_INFLIGHT_BULK}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def api_key(request) -> str:
+        key = request.headers.get(API_KEY_HEADER)
+        if key and key in API_KEY_LIMITS:
+            return key
+        return f"client:{request.client.host if request.client else 'unknown'}"
+
+    def _bucket(self, key: str) -> TokenBucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            rate, burst = API_KEY_LIMITS.get(key, (RATE_LIMIT_RPS, RATE_LIMIT_BURST))
+            bucket = self._buckets[key] = TokenBucket(float(rate), float(burst))
+            while len(self._buckets) > RATE_LIMIT_MAX_KEYS:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        return bucket
+
+    def _reject(self, reason: str, lane: str, wait: float, detail: str) -> HTTPException:
+        REJECTED.inc(reason=reason, lane=lane)
+        retry = MAX_RETRY_AFTER if math.isinf(wait) else min(MAX_RETRY_AFTER, max(1, math.ceil(wait)))
+        return HTTPException(status_code=429, detail=detail, headers={"Retry-After": str(retry)})
+
+    def charge(self, request, cost: float, lane: str = None):
+        """
+        Take `cost` tokens from the request's API key or raise 429 (413
+        if the key's burst could never cover it).
+        """
+        if not ADMISSION_CONTROL or cost <= 0:
+            return
+        lane = lane or current_lane()
+        with self._lock:
+            bucket = self._bucket(self.api_key(request))
+            wait = bucket.take(cost)
+        if math.isinf(wait):
+            REJECTED.inc(reason="too_large", lane=lane)
+            raise HTTPException(status_code=413, detail=f"Request needs {cost:g} tokens, more than the "
+                                                        f"rate limit burst of {bucket.burst:g}")
+        if wait > 0:
+            raise self._reject("rate_limit", lane, wait, "Rate limit exceeded")
+
+    def admit(self, request, lane: str, cost: float):
+        """
+        Admit a request into `lane` or raise 429. Admitted requests must
+        be released with release(lane).
+        """
+        self.charge(request, cost, lane)
+        if not ADMISSION_CONTROL:
+            with self._lock:
+                self._inflight[lane] += 1
+            return
+        threshold = SHED_QUEUE_DEPTH if lane == "interactive" else SHED_QUEUE_DEPTH * BULK_SHED_FRACTION
+        cpu, io = get_cpu_executor(), get_io_executor()
+        if cpu.backlog(lane) + io.backlog(lane) >= threshold:
+            wait = max(cpu.drain_seconds(lane), io.drain_seconds(lane))
+            raise self._reject("queue_depth", lane, wait, "Server is overloaded, retry later")
+        with self._lock:
+            if self._inflight[lane] >= self._limits.get(lane, MAX_INFLIGHT_BULK):
+                full = True
+            else:
+                full = False
+                self._inflight[lane] += 1
+        if full:
+            raise self._reject("concurrency", lane, 1, "Too many requests in flight, retry later")
+
+    def release(self, lane: str):
+        with self._lock:
+            self._inflight[lane] -= 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            inflight = dict(self._inflight)
+            keys = len(self._buckets)
+        return {
+            "enabled": ADMISSION_CONTROL,
+            "inflight": inflight,
+            "api_keys": keys,
+            "cpu_executor": get_cpu_executor().stats(),
+            "io_executor": get_io_executor().stats()
+        }
+
+
+def get_admission() -> AdmissionController:
+    global _controller
+    if _controller is None:
+        with _lock:
+            if _controller is None:
+                _controller = AdmissionController()
+    return _controller
+
+
+def charge(request, cost: float):
+    """
+    Charge a request extra tokens once its size is known (e.g. one per
+    document of a batch beyond the first).
+    """
+    get_admission().charge(request, cost)
+
+
+class AdmissionMiddleware:
+    """
+    ASGI middleware: admits or sheds requests to the routes in
+    ROUTE_POLICIES and runs admitted ones in their lane. A request stays
+    in flight until the app has finished sending its response, and is
+    released however that ends (body sent, client gone, error).
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        request = Request(scope)
+        policy = ROUTE_POLICIES.get(request.url.path)
+        if policy is None:
+            return await self.app(scope, receive, send)
+        lane, cost = policy
+        controller = get_admission()
+        try:
+            controller.admit(request, lane, cost)
+        except HTTPException as e:
+            response = JSONResponse({"detail": e.detail}, status_code=e.status_code, headers=e.headers)
+            return await response(scope, receive, send)
+
+        token = set_lane(lane)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            reset_lane(token)
+            controller.release(lane)
+
+Gauge("clausesense_executor_queue_depth", "Tasks waiting for an executor thread by lane",
+      ["executor", "lane"],
+      callback=lambda: {(executor.name, lane): n
+                        for executor in (get_cpu_executor(), get_io_executor())
+                        for lane, n in executor.stats()["queued"].items()})
+Gauge("clausesense_admission_inflight", "Admitted requests in flight by lane", ["lane"],
+      callback=lambda: {(lane,): n for lane, n in get_admission().stats()["inflight"].items()})
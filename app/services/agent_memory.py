@@ -1,5 +1,16 @@
-from app.services.embeddings import embed_text, get_pinecone_index
+from app.services.embeddings import embed_text
+from app.services.vector_store import get_vector_store
+from app.services.telemetry import timed
+from app.services.upsert_writer import get_upsert_writer
 
+def _enqueue(vector: dict, label: str):
+    # Coalesced with other requests' small writes; errors only get logged
+    def report(future):
+        if future.exception() is not None:
+            print(f"Error persisting {label}: {future.exception()}")
+    get_upsert_writer().enqueue(vector).add_done_callback(report)
+
+@timed("persist_agent")
 def store_agent_result(doc_id: str, agent_name: str, result: dict):
     """
     Persist intermediate agent analysis to the vector store.
@@ -8,25 +19,20 @@ def store_agent_result(doc_id: str, agent_name: str, result: dict):
     content_text = str(result)
     embedding = embed_text(content_text)
 
-    index = get_pinecone_index()
+    index = get_vector_store()
     if index is None:
         return
 
-    try:
-        index.upsert([
-            {
-                "id": f"{doc_id}_{agent_name}",
-                "values": embedding,
-                "metadata": {
-                    "doc_id": doc_id,
-                    "agent": agent_name,
-                    "type": "agent_output",
-                    "text": content_text
-                }
-            }
-        ])
-    except Exception as e:
-        print(f"Error persisting agent result ({agent_name}): {e}")
+    _enqueue({
+        "id": f"{doc_id}_{agent_name}",
+        "values": embedding,
+        "metadata": {
+            "doc_id": doc_id,
+            "agent": agent_name,
+            "type": "agent_output",
+            "text": content_text
+        }
+    }, f"agent result ({agent_name})")
 
 def store_final_report(doc_id: str, report: dict):
     """
@@ -35,21 +41,16 @@ def store_final_report(doc_id: str, report: dict):
     content_text = str(report)
     embedding = embed_text(content_text)
 
-    index = get_pinecone_index()
+    index = get_vector_store()
     if index is None:
         return
 
-    try:
-        index.upsert([
-            {
-                "id": f"{doc_id}_final_report",
-                "values": embedding,
-                "metadata": {
-                    "doc_id": doc_id,
-                    "type": "final_report",
-                    "text": content_text
-                }
-            }
-        ])
-    except Exception as e:
-        print(f"Error persisting final report: {e}")
+    _enqueue({
+        "id": f"{doc_id}_final_report",
+        "values": embedding,
+        "metadata": {
+            "doc_id": doc_id,
+            "type": "final_report",
+            "text": content_text
+        }
+    }, "final report")
@@ -0,0 +1,103 @@
+import os
+import re
+import json
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+
+ANALYSIS_CACHE_DIR = os.getenv("ANALYSIS_CACHE_DIR", "analysis_cache")
+# Entries kept in the in-memory tier; the disk tier is unbounded
+ANALYSIS_CACHE_SIZE = int(os.getenv("ANALYSIS_CACHE_SIZE", "1024"))
+
+_cache = None
+
+
+class AnalysisCache:
+    """
+    Two-tier cache for per-agent results: an in-memory LRU in front of
+    one JSON file per entry on disk, grouped in a directory per doc_id
+    so a document's results can be dropped in one go.
+    """
+
+    def __init__(self, root: str = ANALYSIS_CACHE_DIR, max_entries: int = ANALYSIS_CACHE_SIZE):
+        self.root = root
+        self.max_entries = max_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+
+    @staticmethod
+    def _safe(part: str) -> str:
+        return re.sub(r"[^A-Za-z0-9_.-]", "_", part)
+
+    def _path(self, doc_id: str, key: str) -> str:
+        return os.path.join(self.root, self._safe(doc_id), self._safe(key) + ".json")
+
+    def _remember(self, entry_key, value):
+        self._memory[entry_key] = value
+        self._memory.move_to_end(entry_key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, doc_id: str, key: str):
+        entry_key = (doc_id, key)
+        with self._lock:
+            if entry_key in self._memory:
+                self._memory.move_to_end(entry_key)
+                self._stats["memory_hits"] += 1
+                return self._memory[entry_key]
+
+        path = self._path(doc_id, key)
+        try:
+            with open(path, "r") as f:
+                value = json.load(f)
+        except (OSError, ValueError):
+            with self._lock:
+                self._stats["misses"] += 1
+            return None
+
+        with self._lock:
+            self._stats["disk_hits"] += 1
+            self._remember(entry_key, value)
+        return value
+
+    def put(self, doc_id: str, key: str, value):
+        with self._lock:
+            self._remember((doc_id, key), value)
+        path = self._path(doc_id, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # A temp file of its own, so concurrent writers of the same entry
+        # (threads or processes) never write into each other's file
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(value, f, default=str)
+            os.replace(tmp, path)
+        except BaseException:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            raise
+
+    def invalidate(self, doc_id: str):
+        with self._lock:
+            for entry_key in [k for k in self._memory if k[0] == doc_id]:
+                del self._memory[entry_key]
+        shutil.rmtree(os.path.join(self.root, self._safe(doc_id)), ignore_errors=True)
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["memory_entries"] = len(self._memory)
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = round((stats["memory_hits"] + stats["disk_hits"]) / lookups, 4) if lookups else 0.0
+        return stats
+
+
+def get_analysis_cache() -> AnalysisCache:
+    global _cache
+    if _cache is None:
+        _cache = AnalysisCache()
+    return _cache
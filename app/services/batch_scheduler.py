@@ -0,0 +1,64 @@
+import os
+import json
+import asyncio
+from typing import AsyncIterator, Awaitable, Callable, List
+
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))
+BATCH_DOC_TIMEOUT = float(os.getenv("BATCH_DOC_TIMEOUT", "120"))
+# How a batch's results are returned: one JSON list, or streamed as NDJSON or SSE
+STREAM_FORMATS = ("json", "ndjson", "sse")
+
+
+class DocumentNotFound(Exception):
+    """
+    Raised by a batch's analyze callable for an unknown doc_id.
+    """
+
+
+async def iter_batch_results(
+    doc_ids: List[str],
+    analyze: Callable[[str], Awaitable[dict]],
+    concurrency: int = BATCH_CONCURRENCY,
+    timeout: float = BATCH_DOC_TIMEOUT
+) -> AsyncIterator[dict]:
+    """
+    Run `analyze` for every doc_id with at most `concurrency` documents
+    in flight and yield one envelope per document in completion order.
+    A failing or timed-out document produces an error envelope instead
+    of aborting the batch; unknown documents (DocumentNotFound) get
+    status "not_found".
+    """
+    queue = asyncio.Queue()
+    pending = iter(enumerate(doc_ids))
+    concurrency = max(1, concurrency)
+
+    async def worker():
+        for position, doc_id in pending:
+            try:
+                result = await asyncio.wait_for(analyze(doc_id), timeout=timeout)
+                envelope = {"index": position, "doc_id": doc_id, "status": "success", "result": result}
+            except asyncio.TimeoutError:
+                envelope = {"index": position, "doc_id": doc_id, "status": "timeout",
+                            "error": f"Analysis exceeded {timeout}s"}
+            except DocumentNotFound as e:
+                envelope = {"index": position, "doc_id": doc_id, "status": "not_found", "error": str(e)}
+            except Exception as e:
+                envelope = {"index": position, "doc_id": doc_id, "status": "error", "error": str(e)}
+            await queue.put(envelope)
+
+    workers = [asyncio.create_task(worker()) for _ in range(min(concurrency, len(doc_ids)))]
+    try:
+        for _ in range(len(doc_ids)):
+            yield await queue.get()
+    finally:
+        # Client disconnected or the consumer stopped early
+        for task in workers:
+            task.cancel()
+
+
+def to_ndjson(envelope: dict) -> str:
+    return json.dumps(envelope, default=str) + "\n"
+
+
+def to_sse(envelope: dict) -> str:
+    return f"event: result\ndata: {json.dumps(envelope, default=str)}\n\n"
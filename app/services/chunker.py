@@ -0,0 +1,184 @@
+import os
+import re
+from dataclasses import dataclass
+from typing import Iterable, Iterator, List
+
+# "clause" (structure-aware) or "fixed" (legacy 800-char slices)
+CHUNK_STRATEGY = os.getenv("CHUNK_STRATEGY", "clause").lower()
+# Whitespace tokens; ~160 words stays inside MiniLM's 256 word-piece window
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "160"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "20"))
+FIXED_CHUNK_SIZE = 800
+
+_TOKEN = re.compile(r"\S+")
+
+# Lines that open a new section: "4." / "4.2.1" / "(a)" numbering, a
+# "Section/Article/Clause/Schedule N" marker, or an ALL-CAPS heading.
+_SECTION = (
+    r"(?:\d+[.)]\s|\d+(?:\.\d+)+[.)]?\s"
+    r"|\([a-z0-9]{1,3}\)\s"
+    r"|(?i:section|article|clause|schedule)\s+[\dIVXLC]+"
+    r"|[A-Z][A-Z0-9 ,&/\-]{3,}(?:\n|$))"
+)
+# Split points: after sentence-ending punctuation, or before a section line
+_BOUNDARY = re.compile(r"(?<=[^\d\s][.!?;])\s+(?=[\"'(\[A-Z0-9])|\n\s*(?=" + _SECTION + r")")
+_SECTION_START = re.compile(r"\s*" + _SECTION)
+
+
+@dataclass
+class Chunk:
+    text: str
+    page: int        # 1-based page where the chunk starts
+    page_end: int    # 1-based page where the chunk ends
+    char_start: int  # offset into the concatenated document text
+    char_end: int
+    tokens: int
+
+
+@dataclass
+class _Segment:
+    text: str
+    page: int
+    start: int
+    tokens: int
+    section_start: bool
+
+
+def _segments(page_text: str, page: int, base: int) -> Iterator[_Segment]:
+    pos = 0
+    for match in _BOUNDARY.finditer(page_text):
+        end = match.end()
+        if end > pos:
+            yield _make_segment(page_text[pos:end], page, base + pos)
+        pos = end
+    if pos < len(page_text):
+        yield _make_segment(page_text[pos:], page, base + pos)
+
+
+def _make_segment(text: str, page: int, start: int) -> _Segment:
+    return _Segment(
+        text=text,
+        page=page,
+        start=start,
+        tokens=len(_TOKEN.findall(text)),
+        section_start=bool(_SECTION_START.match(text))
+    )
+
+
+def _split_long(segment: _Segment, max_tokens: int) -> Iterator[_Segment]:
+    # A single run-on "sentence" bigger than the limit: cut on token edges
+    tokens = list(_TOKEN.finditer(segment.text))
+    for i in range(0, len(tokens), max_tokens):
+        first = tokens[i].start()
+        last = tokens[min(i + max_tokens, len(tokens)) - 1].end()
+        piece = segment.text[first:last]
+        yield _Segment(piece, segment.page, segment.start + first, len(tokens[i:i + max_tokens]), i == 0 and segment.section_start)
+
+
+def _emit(segments: List[_Segment]) -> Chunk:
+    text = "".join(s.text for s in segments)
+    stripped = text.strip()
+    lead = len(text) - len(text.lstrip())
+    start = segments[0].start + lead
+    return Chunk(
+        text=stripped,
+        page=segments[0].page,
+        page_end=segments[-1].page,
+        char_start=start,
+        char_end=start + len(stripped),
+        tokens=sum(s.tokens for s in segments)
+    )
+
+
+def chunk_pages(
+    pages: Iterable[str],
+    max_tokens: int = CHUNK_MAX_TOKENS,
+    overlap_tokens: int = CHUNK_OVERLAP_TOKENS
+) -> Iterator[Chunk]:
+    """
+    Structure-aware chunking in one linear pass over a stream of pages.
+    Sentences are packed into chunks of at most `max_tokens`; a new
+    section or heading closes the current chunk early, and chunks
+    within a section carry up to `overlap_tokens` of trailing sentences
+    into the next one.
+    """
+    current: List[_Segment] = []
+    current_tokens = 0
+    # A chunk holding only headings stays open so they attach to their body
+    has_body = False
+    base = 0
+
+    for page_number, page_text in enumerate(pages, start=1):
+        for segment in _segments(page_text, page_number, base):
+            if segment.tokens == 0:
+                if current:
+                    current.append(segment)
+                continue
+
+            pieces = _split_long(segment, max_tokens) if segment.tokens > max_tokens else (segment,)
+            for piece in pieces:
+                if current and piece.section_start and has_body:
+                    yield _emit(current)
+                    current, current_tokens, has_body = [], 0, False
+                elif current and current_tokens + piece.tokens > max_tokens:
+                    yield _emit(current)
+                    # Keep trailing sentences as overlap
+                    carry, carried = [], 0
+                    for prev in reversed(current):
+                        if carried + prev.tokens > overlap_tokens:
+                            break
+                        carry.insert(0, prev)
+                        carried += prev.tokens
+                    if carried + piece.tokens > max_tokens:
+                        carry, carried = [], 0
+                    current, current_tokens = carry, carried
+                    has_body = any(not s.section_start for s in carry)
+
+                current.append(piece)
+                current_tokens += piece.tokens
+                has_body = has_body or not piece.section_start
+        base += len(page_text)
+
+    if current and current_tokens:
+        yield _emit(current)
+
+
+def fixed_chunks(pages: Iterable[str], chunk_size: int = FIXED_CHUNK_SIZE) -> Iterator[Chunk]:
+    """
+    Legacy blind slicer: fixed character windows over the concatenated
+    pages. Kept for CHUNK_STRATEGY=fixed and for benchmarking.
+    """
+    buffer = ""
+    buffer_start = 0
+    page_starts = []  # (offset, page) for pages touching the buffer
+    offset = 0
+
+    def page_at(pos):
+        page = page_starts[0][1]
+        for start, number in page_starts:
+            if start > pos:
+                break
+            page = number
+        return page
+
+    for page_number, page_text in enumerate(pages, start=1):
+        page_starts.append((offset, page_number))
+        buffer += page_text
+        offset += len(page_text)
+        while len(buffer) >= chunk_size:
+            text = buffer[:chunk_size]
+            yield Chunk(text, page_at(buffer_start), page_at(buffer_start + chunk_size - 1),
+                        buffer_start, buffer_start + chunk_size, len(_TOKEN.findall(text)))
+            buffer = buffer[chunk_size:]
+            buffer_start += chunk_size
+            page_starts = [p for i, p in enumerate(page_starts)
+                           if i + 1 == len(page_starts) or page_starts[i + 1][0] > buffer_start]
+    if buffer:
+        yield Chunk(buffer, page_at(buffer_start), page_at(offset - 1),
+                    buffer_start, offset, len(_TOKEN.findall(buffer)))
+
+
+def iter_chunks(pages: Iterable[str]) -> Iterator[Chunk]:
+    if CHUNK_STRATEGY == "fixed":
+        return fixed_chunks(pages)
+    return chunk_pages(pages)
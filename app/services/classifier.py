@@ -1,5 +1,11 @@
+import os
+import json
+import time
 import socket
-from transformers import pipeline
+import threading
+import numpy as np
+from app.services.model_backend import load_zero_shot_pipeline, MODEL_BACKEND
+from app.services.telemetry import timed, MODEL_LOAD_SECONDS
 import warnings
 
 # Lazy load classifier
@@ -9,16 +15,15 @@ def get_classifier():
     global _classifier
     if _classifier is None:
         try:
-            print("Loading zero-shot classifier (distilbert)...")
+            print(f"Loading zero-shot classifier (distilbert, backend={MODEL_BACKEND})...")
             
             original_timeout = socket.getdefaulttimeout()
             socket.setdefaulttimeout(60) 
             
             try:
-                _classifier = pipeline(
-                    "zero-shot-classification",
-                    model="typeform/distilbert-base-uncased-mnli"
-                )
+                started = time.perf_counter()
+                _classifier = load_zero_shot_pipeline("typeform/distilbert-base-uncased-mnli")
+                MODEL_LOAD_SECONDS.set(time.perf_counter() - started, model="classifier")
                 print("Classifier loaded.")
             finally:
                 socket.setdefaulttimeout(original_timeout)
@@ -35,7 +40,126 @@ LABELS = [
     "Lease Agreement"
 ]
 
+# "nli" (zero-shot pipeline) or "embedding" (prototype similarity)
+CLASSIFIER_MODE = os.getenv("CLASSIFIER_MODE", "nli").lower()
+# Below this prototype confidence, re-rank the top candidates with NLI
+CLASSIFIER_MIN_CONFIDENCE = float(os.getenv("CLASSIFIER_MIN_CONFIDENCE", "0.5"))
+CLASSIFIER_FALLBACK_LABELS = int(os.getenv("CLASSIFIER_FALLBACK_LABELS", "4"))
+# Optional JSON file: {"Contract Type": "description" | ["example text", ...]}
+CONTRACT_TYPES_FILE = os.getenv("CONTRACT_TYPES_FILE")
+PROTOTYPE_TEMPERATURE = 0.05
+
+# Descriptions used to build one prototype embedding per contract type
+LABEL_DESCRIPTIONS = {
+    "Non Disclosure Agreement": [
+        "Non disclosure agreement. The receiving party shall keep confidential information secret and not disclose it to third parties.",
+        "Mutual confidentiality agreement covering trade secrets, proprietary information and permitted use of disclosed material."
+    ],
+    "Employment Contract": [
+        "Employment contract between employer and employee setting out salary, working hours, duties, probation and notice period.",
+        "The employee is hired for the position and receives compensation, benefits, paid leave and is subject to termination of employment."
+    ],
+    "Service Agreement": [
+        "Service agreement under which the provider performs services for the client in exchange for fees, with deliverables and service levels.",
+        "Master services agreement with statements of work, invoicing, payment terms, warranties and limitation of liability."
+    ],
+    "Lease Agreement": [
+        "Lease agreement where the landlord rents the premises to the tenant for a term in exchange for monthly rent and a security deposit.",
+        "Tenancy agreement covering property, rent payments, maintenance, repairs and use of the leased premises."
+    ]
+}
+
+_prototypes = None  # (labels, normalised prototype matrix)
+_prototype_lock = threading.Lock()
+
+def register_contract_types(types: dict):
+    """
+    Add or replace contract types. Values are a description or a list of
+    example texts; prototypes are rebuilt lazily on the next classification.
+    """
+    global _prototypes
+    with _prototype_lock:
+        for label, examples in types.items():
+            LABEL_DESCRIPTIONS[label] = [examples] if isinstance(examples, str) else list(examples)
+            if label not in LABELS:
+                LABELS.append(label)
+        _prototypes = None
+
+if CONTRACT_TYPES_FILE and os.path.exists(CONTRACT_TYPES_FILE):
+    with open(CONTRACT_TYPES_FILE, "r") as f:
+        register_contract_types(json.load(f))
+
+def get_prototypes():
+    """
+    One L2-normalised prototype per contract type: the mean embedding of
+    its descriptions/examples. Example embeddings go through the content
+    cache, so restarts don't re-encode them.
+    """
+    global _prototypes
+    with _prototype_lock:
+        if _prototypes is None:
+            from app.services.embeddings import encode_chunks
+
+            labels = [label for label in LABELS if LABEL_DESCRIPTIONS.get(label)]
+            examples = [text for label in labels for text in LABEL_DESCRIPTIONS[label]]
+            vectors = np.asarray(encode_chunks(examples), dtype=np.float32)
+            vectors /= np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-12
+
+            rows, offset = [], 0
+            for label in labels:
+                count = len(LABEL_DESCRIPTIONS[label])
+                rows.append(vectors[offset:offset + count].mean(axis=0))
+                offset += count
+            matrix = np.vstack(rows)
+            matrix /= np.linalg.norm(matrix, axis=1, keepdims=True) + 1e-12
+            _prototypes = (labels, matrix)
+        return _prototypes
+
+def classify_by_embedding(text: str):
+    """
+    Classify with a single embedding and one matrix-vector product
+    against the prototypes; cost does not grow with the number of
+    contract types. Falls back to NLI over the top candidates when the
+    best match is not confident enough.
+    """
+    from app.services.embeddings import encode_texts
+
+    labels, matrix = get_prototypes()
+    vector = np.asarray(encode_texts([text[:1500]])[0], dtype=np.float32)
+    vector /= np.linalg.norm(vector) + 1e-12
+
+    logits = (matrix @ vector) / PROTOTYPE_TEMPERATURE
+    probs = np.exp(logits - logits.max())
+    probs /= probs.sum()
+    order = np.argsort(-probs)
+    best = int(order[0])
+
+    if probs[best] < CLASSIFIER_MIN_CONFIDENCE:
+        classifier = get_classifier()
+        if classifier:
+            candidates = [labels[i] for i in order[:CLASSIFIER_FALLBACK_LABELS]]
+            result = classifier(text[:1500], candidates)
+            return {
+                "contract_type": result["labels"][0],
+                "confidence": round(float(result["scores"][0]), 2),
+                "method": "nli"
+            }
+
+    return {
+        "contract_type": labels[best],
+        "confidence": round(float(probs[best]), 2),
+        "method": "embedding"
+    }
+
+@timed("classify")
 def classify_contract(text: str):
+    if CLASSIFIER_MODE == "embedding":
+        try:
+            return classify_by_embedding(text)
+        except Exception as e:
+            print(f"Classification error: {e}")
+            return {"contract_type": "Unknown", "confidence": 0.0}
+
     classifier = get_classifier()
     if not classifier:
         return {"contract_type": "Unknown", "confidence": 0.0}
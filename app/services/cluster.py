@@ -0,0 +1,85 @@
+import os
+import uuid
+import bisect
+import hashlib
+from typing import Dict, List
+
+# Base URLs of the worker nodes, comma separated (router side)
+CLUSTER_NODES = [url.strip().rstrip("/") for url in os.getenv("CLUSTER_NODES", "").split(",") if url.strip()]
+# Points per node on the hash ring; more points even out the split
+CLUSTER_VNODES = int(os.getenv("CLUSTER_VNODES", "64"))
+# Set on worker nodes behind the router: uploads may carry the doc_id the
+# router assigned, so the document lands on the node that owns it
+CLUSTER_ROUTED = os.getenv("CLUSTER_ROUTED", "0") in ("1", "true", "True")
+
+# Fixed namespace so every router derives the same doc_id for a file
+DOC_ID_NAMESPACE = uuid.UUID("6f1c2b9e-3d4a-5e8f-9a0b-1c2d3e4f5a6b")
+
+_ring = None
+
+
+def _point(key: str) -> int:
+    return int.from_bytes(hashlib.sha1(key.encode()).digest()[:8], "big")
+
+
+class HashRing:
+    """
+    Consistent hash ring over node URLs. Each node is placed at
+    `vnodes` points; a key belongs to the first node point at or after
+    its own hash. Adding or removing a node only moves the keys of the
+    arcs it gains or loses.
+    """
+
+    def __init__(self, nodes: List[str], vnodes: int = CLUSTER_VNODES):
+        if not nodes:
+            raise ValueError("A hash ring needs at least one node")
+        self.nodes = list(dict.fromkeys(nodes))
+        self.vnodes = vnodes
+        points = sorted((_point(f"{node}#{i}"), node) for node in self.nodes for i in range(vnodes))
+        self._hashes = [h for h, _ in points]
+        self._owners = [node for _, node in points]
+
+    def node_for(self, key: str) -> str:
+        i = bisect.bisect_left(self._hashes, _point(key))
+        return self._owners[i % len(self._owners)]
+
+    def group(self, keys: List[str]) -> Dict[str, List[int]]:
+        """
+        {node: [positions of the keys it owns]}, keeping request order.
+        """
+        groups = {}
+        for position, key in enumerate(keys):
+            groups.setdefault(self.node_for(key), []).append(position)
+        return groups
+
+    def shares(self) -> Dict[str, float]:
+        """
+        Fraction of the hash space each node owns.
+        """
+        span = 1 << 64
+        owned = {node: 0 for node in self.nodes}
+        previous = self._hashes[-1] - span
+        for h, node in zip(self._hashes, self._owners):
+            owned[node] += h - previous
+            previous = h
+        return {node: round(size / span, 4) for node, size in owned.items()}
+
+
+def get_ring() -> HashRing:
+    global _ring
+    if _ring is None:
+        _ring = HashRing(CLUSTER_NODES)
+    return _ring
+
+
+def doc_id_for_upload(file_hash: str) -> str:
+    """
+    doc_id of a new upload in cluster mode, derived from its content so
+    identical files land on the same node and deduplicate there.
+    """
+    return str(uuid.uuid5(DOC_ID_NAMESPACE, file_hash))
+
+
+def doc_id_of_chunk(chunk_id: str) -> str:
+    # Chunk ids are "{doc_id}_{hash}", and doc_ids never contain "_"
+    return chunk_id.split("_", 1)[0]
@@ -0,0 +1,284 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+import numpy as np
+
+CONTENT_CACHE_DB = os.getenv("CONTENT_CACHE_DB", "content_cache.db")
+# Size budget for cached chunk embeddings (bytes of vector data)
+EMBEDDING_CACHE_MAX_BYTES = int(os.getenv("EMBEDDING_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+
+_local = threading.local()
+_stats_lock = threading.Lock()
+_stats = {
+    "document_hits": 0,
+    "document_misses": 0,
+    "embedding_hits": 0,
+    "embedding_misses": 0,
+    "embedding_evictions": 0
+}
+
+
+def _conn() -> sqlite3.Connection:
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(CONTENT_CACHE_DB, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS documents (
+                sha256 TEXT PRIMARY KEY,
+                doc_id TEXT NOT NULL,
+                classification TEXT,
+                preview TEXT,
+                created_at REAL
+            )
+        """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                chunk_hash TEXT PRIMARY KEY,
+                vector BLOB NOT NULL,
+                nbytes INTEGER NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings(last_used)")
+        # Running total of embeddings.nbytes, kept in the same transaction
+        # as every insert and eviction so puts never have to sum the table
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS embedding_bytes (
+                id INTEGER PRIMARY KEY CHECK (id = 0),
+                total INTEGER NOT NULL
+            )
+        """)
+        if conn.execute("SELECT 1 FROM embedding_bytes WHERE id = 0").fetchone() is None:
+            conn.execute(
+                "INSERT OR IGNORE INTO embedding_bytes (id, total) "
+                "SELECT 0, COALESCE(SUM(nbytes), 0) FROM embeddings"
+            )
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS document_versions (
+                doc_id TEXT NOT NULL,
+                version INTEGER NOT NULL,
+                sha256 TEXT NOT NULL,
+                chunks INTEGER,
+                added INTEGER,
+                removed INTEGER,
+                created_at REAL,
+                PRIMARY KEY (doc_id, version)
+            )
+        """)
+        conn.commit()
+        _local.conn = conn
+    return conn
+
+
+def _count(key: str, n: int = 1):
+    with _stats_lock:
+        _stats[key] += n
+
+
+def hash_upload(fileobj, block_size: int = 1024 * 1024) -> str:
+    """
+    SHA-256 of an uploaded file, read in blocks so large PDFs are never
+    held in memory. The file position is rewound afterwards.
+    """
+    digest = hashlib.sha256()
+    fileobj.seek(0)
+    while True:
+        block = fileobj.read(block_size)
+        if not block:
+            break
+        digest.update(block)
+    fileobj.seek(0)
+    return digest.hexdigest()
+
+
+def hash_chunk(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def lookup_document(sha256: str):
+    """
+    Return {"doc_id", "classification", "preview"} for a previously
+    ingested file, or None.
+    """
+    row = _conn().execute(
+        "SELECT doc_id, classification, preview FROM documents WHERE sha256 = ?", (sha256,)
+    ).fetchone()
+    if row is None:
+        _count("document_misses")
+        return None
+    _count("document_hits")
+    return {
+        "doc_id": row[0],
+        "classification": json.loads(row[1]) if row[1] else None,
+        "preview": row[2]
+    }
+
+
+def register_document(sha256: str, doc_id: str, classification: dict, preview: str):
+    conn = _conn()
+    conn.execute(
+        "INSERT OR REPLACE INTO documents (sha256, doc_id, classification, preview, created_at) VALUES (?, ?, ?, ?, ?)",
+        (sha256, doc_id, json.dumps(classification), preview, time.time())
+    )
+    conn.commit()
+
+
+def document_exists(doc_id: str) -> bool:
+    conn = _conn()
+    return (
+        conn.execute("SELECT 1 FROM document_versions WHERE doc_id = ? LIMIT 1", (doc_id,)).fetchone() is not None
+        or conn.execute("SELECT 1 FROM documents WHERE doc_id = ? LIMIT 1", (doc_id,)).fetchone() is not None
+    )
+
+
+def get_document_version(doc_id: str):
+    """
+    Latest fully indexed version of a document, or None for documents
+    ingested before versions were recorded.
+    """
+    row = _conn().execute("SELECT MAX(version) FROM document_versions WHERE doc_id = ?", (doc_id,)).fetchone()
+    return row[0] if row else None
+
+
+def add_document_version(doc_id: str, version: int, sha256: str, stats: dict):
+    """
+    Record a finished (re-)index. The file hashes of older versions stop
+    deduplicating to this doc_id, since it no longer holds their content.
+    """
+    conn = _conn()
+    conn.execute(
+        "INSERT OR REPLACE INTO document_versions (doc_id, version, sha256, chunks, added, removed, created_at) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (doc_id, version, sha256, stats.get("chunks"), stats.get("added"), stats.get("removed"), time.time())
+    )
+    conn.execute("DELETE FROM documents WHERE doc_id = ? AND sha256 != ?", (doc_id, sha256))
+    conn.commit()
+
+
+def list_document_versions(doc_id: str) -> list:
+    rows = _conn().execute(
+        "SELECT version, sha256, chunks, added, removed, created_at FROM document_versions "
+        "WHERE doc_id = ? ORDER BY version", (doc_id,)
+    ).fetchall()
+    keys = ["version", "sha256", "chunks", "added", "removed", "created_at"]
+    return [dict(zip(keys, row)) for row in rows]
+
+
+def _embedding_key(namespace: str, chunk_hash: str) -> str:
+    # Rows are keyed by model as well as content; rows from before the
+    # namespace was added never match and age out of the LRU
+    return f"{namespace}|{chunk_hash}" if namespace else chunk_hash
+
+
+def get_cached_embeddings(chunk_hashes: list, namespace: str = "") -> dict:
+    """
+    Look up cached embeddings by chunk hash, among those stored under
+    `namespace` (the embedding model's identity). Hits are touched so
+    they move to the young end of the LRU.
+    """
+    if not chunk_hashes:
+        return {}
+    conn = _conn()
+    found = {}
+    unique = list(dict.fromkeys(chunk_hashes))
+    keys = {_embedding_key(namespace, h): h for h in unique}
+    key_list = list(keys)
+    # Stay under SQLite's bound-parameter limit
+    for i in range(0, len(key_list), 500):
+        part = key_list[i:i + 500]
+        placeholders = ",".join("?" * len(part))
+        rows = conn.execute(
+            f"SELECT chunk_hash, vector FROM embeddings WHERE chunk_hash IN ({placeholders})", part
+        ).fetchall()
+        for key, blob in rows:
+            found[keys[key]] = np.frombuffer(blob, dtype=np.float32)
+
+    if found:
+        now = time.time()
+        conn.executemany(
+            "UPDATE embeddings SET last_used = ? WHERE chunk_hash = ?",
+            [(now, _embedding_key(namespace, h)) for h in found]
+        )
+        conn.commit()
+
+    _count("embedding_hits", len(found))
+    _count("embedding_misses", len(unique) - len(found))
+    return found
+
+
+def put_embeddings(entries: dict, namespace: str = ""):
+    """
+    Store {chunk_hash: vector} under `namespace` and evict least recently
+    used vectors until the cache fits in EMBEDDING_CACHE_MAX_BYTES.
+    """
+    if not entries:
+        return
+    conn = _conn()
+    now = time.time()
+    rows = []
+    for chunk_hash, vector in entries.items():
+        blob = np.asarray(vector, dtype=np.float32).tobytes()
+        rows.append((_embedding_key(namespace, chunk_hash), blob, len(blob), now))
+
+    if conn.in_transaction:
+        conn.commit()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        # Replaced rows give their bytes back
+        replaced = 0
+        keys = [row[0] for row in rows]
+        for i in range(0, len(keys), 500):
+            part = keys[i:i + 500]
+            placeholders = ",".join("?" * len(part))
+            replaced += conn.execute(
+                f"SELECT COALESCE(SUM(nbytes), 0) FROM embeddings WHERE chunk_hash IN ({placeholders})", part
+            ).fetchone()[0]
+        conn.executemany(
+            "INSERT OR REPLACE INTO embeddings (chunk_hash, vector, nbytes, last_used) VALUES (?, ?, ?, ?)",
+            rows
+        )
+        total = _add_embedding_bytes(conn, sum(row[2] for row in rows) - replaced)
+
+        if total > EMBEDDING_CACHE_MAX_BYTES:
+            excess = total - EMBEDDING_CACHE_MAX_BYTES
+            victims = []
+            freed = 0
+            for chunk_hash, nbytes in conn.execute(
+                "SELECT chunk_hash, nbytes FROM embeddings ORDER BY last_used ASC"
+            ):
+                victims.append((chunk_hash,))
+                freed += nbytes
+                if freed >= excess:
+                    break
+            conn.executemany("DELETE FROM embeddings WHERE chunk_hash = ?", victims)
+            _add_embedding_bytes(conn, -freed)
+            _count("embedding_evictions", len(victims))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def _add_embedding_bytes(conn: sqlite3.Connection, delta: int) -> int:
+    conn.execute("UPDATE embedding_bytes SET total = total + ? WHERE id = 0", (delta,))
+    return conn.execute("SELECT total FROM embedding_bytes WHERE id = 0").fetchone()[0]
+
+
+def cache_stats() -> dict:
+    with _stats_lock:
+        stats = dict(_stats)
+    for kind in ("document", "embedding"):
+        lookups = stats[f"{kind}_hits"] + stats[f"{kind}_misses"]
+        stats[f"{kind}_hit_rate"] = round(stats[f"{kind}_hits"] / lookups, 4) if lookups else 0.0
+    try:
+        stats["embedding_bytes"] = _conn().execute(
+            "SELECT total FROM embedding_bytes WHERE id = 0"
+        ).fetchone()[0]
+    except sqlite3.Error:
+        stats["embedding_bytes"] = None
+    return stats
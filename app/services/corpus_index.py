@@ -0,0 +1,691 @@
+import os
+import io
+import math
+import time
+import socket
+import sqlite3
+import threading
+import numpy as np
+
+from app.services.telemetry import timed
+
+CORPUS_INDEX_DB = os.getenv("CORPUS_INDEX_DB", "corpus_index.db")
+# Index chunk vectors for cross-document search as documents are embedded
+CORPUS_SEARCH = os.getenv("CORPUS_SEARCH", "1") not in ("0", "false", "False")
+# Rows searched exactly before the first k-means training
+IVF_TRAIN_SIZE = int(os.getenv("IVF_TRAIN_SIZE", "4096"))
+# Upper bound on the number of inverted lists (sqrt(rows) otherwise)
+IVF_MAX_LISTS = int(os.getenv("IVF_MAX_LISTS", "4096"))
+# Lists scanned per query; raised automatically when filters leave too few hits
+IVF_NPROBE = int(os.getenv("IVF_NPROBE", "8"))
+# Retrain once the corpus has grown this many times past the last training
+IVF_RETRAIN_GROWTH = float(os.getenv("IVF_RETRAIN_GROWTH", "8"))
+IVF_KMEANS_ITERS = int(os.getenv("IVF_KMEANS_ITERS", "10"))
+# Drop deleted rows from memory once fewer than this fraction of loaded rows are live
+IVF_MIN_LIVE_FRACTION = float(os.getenv("IVF_MIN_LIVE_FRACTION", "0.5"))
+# Dead rows tolerated before that fraction is checked
+IVF_COMPACT_MIN_DEAD = 1024
+# Delete log entries are kept until every process that searched within
+# this many seconds has replayed them; a process idle for longer reloads
+# the corpus if entries it missed were pruned
+CORPUS_READER_TTL = float(os.getenv("CORPUS_READER_TTL", "3600"))
+# How often a process records how far it has replayed the delete log
+CORPUS_READER_REPORT_SECONDS = 60
+
+_local = threading.local()
+_index = None
+_index_lock = threading.Lock()
+
+
+def _conn() -> sqlite3.Connection:
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(CORPUS_INDEX_DB, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS corpus_docs (
+                doc_id TEXT PRIMARY KEY,
+                contract_type TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS corpus_chunks (
+                row INTEGER PRIMARY KEY AUTOINCREMENT,
+                chunk_id TEXT NOT NULL UNIQUE,
+                doc_id TEXT NOT NULL,
+                page INTEGER,
+                page_end INTEGER,
+                char_start INTEGER,
+                char_end INTEGER,
+                vector BLOB NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_corpus_chunks_doc ON corpus_chunks(doc_id)")
+        # Append-only log of removed rows so every process can replay deletes
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS corpus_deleted (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                row INTEGER NOT NULL
+            )
+        """)
+        # Delete log entries up to seq have been pruned
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS corpus_deleted_pruned (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                seq INTEGER NOT NULL
+            )
+        """)
+        # How far each process has replayed the delete log
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS corpus_readers (
+                reader TEXT PRIMARY KEY,
+                last_delete INTEGER NOT NULL,
+                seen_at REAL NOT NULL
+            )
+        """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS corpus_centroids (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                generation INTEGER NOT NULL,
+                trained_rows INTEGER NOT NULL,
+                centroids BLOB NOT NULL
+            )
+        """)
+        conn.commit()
+        _local.conn = conn
+    return conn
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def _to_blob(array: np.ndarray) -> bytes:
+    buffer = io.BytesIO()
+    np.save(buffer, array)
+    return buffer.getvalue()
+
+
+def _from_blob(blob: bytes) -> np.ndarray:
+    return np.load(io.BytesIO(blob))
+
+
+def train_centroids(sample: np.ndarray, lists: int, iters: int = IVF_KMEANS_ITERS, seed: int = 0) -> np.ndarray:
+    """
+    Spherical k-means over unit rows; returns (lists, dim) unit centroids.
+    """
+    rng = np.random.default_rng(seed)
+    sample = np.asarray(sample, dtype=np.float32)
+    centroids = sample[rng.choice(len(sample), size=lists, replace=False)].copy()
+    for _ in range(iters):
+        assign = np.argmax(sample @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, sample)
+        counts = np.bincount(assign, minlength=lists)
+        empty = counts == 0
+        # Reseed empty lists from random rows so no list stays dead
+        sums[empty] = sample[rng.choice(len(sample), size=int(empty.sum()))]
+        centroids = _normalize(sums)
+    return centroids
+
+
+def _assign(centroids, matrix: np.ndarray) -> np.ndarray:
+    if centroids is None:
+        return np.zeros(len(matrix), dtype=np.int64)
+    assign = np.empty(len(matrix), dtype=np.int64)
+    for start in range(0, len(matrix), 8192):
+        block = np.asarray(matrix[start:start + 8192], dtype=np.float32)
+        assign[start:start + 8192] = np.argmax(block @ centroids.T, axis=1)
+    return assign
+
+
+def _place(buckets: list, centroids, matrix: np.ndarray, positions: np.ndarray):
+    assign = _assign(centroids, matrix)
+    order = np.argsort(assign, kind="stable")
+    bounds = np.searchsorted(assign[order], np.arange(len(buckets) + 1))
+    for lst in range(len(buckets)):
+        chosen = order[bounds[lst]:bounds[lst + 1]]
+        if len(chosen):
+            buckets[lst].append(matrix[chosen], positions[chosen])
+
+
+class _Bucket:
+    """
+    Growable (vectors, positions) pair for one inverted list.
+    """
+
+    def __init__(self, dim: int):
+        self.vectors = np.empty((0, dim), dtype=np.float16)
+        self.positions = np.empty(0, dtype=np.int64)
+        self.size = 0
+
+    def append(self, vectors: np.ndarray, positions: np.ndarray):
+        needed = self.size + len(positions)
+        if needed > len(self.positions):
+            capacity = max(needed, 2 * len(self.positions), 64)
+            grown = np.empty((capacity, self.vectors.shape[1]), dtype=np.float16)
+            grown[:self.size] = self.vectors[:self.size]
+            self.vectors = grown
+            moved = np.empty(capacity, dtype=np.int64)
+            moved[:self.size] = self.positions[:self.size]
+            self.positions = moved
+        self.vectors[self.size:needed] = vectors
+        self.positions[self.size:needed] = positions
+        self.size = needed
+
+
+class CorpusIndex:
+    """
+    IVF index over every chunk in the corpus. SQLite holds the rows
+    (normalised float16 vectors plus chunk and document metadata) and the
+    trained centroids, so every worker process sees the same corpus; each
+    process keeps the vectors in memory, partitioned into inverted lists,
+    and catches up with new rows, deletes and retrains on each search.
+
+    Until IVF_TRAIN_SIZE rows exist everything lives in one list and
+    search is exact. The first process to cross that size trains
+    sqrt(rows) centroids with k-means and publishes them; after that a
+    query scores the centroids and scans only the closest IVF_NPROBE
+    lists, so its cost grows with sqrt(corpus) rather than the corpus.
+    New rows are assigned to their nearest centroid as they arrive, and
+    centroids are retrained when the corpus has grown IVF_RETRAIN_GROWTH
+    times past the last training.
+
+    Training and re-bucketing (for new centroids from any process, or to
+    drop deleted rows once fewer than IVF_MIN_LIVE_FRACTION of the loaded
+    rows are live) run in a background thread; searches keep using the
+    current lists until the rebuilt ones are swapped in. After a rebuild
+    the delete log is pruned up to what every recently seen process has
+    replayed.
+
+    Each worker process holds its own in-memory copy of the loaded
+    vectors: about rows * dim * 2 bytes (float16), e.g. ~770 MB per
+    process for a million 384-dimensional chunks. stats() reports it as
+    memory_mb.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._reported = 0.0
+        self._rebuilding = False
+        self._idle = threading.Event()
+        self._idle.set()
+        self._reset()
+
+    def _reset(self):
+        # Empty in-memory view; the next sync loads the corpus again
+        self._dim = None
+        self._generation = 0
+        self._trained_rows = 0
+        self._centroids = None
+        self._buckets = []
+        self._last_row = 0
+        self._last_delete = 0
+        self._last_doc_update = 0.0
+        # Per loaded row (by position): SQLite row id, doc ordinal, liveness
+        self._rows = np.empty(0, dtype=np.int64)
+        self._row_doc = np.empty(0, dtype=np.int32)
+        self._live = np.empty(0, dtype=bool)
+        self._count = 0
+        self._live_count = 0
+        # Per document (by ordinal)
+        self._doc_ordinals = {}
+        self._doc_ids = []
+        self._doc_type = []
+        self._doc_time = []
+
+    # -- writes ------------------------------------------------------
+
+    def set_document(self, doc_id: str, contract_type: str = None, created_at: float = None):
+        """
+        Record (or update) the attributes search filters on.
+        """
+        now = time.time()
+        conn = _conn()
+        with conn:
+            conn.execute(
+                "INSERT INTO corpus_docs (doc_id, contract_type, created_at, updated_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(doc_id) DO UPDATE SET contract_type = COALESCE(excluded.contract_type, contract_type), "
+                "updated_at = excluded.updated_at",
+                (doc_id, contract_type, created_at or now, now)
+            )
+
+    @timed("corpus_add")
+    def add(self, doc_id: str, vectors: list):
+        """
+        Insert chunk vectors (Pinecone-shaped dicts) for a document.
+        Re-adding an id replaces its row.
+        """
+        if not vectors:
+            return
+        matrix = _normalize(np.asarray([v["values"] for v in vectors], dtype=np.float32)).astype(np.float16)
+        now = time.time()
+        conn = _conn()
+        with conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO corpus_docs (doc_id, contract_type, created_at, updated_at) VALUES (?, NULL, ?, ?)",
+                (doc_id, now, now)
+            )
+            self._tombstone(conn, [v["id"] for v in vectors])
+            conn.executemany(
+                "INSERT INTO corpus_chunks (chunk_id, doc_id, page, page_end, char_start, char_end, vector) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (v["id"], doc_id, meta.get("page"), meta.get("page_end"), meta.get("char_start"),
+                     meta.get("char_end"), row.tobytes())
+                    for v, row in zip(vectors, matrix) for meta in [v.get("metadata", {})]
+                ]
+            )
+
+    def _tombstone(self, conn, chunk_ids: list):
+        rows = []
+        for i in range(0, len(chunk_ids), 500):
+            part = chunk_ids[i:i + 500]
+            rows.extend(r for (r,) in conn.execute(
+                f"SELECT row FROM corpus_chunks WHERE chunk_id IN ({','.join('?' * len(part))})", part
+            ))
+        if rows:
+            conn.executemany("INSERT INTO corpus_deleted (row) VALUES (?)", [(r,) for r in rows])
+            conn.executemany("DELETE FROM corpus_chunks WHERE row = ?", [(r,) for r in rows])
+
+    def update_positions(self, vectors: list):
+        """
+        Refresh page/offset metadata of chunks whose text is unchanged but
+        which moved within a new version of their document.
+        """
+        if not vectors:
+            return
+        conn = _conn()
+        with conn:
+            conn.executemany(
+                "UPDATE corpus_chunks SET page = ?, page_end = ?, char_start = ?, char_end = ? WHERE chunk_id = ?",
+                [(m.get("page"), m.get("page_end"), m.get("char_start"), m.get("char_end"), v["id"])
+                 for v in vectors for m in [v.get("metadata", {})]]
+            )
+
+    def delete(self, chunk_ids: list):
+        conn = _conn()
+        with conn:
+            self._tombstone(conn, list(chunk_ids))
+
+    def delete_document(self, doc_id: str):
+        conn = _conn()
+        with conn:
+            ids = [cid for (cid,) in conn.execute("SELECT chunk_id FROM corpus_chunks WHERE doc_id = ?", (doc_id,))]
+            self._tombstone(conn, ids)
+            conn.execute("DELETE FROM corpus_docs WHERE doc_id = ?", (doc_id,))
+
+    # -- in-memory state ----------------------------------------------
+
+    def _doc_ordinal(self, doc_id: str) -> int:
+        ordinal = self._doc_ordinals.get(doc_id)
+        if ordinal is None:
+            ordinal = len(self._doc_ids)
+            self._doc_ordinals[doc_id] = ordinal
+            self._doc_ids.append(doc_id)
+            self._doc_type.append(None)
+            self._doc_time.append(0.0)
+        return ordinal
+
+    def _grow_rows(self, needed: int):
+        if needed <= len(self._rows):
+            return
+        capacity = max(needed, 2 * len(self._rows), 1024)
+        for name, dtype in (("_rows", np.int64), ("_row_doc", np.int32), ("_live", bool)):
+            old = getattr(self, name)
+            grown = np.zeros(capacity, dtype=dtype)
+            grown[:self._count] = old[:self._count]
+            setattr(self, name, grown)
+
+    def _adopt(self, centroids: np.ndarray, generation: int, trained_rows: int):
+        # Only while nothing is loaded, so there is nothing to re-bucket
+        self._centroids = centroids
+        self._generation = generation
+        self._trained_rows = trained_rows
+        self._dim = centroids.shape[1]
+        self._buckets = [_Bucket(self._dim) for _ in range(len(centroids))]
+
+    def _publish(self, centroids: np.ndarray, trained_rows: int, generation: int):
+        # Compare-and-swap: the first process to train a generation wins.
+        # Returns the new generation, or None if another process won.
+        conn = _conn()
+        with conn:
+            if generation == 0:
+                cursor = conn.execute(
+                    "INSERT OR IGNORE INTO corpus_centroids (id, generation, trained_rows, centroids) VALUES (1, 1, ?, ?)",
+                    (trained_rows, _to_blob(centroids))
+                )
+            else:
+                cursor = conn.execute(
+                    "UPDATE corpus_centroids SET generation = generation + 1, trained_rows = ?, centroids = ? "
+                    "WHERE id = 1 AND generation = ?",
+                    (trained_rows, _to_blob(centroids), generation)
+                )
+        return generation + 1 if cursor.rowcount else None
+
+    def _maybe_rebuild(self, published):
+        # Centroids another process published, else training, else compaction
+        if self._rebuilding or self._dim is None:
+            return
+        if published is not None and published[0] != self._generation:
+            args = (_from_blob(published[2]), published[0], published[1])
+        elif self._live_count >= IVF_TRAIN_SIZE and (
+            self._centroids is None or self._live_count >= self._trained_rows * IVF_RETRAIN_GROWTH
+        ):
+            args = (None, None, None)
+        elif (self._count - self._live_count >= IVF_COMPACT_MIN_DEAD
+              and self._live_count < self._count * IVF_MIN_LIVE_FRACTION):
+            args = (self._centroids, self._generation, self._trained_rows)
+        else:
+            return
+        self._rebuilding = True
+        self._idle.clear()
+        threading.Thread(target=self._rebuild, args=args, name="corpus-index-rebuild", daemon=True).start()
+
+    def _rebuild(self, centroids, generation, trained_rows):
+        """
+        Re-bucket every live row under `centroids` (training and
+        publishing new ones if generation is None), leaving deleted rows
+        out, then swap the new lists in.
+        """
+        try:
+            with self._lock:
+                count = self._count
+                applied = self._last_delete
+                live = self._live[:count].copy()
+                parts = [(b.vectors[:b.size], b.positions[:b.size]) for b in self._buckets]
+                current = self._generation
+            matrix = np.concatenate([v for v, _ in parts])
+            positions = np.concatenate([p for _, p in parts])
+            alive = live[positions]
+            matrix, positions = matrix[alive], positions[alive]
+
+            if generation is None:
+                if not len(positions):
+                    return
+                lists = max(1, min(IVF_MAX_LISTS, int(math.sqrt(len(positions)))))
+                rng = np.random.default_rng(current)
+                # k-means on a sample is plenty to place the centroids
+                picked = rng.choice(len(positions), size=min(len(positions), lists * 64), replace=False)
+                sample = matrix[picked].astype(np.float32)
+                started = time.perf_counter()
+                centroids = train_centroids(sample, min(lists, len(sample)), seed=current).astype(np.float32)
+                trained_rows = len(positions)
+                generation = self._publish(centroids, trained_rows, current)
+                if generation is None:
+                    return  # the winner's centroids arrive with the next sync
+                print(f"Trained {len(centroids)} corpus index lists on {len(sample)} of {trained_rows} rows "
+                      f"in {time.perf_counter() - started:.2f}s")
+
+            # Live rows are renumbered densely in their old order
+            kept = int(live.sum())
+            remap = np.cumsum(live) - 1
+            buckets = [_Bucket(self._dim) for _ in range(1 if centroids is None else len(centroids))]
+            _place(buckets, centroids, matrix, remap[positions])
+
+            with self._lock:
+                # Rows loaded meanwhile are still in the old lists
+                late = [(b.vectors[:b.size][sel], b.positions[:b.size][sel])
+                        for b in self._buckets for sel in [b.positions[:b.size] >= count] if sel.any()]
+                if late:
+                    _place(buckets, centroids, np.concatenate([v for v, _ in late]),
+                           np.concatenate([p for _, p in late]) - count + kept)
+                self._rows = np.concatenate([self._rows[:count][live], self._rows[count:self._count]])
+                self._row_doc = np.concatenate([self._row_doc[:count][live], self._row_doc[count:self._count]])
+                # Deletes that arrived meanwhile are carried over
+                self._live = np.concatenate([self._live[:count][live], self._live[count:self._count]])
+                self._count = len(self._rows)
+                self._live_count = int(self._live.sum())
+                self._buckets = buckets
+                self._centroids = centroids
+                self._generation = generation
+                self._trained_rows = trained_rows
+            self._prune_deletes(applied)
+        except Exception as e:
+            print(f"Error rebuilding corpus index lists: {e}")
+        finally:
+            with self._lock:
+                self._rebuilding = False
+                self._idle.set()
+
+    def _prune_deletes(self, applied: int):
+        # Drop delete log entries this process has compacted away and
+        # every process seen within CORPUS_READER_TTL has replayed
+        conn = _conn()
+        cutoff = time.time() - CORPUS_READER_TTL
+        with conn:
+            conn.execute("DELETE FROM corpus_readers WHERE seen_at <= ?", (cutoff,))
+            (replayed,) = conn.execute("SELECT MIN(last_delete) FROM corpus_readers").fetchone()
+            upto = applied if replayed is None else min(applied, replayed)
+            if upto <= 0:
+                return
+            conn.execute("DELETE FROM corpus_deleted WHERE seq <= ?", (upto,))
+            conn.execute(
+                "INSERT INTO corpus_deleted_pruned (id, seq) VALUES (1, ?) "
+                "ON CONFLICT(id) DO UPDATE SET seq = MAX(seq, excluded.seq)", (upto,)
+            )
+
+    def wait_for_rebuild(self, timeout: float = None) -> bool:
+        """
+        Block until no background rebuild is running.
+        """
+        return self._idle.wait(timeout)
+
+    def _sync(self):
+        conn = _conn()
+        with self._lock:
+            published = conn.execute(
+                "SELECT generation, trained_rows, centroids FROM corpus_centroids WHERE id = 1"
+            ).fetchone()
+            pruned = conn.execute("SELECT seq FROM corpus_deleted_pruned WHERE id = 1").fetchone()
+            if pruned is not None and pruned[0] > self._last_delete:
+                if self._count and not self._rebuilding:
+                    # Deletes this process never replayed are gone from the log
+                    print("Corpus index missed pruned deletes; reloading")
+                    self._reset()
+                if not self._count:
+                    self._last_delete = pruned[0]
+            if published is not None and self._count == 0 and published[0] != self._generation:
+                self._adopt(_from_blob(published[2]), published[0], published[1])
+
+            fresh = conn.execute(
+                "SELECT row, doc_id, vector FROM corpus_chunks WHERE row > ? ORDER BY row", (self._last_row,)
+            ).fetchall()
+            if fresh:
+                matrix = np.frombuffer(b"".join(r[2] for r in fresh), dtype=np.float16).reshape(len(fresh), -1)
+                if self._dim is None:
+                    self._dim = matrix.shape[1]
+                    self._buckets = [_Bucket(self._dim)]
+                start = self._count
+                self._grow_rows(start + len(fresh))
+                self._rows[start:start + len(fresh)] = [r[0] for r in fresh]
+                self._row_doc[start:start + len(fresh)] = [self._doc_ordinal(r[1]) for r in fresh]
+                self._live[start:start + len(fresh)] = True
+                self._count += len(fresh)
+                self._live_count += len(fresh)
+                self._last_row = fresh[-1][0]
+                _place(self._buckets, self._centroids, matrix, np.arange(start, start + len(fresh)))
+
+            removed = conn.execute(
+                "SELECT seq, row FROM corpus_deleted WHERE seq > ? ORDER BY seq", (self._last_delete,)
+            ).fetchall()
+            if removed:
+                self._last_delete = removed[-1][0]
+                rows = np.asarray([r[1] for r in removed], dtype=np.int64)
+                positions = np.searchsorted(self._rows[:self._count], rows)
+                positions = positions[positions < self._count]
+                positions = positions[np.isin(self._rows[positions], rows)]
+                self._live_count -= int(self._live[positions].sum())
+                self._live[positions] = False
+            now = time.time()
+            if self._count and (removed or now - self._reported >= CORPUS_READER_REPORT_SECONDS):
+                with conn:
+                    conn.execute(
+                        "INSERT INTO corpus_readers (reader, last_delete, seen_at) VALUES (?, ?, ?) "
+                        "ON CONFLICT(reader) DO UPDATE SET last_delete = excluded.last_delete, seen_at = excluded.seen_at",
+                        # Looked up here, as the index may be created before a fork
+                        (f"{socket.gethostname()}:{os.getpid()}", self._last_delete, now)
+                    )
+                self._reported = now
+
+            for doc_id, contract_type, created_at, updated_at in conn.execute(
+                "SELECT doc_id, contract_type, created_at, updated_at FROM corpus_docs WHERE updated_at > ?",
+                (self._last_doc_update,)
+            ):
+                ordinal = self._doc_ordinal(doc_id)
+                self._doc_type[ordinal] = contract_type
+                self._doc_time[ordinal] = created_at
+                self._last_doc_update = max(self._last_doc_update, updated_at)
+
+            self._maybe_rebuild(published)
+
+    # -- reads --------------------------------------------------------
+
+    def vector_for(self, chunk_id: str):
+        """
+        Stored (unit) vector and doc_id of a chunk, or None.
+        """
+        found = _conn().execute("SELECT vector, doc_id FROM corpus_chunks WHERE chunk_id = ?", (chunk_id,)).fetchone()
+        if found is None:
+            return None
+        return np.frombuffer(found[0], dtype=np.float16).astype(np.float32), found[1]
+
+    def _allowed_docs(self, contract_types, date_from, date_to, exclude_docs) -> np.ndarray:
+        allowed = np.ones(len(self._doc_ids), dtype=bool)
+        if contract_types:
+            wanted = {t.lower() for t in contract_types}
+            allowed &= np.fromiter(((t or "").lower() in wanted for t in self._doc_type), dtype=bool,
+                                   count=len(self._doc_ids))
+        if date_from is not None or date_to is not None:
+            times = np.asarray(self._doc_time, dtype=np.float64)
+            if date_from is not None:
+                allowed &= times >= date_from
+            if date_to is not None:
+                allowed &= times < date_to
+        for doc_id in exclude_docs or ():
+            if doc_id in self._doc_ordinals:
+                allowed[self._doc_ordinals[doc_id]] = False
+        return allowed
+
+    @timed("corpus_search")
+    def search(self, vector, top_k: int = 10, contract_types: list = None, date_from: float = None,
+               date_to: float = None, exclude_docs: list = None, per_doc: int = 1, nprobe: int = IVF_NPROBE) -> dict:
+        """
+        Top-k chunks across the corpus for a query vector, at most
+        `per_doc` from any one document. `date_from`/`date_to` are epoch
+        seconds bounding the document's indexing time.
+        """
+        self._sync()
+        query = np.asarray(vector, dtype=np.float32).ravel()
+        norm = np.linalg.norm(query)
+        with self._lock:
+            info = {"rows": self._live_count, "lists": len(self._buckets), "probed": 0, "candidates": 0}
+            if norm == 0 or self._live_count == 0:
+                return {"matches": [], "searched": info}
+            query = query / norm
+            allowed = self._allowed_docs(contract_types, date_from, date_to, exclude_docs)
+            if not allowed.any():
+                return {"matches": [], "searched": info}
+
+            if self._centroids is None:
+                order = [0]
+            else:
+                order = np.argsort(-(self._centroids @ query)).tolist()
+            wanted = top_k * max(1, per_doc)
+            probed = 0
+            scores, positions = [], []
+            step = max(1, nprobe)
+            found = 0
+            # Widen the probe when filters leave fewer than top_k candidates
+            while probed < len(order) and (probed == 0 or found < wanted):
+                for lst in order[probed:probed + step]:
+                    bucket = self._buckets[lst]
+                    if not bucket.size:
+                        continue
+                    pos = bucket.positions[:bucket.size]
+                    keep = self._live[pos] & allowed[self._row_doc[pos]]
+                    if not keep.any():
+                        continue
+                    rows = bucket.vectors[:bucket.size] if keep.all() else bucket.vectors[:bucket.size][keep]
+                    scores.append(np.asarray(rows, dtype=np.float32) @ query)
+                    positions.append(pos if keep.all() else pos[keep])
+                    found += len(positions[-1])
+                probed += step
+                step *= 2
+            info["probed"] = min(probed, len(order))
+            info["candidates"] = found
+            if not found:
+                return {"matches": [], "searched": info}
+
+            scores = np.concatenate(scores)
+            positions = np.concatenate(positions)
+            # Enough of the best candidates to fill top_k under the per-doc cap
+            pool = min(len(scores), wanted * 4)
+            best = np.argpartition(-scores, pool - 1)[:pool]
+            best = best[np.argsort(-scores[best])]
+            per_doc_seen, picked = {}, []
+            for i in best:
+                doc = int(self._row_doc[positions[i]])
+                if per_doc and per_doc_seen.get(doc, 0) >= per_doc:
+                    continue
+                per_doc_seen[doc] = per_doc_seen.get(doc, 0) + 1
+                picked.append((float(scores[i]), int(self._rows[positions[i]])))
+                if len(picked) == top_k:
+                    break
+
+        if not picked:
+            return {"matches": [], "searched": info}
+        rows = [row for _, row in picked]
+        details = {
+            r[0]: r[1:] for r in _conn().execute(
+                "SELECT c.row, c.chunk_id, c.doc_id, c.page, c.page_end, c.char_start, c.char_end, "
+                "d.contract_type, d.created_at FROM corpus_chunks c LEFT JOIN corpus_docs d ON d.doc_id = c.doc_id "
+                f"WHERE c.row IN ({','.join('?' * len(rows))})", rows
+            )
+        }
+        matches = []
+        for score, row in picked:
+            if row not in details:
+                continue  # deleted since the in-memory view was synced
+            chunk_id, doc_id, page, page_end, char_start, char_end, contract_type, created_at = details[row]
+            matches.append({
+                "id": chunk_id,
+                "doc_id": doc_id,
+                "score": round(score, 6),
+                "contract_type": contract_type,
+                "indexed_at": created_at,
+                "page": page,
+                "page_end": page_end,
+                "char_start": char_start,
+                "char_end": char_end
+            })
+        return {"matches": matches, "searched": info}
+
+    def stats(self) -> dict:
+        with self._lock:
+            sizes = [b.size for b in self._buckets]
+            return {
+                "rows": self._live_count,
+                "documents": len(self._doc_ids),
+                "lists": len(self._buckets),
+                "trained": self._centroids is not None,
+                "generation": self._generation,
+                "rebuilding": self._rebuilding,
+                "dead_rows": self._count - self._live_count,
+                "largest_list": max(sizes) if sizes else 0,
+                "memory_mb": round(sum(b.vectors.nbytes for b in self._buckets) / 1e6, 1)
+            }
+
+
+def get_corpus_index() -> CorpusIndex:
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = CorpusIndex()
+    return _index
@@ -0,0 +1,139 @@
+import os
+import time
+import queue
+import threading
+from bisect import bisect_left
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import Callable, List
+import numpy as np
+
+EMBED_WORKER = os.getenv("EMBED_WORKER", "1") not in ("0", "false", "False")
+EMBED_MAX_BATCH = int(os.getenv("EMBED_MAX_BATCH", "64"))
+EMBED_MAX_WAIT_MS = float(os.getenv("EMBED_MAX_WAIT_MS", "10"))
+
+# Upper bounds of the batch-size histogram buckets
+_BATCH_BUCKETS = [1, 2, 4, 8, 16, 32, 64, 128, 256]
+
+_worker = None
+_worker_lock = threading.Lock()
+
+
+@dataclass
+class _Request:
+    texts: List[str]
+    future: Future
+
+
+class EmbeddingWorker:
+    """
+    Single thread that owns the embedding model. Callers from any thread
+    submit texts and get a Future; the worker coalesces whatever is
+    queued into one encode call, flushing when EMBED_MAX_BATCH texts are
+    gathered or EMBED_MAX_WAIT_MS has passed since the first arrived.
+    """
+
+    def __init__(self, model_loader: Callable, max_batch: int = EMBED_MAX_BATCH, max_wait_ms: float = EMBED_MAX_WAIT_MS):
+        self._model_loader = model_loader
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = queue.Queue()
+        self._pending_texts = 0
+        self._stats_lock = threading.Lock()
+        self._batches = 0
+        self._texts = 0
+        self._encode_seconds = 0.0
+        self._histogram = [0] * (len(_BATCH_BUCKETS) + 1)
+        self._started = time.monotonic()
+        self._thread = threading.Thread(target=self._run, name="embedding-worker", daemon=True)
+        self._thread.start()
+
+    def submit(self, texts: List[str]) -> Future:
+        future = Future()
+        if not texts:
+            future.set_result(np.zeros((0, 0), dtype=np.float32))
+            return future
+        with self._stats_lock:
+            self._pending_texts += len(texts)
+        self._queue.put(_Request(list(texts), future))
+        return future
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        return self.submit(texts).result()
+
+    def _collect(self) -> List[_Request]:
+        requests = [self._queue.get()]
+        count = len(requests[0].texts)
+        deadline = time.monotonic() + self.max_wait
+        while count < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            requests.append(request)
+            count += len(request.texts)
+        return requests
+
+    def _run(self):
+        while True:
+            requests = self._collect()
+            texts = [text for request in requests for text in request.texts]
+            with self._stats_lock:
+                self._pending_texts -= len(texts)
+
+            started = time.perf_counter()
+            try:
+                model = self._model_loader()
+                if model is None:
+                    raise RuntimeError("Embedding model is not available")
+                vectors = np.asarray(
+                    model.encode(texts, batch_size=self.max_batch, show_progress_bar=False),
+                    dtype=np.float32
+                )
+            except Exception as e:
+                for request in requests:
+                    request.future.set_exception(e)
+                continue
+            elapsed = time.perf_counter() - started
+
+            offset = 0
+            for request in requests:
+                request.future.set_result(vectors[offset:offset + len(request.texts)])
+                offset += len(request.texts)
+
+            with self._stats_lock:
+                self._batches += 1
+                self._texts += len(texts)
+                self._encode_seconds += elapsed
+                self._histogram[bisect_left(_BATCH_BUCKETS, len(texts))] += 1
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            uptime = time.monotonic() - self._started
+            histogram = {}
+            for bound, count in zip(_BATCH_BUCKETS + ["inf"], self._histogram):
+                histogram[f"<={bound}"] = count
+            return {
+                "queue_depth": self._queue.qsize(),
+                "queued_texts": self._pending_texts,
+                "batches": self._batches,
+                "texts": self._texts,
+                "avg_batch_size": round(self._texts / self._batches, 2) if self._batches else 0.0,
+                "batch_size_histogram": histogram,
+                "encode_seconds": round(self._encode_seconds, 3),
+                "texts_per_encode_second": round(self._texts / self._encode_seconds, 1) if self._encode_seconds else 0.0,
+                "texts_per_second": round(self._texts / uptime, 1) if uptime else 0.0
+            }
+
+
+def get_embedding_worker() -> EmbeddingWorker:
+    global _worker
+    if _worker is None:
+        with _worker_lock:
+            if _worker is None:
+                from app.services.embeddings import get_model
+                _worker = EmbeddingWorker(get_model)
+    return _worker
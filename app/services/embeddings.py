@@ -1,13 +1,25 @@
 import os
+import time
 import socket
 from dotenv import load_dotenv
-from sentence_transformers import SentenceTransformer
-from pinecone import Pinecone, ServerlessSpec
+from app.services.vector_store import get_vector_store
+from app.services.model_backend import load_sentence_transformer, MODEL_BACKEND
+from app.services.chunker import iter_chunks
+from app.services.embedding_worker import get_embedding_worker, EMBED_WORKER
+from app.services.content_cache import hash_chunk, get_cached_embeddings, put_embeddings
+from app.services.telemetry import timed, span, record_span, MODEL_LOAD_SECONDS
+from app.services.upsert_writer import get_upsert_writer, wait_all, UPSERT_MAX_IN_FLIGHT
+from app.services.text_store import get_text_store, CHUNK_TEXT_IN_METADATA
+from app.services.corpus_index import get_corpus_index, CORPUS_SEARCH
+from app.services.lexical_index import get_lexical_index, DocIndexBuilder, HYBRID_RETRIEVAL
 
 load_dotenv()
 
+EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+
 # Global state for connection reusing
 _model = None
+_cache_namespace = None
 _index = None
 _pc = None
 
@@ -15,14 +27,16 @@ def get_model():
     global _model
     if _model is None:
         try:
-            print("Loading embedding model (all-MiniLM-L6-v2)...")
+            print(f"Loading embedding model ({EMBEDDING_MODEL}, backend={MODEL_BACKEND})...")
             
             # Set a request timeout for model download
             original_timeout = socket.getdefaulttimeout()
             socket.setdefaulttimeout(60) 
             
             try:
-                _model = SentenceTransformer("all-MiniLM-L6-v2")
+                started = time.perf_counter()
+                _model = load_sentence_transformer(EMBEDDING_MODEL)
+                MODEL_LOAD_SECONDS.set(time.perf_counter() - started, model="embedding")
                 print("Embedding model loaded.")
             finally:
                 socket.setdefaulttimeout(original_timeout)
@@ -49,6 +63,9 @@ def get_pinecone_index():
             socket.setdefaulttimeout(30)
             
             try:
+                # Imported here so startup doesn't pay for the client
+                from pinecone import Pinecone, ServerlessSpec
+
                 if _pc is None:
                     _pc = Pinecone(api_key=api_key)
                 
@@ -63,7 +80,8 @@ def get_pinecone_index():
                         spec=ServerlessSpec(cloud="aws", region="us-east-1")
                     )
                 
-                _index = _pc.Index(index_name)
+                # One pooled connection per concurrent upsert
+                _index = _pc.Index(index_name, pool_threads=UPSERT_MAX_IN_FLIGHT)
                 print("Pinecone connection established.")
             finally:
                 socket.setdefaulttimeout(original_timeout)
@@ -73,52 +91,242 @@ def get_pinecone_index():
             return None
     return _index
 
+@timed("encode")
+def encode_texts(texts: list):
+    """
+    Encode a list of texts. With EMBED_WORKER enabled (default) the call
+    is queued on the shared embedding worker and batched together with
+    concurrent callers.
+    """
+    if EMBED_WORKER:
+        return get_embedding_worker().encode(texts)
+    return get_model().encode(texts, batch_size=64, show_progress_bar=False)
+
 def embed_text(text: str):
     model = get_model()
     if model is None:
         return []
-    return model.encode(text).tolist()
+    return encode_texts([text])[0].tolist()
 
-def store_embeddings(text: str, doc_id: str):
+def embedding_cache_namespace() -> str:
     """
-    Chunks text and stores embeddings in Pinecone.
+    Identity of the loaded embedding model (name, backend, class and
+    dimension). Cached vectors are only reused for the same model.
     """
-    index = get_pinecone_index()
+    global _cache_namespace
+    model = get_model()
+    if _cache_namespace is None or _cache_namespace[0] is not model:
+        dim = getattr(model, "get_sentence_embedding_dimension", lambda: getattr(model, "dim", None))()
+        _cache_namespace = (model, f"{EMBEDDING_MODEL}:{MODEL_BACKEND}:{type(model).__name__}:{dim}")
+    return _cache_namespace[1]
+
+def encode_chunks(chunks: list, hashes: list = None):
+    """
+    Encode chunks, reusing cached embeddings for any chunk whose content
+    hash has been seen before by the same model. Only cache misses reach
+    the model.
+    """
+    if hashes is None:
+        hashes = [hash_chunk(chunk) for chunk in chunks]
+    namespace = embedding_cache_namespace()
+    cached = get_cached_embeddings(hashes, namespace)
+
+    missing = {}
+    for chunk_hash, chunk in zip(hashes, chunks):
+        if chunk_hash not in cached and chunk_hash not in missing:
+            missing[chunk_hash] = chunk
+
+    if missing:
+        fresh = encode_texts(list(missing.values()))
+        fresh_entries = dict(zip(missing.keys(), fresh))
+        put_embeddings(fresh_entries, namespace)
+        cached.update(fresh_entries)
+
+    return [cached[chunk_hash] for chunk_hash in hashes]
+
+# Chunks per encode + upsert round (Pinecone limit is usually ~100-200 vectors per request)
+INDEX_BATCH_SIZE = 100
+# Ids per delete call when dropping chunks a new version no longer has
+DELETE_BATCH_SIZE = 1000
+
+def _chunk_metadata(doc_id: str, chunk) -> dict:
+    return {
+        "doc_id": doc_id,
+        "type": "contract_chunk",
+        "page": chunk.page,
+        "page_end": chunk.page_end,
+        "char_start": chunk.char_start,
+        "char_end": chunk.char_end
+    }
+
+def _index_chunks(doc_id: str, chunks: list, hashes: list, ids: list) -> list:
+    # Batch encode for performance, skipping chunks we've embedded before
+    embeddings = encode_chunks([chunk.text for chunk in chunks], hashes)
+
+    # Rows stay numpy arrays; the Pinecone adapter converts them to lists
+    # on the upsert thread. Chunk text goes to the local text store and
+    # is loaded lazily at retrieval time instead of riding along in
+    # every vector's metadata.
+    vectors = []
+    texts = []
+    for chunk_id, chunk, embedding in zip(ids, chunks, embeddings):
+        metadata = _chunk_metadata(doc_id, chunk)
+        if CHUNK_TEXT_IN_METADATA:
+            metadata["text"] = chunk.text
+        vectors.append({"id": chunk_id, "values": embedding, "metadata": metadata})
+        texts.append((chunk_id, chunk.text))
+    get_text_store().put(doc_id, texts)
+    if CORPUS_SEARCH:
+        get_corpus_index().add(doc_id, vectors)
+    # Returns at once unless too many upserts are already in flight, so
+    # the next batch is encoded while this one is being written
+    return get_upsert_writer().submit(vectors)
+
+def _delete_chunks(doc_id: str, ids: list):
+    index = get_vector_store()
+    for i in range(0, len(ids), DELETE_BATCH_SIZE):
+        index.delete(ids=ids[i:i + DELETE_BATCH_SIZE], filter={"doc_id": doc_id})
+    get_text_store().delete(doc_id, ids)
+    if CORPUS_SEARCH:
+        get_corpus_index().delete(ids)
+
+def store_page_embeddings(pages, doc_id: str, contract_type: str = None, stats: dict = None):
+    """
+    Chunk, embed and upsert a document from an iterable of page texts.
+    Accepts a generator, so indexing starts while later pages are still
+    being parsed. Returns the number of chunks indexed, or None if the
+    vector store or model is unavailable or indexing failed.
+    `contract_type`, if already known, is recorded for corpus search.
+
+    Chunk ids are derived from the chunk text, so re-indexing a doc_id
+    (a new version of the document) only embeds and upserts chunks that
+    changed, and deletes the vectors of chunks that are gone once the
+    new ones are written. If given, `stats` is filled with the
+    added/unchanged/removed counts. The document's BM25 index is rebuilt
+    from all current chunks, unchanged ones included.
+    """
+    index = get_vector_store()
     model = get_model()
     
     if index is None or model is None:
-        return
+        return None
 
-    # Chunking logic
-    chunk_size = 800 
-    chunks = [text[i:i+chunk_size] for i in range(0, len(text), chunk_size)]
-    
-    if not chunks:
-        return
+    if CORPUS_SEARCH:
+        get_corpus_index().set_document(doc_id, contract_type)
+
+    prefix = f"{doc_id}_"
+    existing = {cid for cid in get_text_store().ids(doc_id) if cid.startswith(prefix)}
+    seen = {}
+    current = set()
+    added = 0
+    moved = []
+    # Fed as chunks arrive, so their text isn't held until the end
+    lexical = DocIndexBuilder() if HYBRID_RETRIEVAL else None
+
+    def index_batch(batch):
+        nonlocal added
+        hashes = [hash_chunk(chunk.text) for chunk in batch]
+        fresh_chunks, fresh_hashes, fresh_ids = [], [], []
+        for chunk, chunk_hash in zip(batch, hashes):
+            # Identical chunks within a document get numbered ids
+            key = chunk_hash[:16]
+            n = seen.get(key, 0)
+            seen[key] = n + 1
+            chunk_id = f"{prefix}{key}" if n == 0 else f"{prefix}{key}_{n}"
+            current.add(chunk_id)
+            if lexical is not None:
+                lexical.add(chunk_id, chunk.text)
+            if chunk_id in existing:
+                moved.append({"id": chunk_id, "metadata": _chunk_metadata(doc_id, chunk)})
+                continue
+            fresh_chunks.append(chunk)
+            fresh_hashes.append(chunk_hash)
+            fresh_ids.append(chunk_id)
+        added += len(fresh_chunks)
+        if not fresh_chunks:
+            return []
+        return _index_chunks(doc_id, fresh_chunks, fresh_hashes, fresh_ids)
 
-    print(f"Storing {len(chunks)} chunks for {doc_id}...")
+    # Chunking is interleaved with parsing when `pages` is a generator, so
+    # time spent waiting on pages is subtracted from the "chunk" span
+    waited = 0.0
 
+    def timed_pages():
+        nonlocal waited
+        source = iter(pages)
+        while True:
+            t0 = time.perf_counter()
+            try:
+                page = next(source)
+            except StopIteration:
+                return
+            finally:
+                waited += time.perf_counter() - t0
+            yield page
+
+    count = 0
+    batch = []
+    pending = []
+    chunking = 0.0
+    chunks = iter_chunks(timed_pages())
     try:
-        # Batch encode for performance
-        embeddings = model.encode(chunks, batch_size=64, show_progress_bar=False)
-        
-        vectors = []
-        for i, (chunk, embedding) in enumerate(zip(chunks, embeddings)):
-            vectors.append({
-                "id": f"{doc_id}_{i}",
-                "values": embedding.tolist(),
-                "metadata": {
-                    "doc_id": doc_id,
-                    "type": "contract_chunk",
-                    "text": chunk
-                }
-            })
-
-        # Batch upsert (Pinecone limit is usually ~100-200 vectors per request)
-        for j in range(0, len(vectors), 100):
-            batch = vectors[j:j+100]
-            index.upsert(batch)
-            
-        print(f"Successfully indexed {doc_id}")
+        while True:
+            t0 = time.perf_counter()
+            chunk = next(chunks, None)
+            chunking += time.perf_counter() - t0
+            if chunk is None:
+                break
+            batch.append(chunk)
+            if len(batch) == INDEX_BATCH_SIZE:
+                pending.extend(index_batch(batch))
+                count += len(batch)
+                batch = []
+        if batch:
+            pending.extend(index_batch(batch))
+            count += len(batch)
+        record_span("chunk", max(0.0, chunking - waited), chunks=count)
+
+        # Failed batches have already been retried with backoff; whatever
+        # still failed fails the whole document so its job is retried
+        with span("upsert_wait", doc_id=doc_id):
+            wait_all(pending)
+
+        # Unchanged chunks keep their vectors; only the corpus index
+        # tracks where they moved to. Vector metadata keeps the old
+        # positions until the chunk itself changes.
+        if CORPUS_SEARCH:
+            get_corpus_index().update_positions(moved)
+        removed = sorted(existing - current)
+        if removed:
+            with span("delete_stale", doc_id=doc_id, chunks=len(removed)):
+                _delete_chunks(doc_id, removed)
+        if HYBRID_RETRIEVAL:
+            with span("lexical_index", doc_id=doc_id, chunks=len(lexical)):
+                get_lexical_index().save(doc_id, lexical.build())
+
+        if stats is not None:
+            stats.update({"chunks": count, "added": added, "unchanged": count - added, "removed": len(removed)})
+        if count:
+            print(f"Indexed {doc_id}: {count} chunks ({added} new, {count - added} unchanged, {len(removed)} removed)")
+        return count
     except Exception as e:
         print(f"Indexing error for {doc_id}: {e}")
+        # Drop the chunks this attempt added, so a failed new version
+        # leaves the indexed one exactly as it was
+        fresh = sorted(current - existing)
+        if fresh:
+            try:
+                wait_all(pending)
+            except Exception:
+                pass
+            try:
+                _delete_chunks(doc_id, fresh)
+            except Exception as cleanup_error:
+                print(f"Error removing partial chunks of {doc_id}: {cleanup_error}")
+        return None
+
+def store_embeddings(text: str, doc_id: str, contract_type: str = None, stats: dict = None):
+    """
+    Chunks text and stores embeddings in the configured vector store.
+    """
+    return store_page_embeddings([text], doc_id, contract_type, stats)
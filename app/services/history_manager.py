@@ -1,32 +1,181 @@
 import json
 import os
+import queue
+import sqlite3
+import threading
 from datetime import datetime
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 
+HISTORY_DB = os.getenv("HISTORY_DB", "history.db")
+# Legacy file, imported once into the database if present
 HISTORY_FILE = "history.json"
+# Keep at most this many actions (0 disables count-based pruning)
+HISTORY_RETENTION = int(os.getenv("HISTORY_RETENTION", "100000"))
+# Max actions written per transaction by the background writer
+HISTORY_FLUSH_BATCH = int(os.getenv("HISTORY_FLUSH_BATCH", "500"))
 
-def get_history() -> List[Dict[str, Any]]:
+_local = threading.local()
+_queue = queue.Queue()
+# Actions queued and actions the writer is done with, so flush() can wait
+# for the ones queued before it without waiting for the queue to empty
+_progress = threading.Condition()
+_queued = 0
+_written = 0
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def _conn() -> sqlite3.Connection:
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(HISTORY_DB, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS actions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                timestamp TEXT NOT NULL,
+                type TEXT NOT NULL,
+                doc_id TEXT,
+                details TEXT NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_actions_type ON actions(type, id)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_actions_doc ON actions(doc_id, id)")
+        conn.commit()
+        _local.conn = conn
+    return conn
+
+
+def _import_legacy(conn: sqlite3.Connection):
     if not os.path.exists(HISTORY_FILE):
-        return []
+        return
+    if conn.execute("SELECT 1 FROM actions LIMIT 1").fetchone():
+        return
     try:
         with open(HISTORY_FILE, "r") as f:
-            return json.load(f)
+            legacy = json.load(f)
     except Exception:
-        return []
+        return
+    # Legacy file is newest-first
+    conn.executemany(
+        "INSERT INTO actions (timestamp, type, doc_id, details) VALUES (?, ?, ?, ?)",
+        [
+            (a["timestamp"], a["type"], a.get("details", {}).get("doc_id"), json.dumps(a.get("details", {})))
+            for a in reversed(legacy)
+        ]
+    )
+    conn.commit()
+
+
+def _write_loop():
+    global _written
+    conn = _conn()
+    _import_legacy(conn)
+    while True:
+        batch = [_queue.get()]
+        while len(batch) < HISTORY_FLUSH_BATCH:
+            try:
+                batch.append(_queue.get_nowait())
+            except queue.Empty:
+                break
+
+        try:
+            conn.executemany(
+                "INSERT INTO actions (timestamp, type, doc_id, details) VALUES (?, ?, ?, ?)",
+                [(a["timestamp"], a["type"], a["details"].get("doc_id"), json.dumps(a["details"], default=str))
+                 for a in batch]
+            )
+            if HISTORY_RETENTION > 0:
+                conn.execute(
+                    "DELETE FROM actions WHERE id <= (SELECT MAX(id) FROM actions) - ?",
+                    (HISTORY_RETENTION,)
+                )
+            conn.commit()
+        except Exception as e:
+            print(f"Error writing history: {e}")
+        finally:
+            with _progress:
+                _written += len(batch)
+                _progress.notify_all()
+
+
+def _ensure_writer():
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = threading.Thread(target=_write_loop, name="history-writer", daemon=True)
+                _writer.start()
+
+
+def flush():
+    """
+    Block until every action queued before this call has been written.
+    Actions queued meanwhile don't hold it up.
+    """
+    _ensure_writer()
+    with _progress:
+        target = _queued
+        _progress.wait_for(lambda: _written >= target)
+
+
+def pending_writes() -> int:
+    return _queue.qsize()
+
+
+def _row_to_action(row) -> Dict[str, Any]:
+    return {
+        "id": row[0],
+        "timestamp": row[1],
+        "type": row[2],
+        "details": json.loads(row[3])
+    }
+
+
+def get_history(
+    limit: int = 50,
+    cursor: Optional[int] = None,
+    action_type: Optional[str] = None,
+    doc_id: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """
+    Most recent actions first. `cursor` is the id of the last action from
+    the previous page; only older actions are returned.
+    """
+    flush()
+    clauses, params = [], []
+    if cursor is not None:
+        clauses.append("id < ?")
+        params.append(cursor)
+    if action_type:
+        clauses.append("type = ?")
+        params.append(action_type)
+    if doc_id:
+        clauses.append("doc_id = ?")
+        params.append(doc_id)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    params.append(limit)
+    rows = _conn().execute(
+        f"SELECT id, timestamp, type, details FROM actions {where} ORDER BY id DESC LIMIT ?",
+        params
+    ).fetchall()
+    return [_row_to_action(row) for row in rows]
 
-def save_history(history: List[Dict[str, Any]]):
-    with open(HISTORY_FILE, "w") as f:
-        json.dump(history, f, indent=2)
 
 def add_action(action_type: str, details: Dict[str, Any]):
-    history = get_history()
+    """
+    Queue an action for the background writer. Never blocks on disk I/O,
+    so it is safe to call from the event loop.
+    """
+    global _queued
+    _ensure_writer()
     new_action = {
-        "id": len(history) + 1,
         "timestamp": datetime.now().isoformat(),
         "type": action_type,
         "details": details
     }
-    history.insert(0, new_action)  # Most recent first
-    # Keep only last 50 actions
-    save_history(history[:50])
+    with _progress:
+        _queued += 1
+        _queue.put(new_action)
     return new_action
@@ -0,0 +1,374 @@
+import os
+import json
+import time
+import uuid
+import random
+import socket
+import sqlite3
+import asyncio
+import threading
+from typing import Awaitable, Callable, Dict, Optional
+
+from app.services.admission import set_lane, reset_lane
+
+JOB_DB = os.getenv("JOB_DB", "jobs.db")
+# Async workers per process; every uvicorn worker runs its own set and
+# they all claim from the same database
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+# A claimed job is re-queued if its worker stops heartbeating for this long
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "120"))
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "0.2"))
+
+_local = threading.local()
+_handlers: Dict[str, Callable[[dict, Callable], Awaitable[dict]]] = {}
+_failure_handlers: Dict[str, Callable[[dict], None]] = {}
+_worker_tasks = []
+
+
+class JobDeferred(Exception):
+    """
+    Raised by a handler that can't make progress yet (e.g. its document
+    is still being indexed). The job goes back to the queue without
+    using up an attempt.
+    """
+
+    def __init__(self, delay: float = 1.0, reason: str = ""):
+        super().__init__(reason or f"deferred for {delay}s")
+        self.delay = delay
+
+
+def _conn() -> sqlite3.Connection:
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(JOB_DB, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                doc_id TEXT,
+                priority INTEGER NOT NULL DEFAULT 0,
+                status TEXT NOT NULL,
+                stage TEXT,
+                stages TEXT NOT NULL DEFAULT '[]',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                max_attempts INTEGER NOT NULL,
+                payload TEXT NOT NULL,
+                result TEXT,
+                error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                available_at REAL NOT NULL,
+                locked_by TEXT,
+                locked_until REAL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_ready ON jobs(status, priority DESC, available_at)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_doc ON jobs(doc_id, kind, status)")
+        _local.conn = conn
+    return conn
+
+
+def _row_to_job(row) -> dict:
+    keys = ["id", "kind", "doc_id", "priority", "status", "stage", "stages", "attempts",
+            "max_attempts", "payload", "result", "error", "created_at", "updated_at"]
+    job = dict(zip(keys, row))
+    job["stages"] = json.loads(job["stages"])
+    job["payload"] = json.loads(job["payload"])
+    job["result"] = json.loads(job["result"]) if job["result"] else None
+    return job
+
+
+_SELECT = ("SELECT id, kind, doc_id, priority, status, stage, stages, attempts, max_attempts, "
+           "payload, result, error, created_at, updated_at FROM jobs")
+
+
+def submit_job(kind: str, payload: dict, doc_id: str = None, priority: int = 0,
+               max_attempts: int = JOB_MAX_ATTEMPTS) -> str:
+    """
+    Persist a new job and return its id. Higher priority runs first.
+    """
+    job_id = uuid.uuid4().hex
+    now = time.time()
+    _conn().execute(
+        "INSERT INTO jobs (id, kind, doc_id, priority, status, stages, max_attempts, payload, "
+        "created_at, updated_at, available_at) VALUES (?, ?, ?, ?, 'queued', '[]', ?, ?, ?, ?, ?)",
+        (job_id, kind, doc_id, priority, max_attempts, json.dumps(payload), now, now, now)
+    )
+    return job_id
+
+
+def get_job(job_id: str) -> Optional[dict]:
+    row = _conn().execute(_SELECT + " WHERE id = ?", (job_id,)).fetchone()
+    return _row_to_job(row) if row else None
+
+
+def claim_job(worker_id: str) -> Optional[dict]:
+    """
+    Atomically take the highest-priority runnable job, including jobs
+    whose previous worker died and let the lease expire while the job
+    still had attempts left.
+    """
+    conn = _conn()
+    now = time.time()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        row = conn.execute(
+            "SELECT id FROM jobs WHERE (status = 'queued' AND available_at <= ?) "
+            "OR (status = 'running' AND locked_until < ? AND attempts < max_attempts) "
+            "ORDER BY priority DESC, created_at ASC LIMIT 1",
+            (now, now)
+        ).fetchone()
+        if row is None:
+            conn.execute("COMMIT")
+            return None
+        conn.execute(
+            "UPDATE jobs SET status = 'running', attempts = attempts + 1, locked_by = ?, "
+            "locked_until = ?, updated_at = ? WHERE id = ?",
+            (worker_id, now + JOB_LEASE_SECONDS, now, row[0])
+        )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return get_job(row[0])
+
+
+def fail_expired_jobs() -> list:
+    """
+    Mark failed the jobs whose worker let the lease expire on their last
+    attempt (e.g. a PDF that crashes or exhausts its worker every time),
+    instead of re-running them forever. Returns those jobs.
+    """
+    conn = _conn()
+    now = time.time()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        rows = conn.execute(
+            _SELECT + " WHERE status = 'running' AND locked_until < ? AND attempts >= max_attempts", (now,)
+        ).fetchall()
+        if rows:
+            conn.execute(
+                "UPDATE jobs SET status = 'failed', error = COALESCE(error, 'Worker lease expired'), "
+                "locked_by = NULL, locked_until = NULL, updated_at = ? "
+                "WHERE status = 'running' AND locked_until < ? AND attempts >= max_attempts",
+                (now, now)
+            )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return [_row_to_job(row) for row in rows]
+
+
+def report_stage(job_id: str, worker_id: str, stage: str, details: dict = None):
+    """
+    Record a completed pipeline stage and extend the job's lease.
+    `details` are merged into the job's result so pollers can see
+    partial output (e.g. the classification before embedding ends).
+    Ignored unless `worker_id` still holds the lease.
+    """
+    now = time.time()
+    conn = _conn()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        row = conn.execute("SELECT stages, result FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        stages = json.loads(row[0]) if row else []
+        result = json.loads(row[1]) if row and row[1] else {}
+        if stage not in stages:
+            stages.append(stage)
+        if details:
+            result.update(details)
+        conn.execute(
+            "UPDATE jobs SET stage = ?, stages = ?, result = ?, locked_until = ?, updated_at = ? "
+            "WHERE id = ? AND locked_by = ?",
+            (stage, json.dumps(stages), json.dumps(result, default=str) if result else None,
+             now + JOB_LEASE_SECONDS, now, job_id, worker_id)
+        )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+
+# Every update below only applies while `worker_id` holds the job's
+# lease, so a worker whose lease expired and was taken over cannot
+# overwrite the new owner's progress or result.
+
+def heartbeat(job_id: str, worker_id: str):
+    now = time.time()
+    _conn().execute(
+        "UPDATE jobs SET locked_until = ?, updated_at = ? WHERE id = ? AND status = 'running' AND locked_by = ?",
+        (now + JOB_LEASE_SECONDS, now, job_id, worker_id)
+    )
+
+
+def complete_job(job_id: str, worker_id: str, result: dict) -> bool:
+    now = time.time()
+    cursor = _conn().execute(
+        "UPDATE jobs SET status = 'succeeded', result = ?, error = NULL, locked_by = NULL, "
+        "locked_until = NULL, updated_at = ? WHERE id = ? AND locked_by = ?",
+        (json.dumps(result, default=str), now, job_id, worker_id)
+    )
+    return cursor.rowcount > 0
+
+
+def fail_job(job_id: str, worker_id: str, error: str) -> bool:
+    """
+    Re-queue with exponential backoff, or mark failed once the job is
+    out of attempts. Returns True if the job failed for good.
+    """
+    job = get_job(job_id)
+    now = time.time()
+    if job and job["attempts"] < job["max_attempts"]:
+        delay = min(60.0, 2 ** job["attempts"]) + random.random()
+        _conn().execute(
+            "UPDATE jobs SET status = 'queued', error = ?, available_at = ?, locked_by = NULL, "
+            "locked_until = NULL, updated_at = ? WHERE id = ? AND locked_by = ?",
+            (error, now + delay, now, job_id, worker_id)
+        )
+        return False
+    cursor = _conn().execute(
+        "UPDATE jobs SET status = 'failed', error = ?, locked_by = NULL, locked_until = NULL, "
+        "updated_at = ? WHERE id = ? AND locked_by = ?",
+        (error, now, job_id, worker_id)
+    )
+    return cursor.rowcount > 0
+
+
+def defer_job(job_id: str, worker_id: str, delay: float):
+    now = time.time()
+    _conn().execute(
+        "UPDATE jobs SET status = 'queued', attempts = MAX(attempts - 1, 0), available_at = ?, "
+        "locked_by = NULL, locked_until = NULL, updated_at = ? WHERE id = ? AND locked_by = ?",
+        (now + delay, now, job_id, worker_id)
+    )
+
+
+def pending_jobs_for_doc(doc_id: str, kind: str) -> int:
+    return _conn().execute(
+        "SELECT COUNT(*) FROM jobs WHERE doc_id = ? AND kind = ? AND status IN ('queued', 'running')",
+        (doc_id, kind)
+    ).fetchone()[0]
+
+
+def latest_job_for_doc(doc_id: str, kind: str) -> Optional[dict]:
+    row = _conn().execute(
+        _SELECT + " WHERE doc_id = ? AND kind = ? ORDER BY created_at DESC LIMIT 1", (doc_id, kind)
+    ).fetchone()
+    return _row_to_job(row) if row else None
+
+
+def queue_depth() -> dict:
+    rows = _conn().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+    return {status: count for status, count in rows}
+
+
+async def wait_for_stage(job_id: str, stage: str, timeout: float) -> dict:
+    """
+    Poll until the job reaches `stage`, finishes or fails.
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        job = await asyncio.to_thread(get_job, job_id)
+        if job is None or stage in job["stages"] or job["status"] in ("succeeded", "failed"):
+            return job
+        if time.monotonic() > deadline:
+            return job
+        await asyncio.sleep(JOB_POLL_SECONDS / 4)
+
+
+async def wait_for_doc(doc_id: str, kind: str, timeout: float) -> Optional[dict]:
+    """
+    Wait until no `kind` job for the doc is queued or running, then
+    return the most recent one (None if there never was one).
+    """
+    deadline = time.monotonic() + timeout
+    while await asyncio.to_thread(pending_jobs_for_doc, doc_id, kind):
+        if time.monotonic() > deadline:
+            break
+        await asyncio.sleep(JOB_POLL_SECONDS)
+    return await asyncio.to_thread(latest_job_for_doc, doc_id, kind)
+
+
+def register_handler(kind: str, handler: Callable[[dict, Callable], Awaitable[dict]],
+                     on_failure: Callable[[dict], None] = None):
+    """
+    `handler(job, stage)` is awaited for each job of `kind`; await
+    `stage(name, details)` to record progress. Its return value becomes the result.
+    `on_failure(job)`, if given, runs in a thread once a job has used up
+    its attempts, to clean up what the handler would have on success.
+    """
+    _handlers[kind] = handler
+    if on_failure is not None:
+        _failure_handlers[kind] = on_failure
+
+
+async def _job_failed(job: dict):
+    on_failure = _failure_handlers.get(job["kind"])
+    if on_failure is None:
+        return
+    try:
+        await asyncio.to_thread(on_failure, job)
+    except Exception as e:
+        print(f"Failure handler for job {job['id']} ({job['kind']}) failed: {e}")
+
+
+async def _worker_loop(worker_id: str):
+    while True:
+        try:
+            for expired in await asyncio.to_thread(fail_expired_jobs):
+                print(f"Job {expired['id']} ({expired['kind']}) failed: lease expired on its last attempt")
+                await _job_failed(expired)
+            job = await asyncio.to_thread(claim_job, worker_id)
+        except Exception as e:
+            print(f"Job claim error: {e}")
+            job = None
+        if job is None:
+            await asyncio.sleep(JOB_POLL_SECONDS)
+            continue
+
+        handler = _handlers.get(job["kind"])
+        if handler is None:
+            await asyncio.to_thread(fail_job, job["id"], worker_id, f"No handler for job kind '{job['kind']}'")
+            continue
+
+        async def stage(name: str, details: dict = None, job_id=job["id"]):
+            await asyncio.to_thread(report_stage, job_id, worker_id, name, details)
+
+        async def keep_alive(job_id=job["id"]):
+            while True:
+                await asyncio.sleep(JOB_LEASE_SECONDS / 3)
+                await asyncio.to_thread(heartbeat, job_id, worker_id)
+
+        lease = asyncio.create_task(keep_alive())
+        # Prioritised jobs (interactive uploads) share the interactive
+        # executor lane; everything else queues behind it
+        lane = set_lane("interactive" if job["priority"] > 0 else "bulk")
+        try:
+            result = await handler(job, stage)
+            if not await asyncio.to_thread(complete_job, job["id"], worker_id, result):
+                print(f"Job {job['id']} ({job['kind']}) finished after its lease was taken over")
+        except JobDeferred as e:
+            await asyncio.to_thread(defer_job, job["id"], worker_id, e.delay)
+        except Exception as e:
+            print(f"Job {job['id']} ({job['kind']}) failed: {e}")
+            if await asyncio.to_thread(fail_job, job["id"], worker_id, str(e)):
+                await _job_failed(job)
+        finally:
+            reset_lane(lane)
+            lease.cancel()
+
+
+def start_workers(count: int = JOB_WORKERS):
+    """
+    Start job workers on the running event loop. Worker ids are derived
+    here rather than at import so every forked server process (which
+    inherits the master's imported modules under preload_app) claims
+    leases under its own pid.
+    """
+    prefix = f"{socket.gethostname()}:{os.getpid()}"
+    for i in range(count):
+        _worker_tasks.append(asyncio.create_task(_worker_loop(f"{prefix}:{i}")))
@@ -0,0 +1,264 @@
+import os
+import re
+import math
+import bisect
+import threading
+from collections import Counter, OrderedDict
+import numpy as np
+
+LEXICAL_INDEX_DIR = os.getenv("LEXICAL_INDEX_DIR", "lexical_index")
+# Fuse BM25 rankings with the vector rankings at retrieval time
+HYBRID_RETRIEVAL = os.getenv("HYBRID_RETRIEVAL", "1") not in ("0", "false", "False")
+BM25_K1 = float(os.getenv("BM25_K1", "1.2"))
+BM25_B = float(os.getenv("BM25_B", "0.75"))
+# Per-document indexes kept loaded in this process
+LEXICAL_CACHE_DOCS = int(os.getenv("LEXICAL_CACHE_DOCS", "256"))
+
+# Words, numbers and dotted section numbers ("12.3") as single terms
+_TOKEN = re.compile(r"[a-z0-9]+(?:\.[0-9]+)*")
+STOPWORDS = frozenset("""
+a an and are as at be by for from has have in is it its of on or shall that the their this to under
+was were will with which any all other such each may must
+""".split())
+
+_index = None
+
+
+def tokenize(text: str) -> list:
+    return [t for t in _TOKEN.findall(text.lower()) if t not in STOPWORDS]
+
+
+class StringTable:
+    """
+    Strings packed into one UTF-8 blob: string i is
+    blob[offsets[i]:offsets[i + 1]]. Unlike a numpy unicode array, no
+    entry is padded to the longest one. If built from sorted strings,
+    find() looks one up by binary search (UTF-8 byte order is code point
+    order).
+    """
+
+    def __init__(self, blob: bytes, offsets: np.ndarray):
+        self.blob = blob
+        self.offsets = offsets
+
+    @classmethod
+    def pack(cls, strings: list) -> "StringTable":
+        encoded = [s.encode("utf-8") for s in strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(b) for b in encoded])
+        return cls(b"".join(encoded), offsets)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def _raw(self, i: int) -> bytes:
+        return self.blob[self.offsets[i]:self.offsets[i + 1]]
+
+    def __getitem__(self, i: int) -> str:
+        return self._raw(i).decode("utf-8")
+
+    def find(self, value: str) -> int:
+        """
+        Position of `value`, or -1 if absent.
+        """
+        raw = value.encode("utf-8")
+        i = bisect.bisect_left(range(len(self)), raw, key=self._raw)
+        return i if i < len(self) and self._raw(i) == raw else -1
+
+    def arrays(self) -> tuple:
+        return np.frombuffer(self.blob, dtype=np.uint8), self.offsets
+
+
+class DocIndex:
+    """
+    BM25 postings of one document. Chunk ids and the sorted terms are
+    StringTables; terms are looked up by binary search, and the postings
+    of term i are chunks[offsets[i]:offsets[i + 1]] (row numbers into
+    ids) with matching term frequencies in freqs.
+    """
+
+    def __init__(self, ids, lengths, terms, offsets, chunks, freqs):
+        self.ids = ids
+        self.lengths = lengths
+        self.terms = terms
+        self.offsets = offsets
+        self.chunks = chunks
+        self.freqs = freqs
+        self.avg_length = float(lengths.mean()) if len(lengths) else 0.0
+        # BM25 length normalisation per chunk, computed once
+        self.norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths / max(self.avg_length, 1e-9))
+
+    @classmethod
+    def build(cls, items: list) -> "DocIndex":
+        """
+        Index (chunk id, text) pairs.
+        """
+        builder = DocIndexBuilder()
+        for chunk_id, text in items:
+            builder.add(chunk_id, text)
+        return builder.build()
+
+    def search(self, query: str, top_k: int) -> list:
+        """
+        Chunk ids ranked by BM25 score; chunks sharing no term are left out.
+        """
+        count = len(self.ids)
+        if not count or not len(self.terms):
+            return []
+        scores = np.zeros(count, dtype=np.float32)
+        for term in set(tokenize(query)):
+            i = self.terms.find(term)
+            if i < 0:
+                continue
+            start, end = self.offsets[i], self.offsets[i + 1]
+            chunks = self.chunks[start:end]
+            tf = self.freqs[start:end].astype(np.float32)
+            df = end - start
+            idf = math.log(1 + (count - df + 0.5) / (df + 0.5))
+            scores[chunks] += idf * tf * (BM25_K1 + 1) / (tf + self.norm[chunks])
+        hits = np.flatnonzero(scores)
+        if len(hits) > top_k:
+            hits = hits[np.argpartition(-scores[hits], top_k)[:top_k]]
+        hits = hits[np.argsort(-scores[hits], kind="stable")]
+        return [self.ids[i] for i in hits]
+
+
+class DocIndexBuilder:
+    """
+    Builds a DocIndex from chunks fed one at a time. Only their ids,
+    lengths and postings are kept, not their text, so a document can be
+    fed as it is chunked.
+    """
+
+    def __init__(self):
+        self.ids = []
+        self.lengths = []
+        self.postings = {}
+
+    def add(self, chunk_id: str, text: str):
+        position = len(self.ids)
+        tokens = tokenize(text)
+        self.ids.append(chunk_id)
+        self.lengths.append(len(tokens))
+        for term, tf in Counter(tokens).items():
+            self.postings.setdefault(term, []).append((position, tf))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def build(self) -> DocIndex:
+        postings = self.postings
+        terms = sorted(postings)
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(postings[t]) for t in terms])
+        flat = [p for t in terms for p in postings[t]]
+        chunks = np.fromiter((p for p, _ in flat), dtype=np.int32, count=len(flat))
+        freqs = np.fromiter((min(tf, 65535) for _, tf in flat), dtype=np.uint16, count=len(flat))
+        return DocIndex(StringTable.pack(self.ids), np.array(self.lengths, dtype=np.int32),
+                        StringTable.pack(terms), offsets, chunks, freqs)
+
+
+class LexicalIndex:
+    """
+    One compressed .npz of BM25 postings per document, rebuilt whenever
+    the document is (re)indexed, so chunks dropped by a new version
+    disappear with the rewrite. Loaded indexes are cached per process
+    and reloaded when another worker has replaced the file.
+    """
+
+    def __init__(self, root: str = LEXICAL_INDEX_DIR, cache_docs: int = LEXICAL_CACHE_DOCS):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self.cache_docs = cache_docs
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()  # doc key -> (file version, DocIndex)
+
+    def _key(self, doc_id) -> str:
+        return re.sub(r"[^A-Za-z0-9_.-]", "_", str(doc_id))
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key + ".npz")
+
+    def put(self, doc_id, items: list):
+        """
+        Replace a document's index with one over (chunk id, text) pairs.
+        """
+        self.save(doc_id, DocIndex.build(items))
+
+    def save(self, doc_id, index: DocIndex):
+        """
+        Replace a document's index with `index` (e.g. from a DocIndexBuilder).
+        """
+        key = self._key(doc_id)
+        path = self._path(key)
+        if not len(index.ids):
+            self.delete(doc_id)
+            return
+        # np.savez appends ".npz" to names without it
+        tmp = path[:-len(".npz")] + ".tmp.npz"
+        id_blob, id_offsets = index.ids.arrays()
+        term_blob, term_offsets = index.terms.arrays()
+        np.savez_compressed(tmp, id_blob=id_blob, id_offsets=id_offsets, lengths=index.lengths,
+                            term_blob=term_blob, term_offsets=term_offsets,
+                            offsets=index.offsets, chunks=index.chunks, freqs=index.freqs)
+        os.replace(tmp, path)
+        with self._lock:
+            self._cache.pop(key, None)
+
+    def delete(self, doc_id):
+        key = self._key(doc_id)
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+        with self._lock:
+            self._cache.pop(key, None)
+
+    def _load(self, doc_id):
+        key = self._key(doc_id)
+        path = self._path(key)
+        try:
+            info = os.stat(path)
+            version = (info.st_ino, info.st_mtime_ns, info.st_size)
+        except OSError:
+            return None
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None and cached[0] == version:
+                self._cache.move_to_end(key)
+                return cached[1]
+        with np.load(path) as saved:
+            if "term_blob" in saved:
+                ids = StringTable(saved["id_blob"].tobytes(), saved["id_offsets"])
+                terms = StringTable(saved["term_blob"].tobytes(), saved["term_offsets"])
+            else:
+                # Written before strings were packed
+                ids = StringTable.pack(saved["ids"].tolist())
+                terms = StringTable.pack(saved["terms"].tolist())
+            index = DocIndex(ids, saved["lengths"], terms,
+                             saved["offsets"], saved["chunks"], saved["freqs"])
+        with self._lock:
+            self._cache[key] = (version, index)
+            while len(self._cache) > self.cache_docs:
+                self._cache.popitem(last=False)
+        return index
+
+    def search_many(self, doc_id, queries: list, top_k: int) -> list:
+        """
+        Ranked chunk ids for each query; empty lists if the document has
+        no lexical index (e.g. it was indexed before there was one).
+        """
+        index = self._load(doc_id)
+        if index is None:
+            return [[] for _ in queries]
+        return [index.search(query, top_k) for query in queries]
+
+    def search(self, doc_id, query: str, top_k: int) -> list:
+        return self.search_many(doc_id, [query], top_k)[0]
+
+
+def get_lexical_index() -> LexicalIndex:
+    global _index
+    if _index is None:
+        _index = LexicalIndex(LEXICAL_INDEX_DIR)
+    return _index
@@ -0,0 +1,52 @@
+import os
+
+# CPU inference backend for both models:
+#   torch - full-precision PyTorch (default)
+#   int8  - PyTorch with dynamic int8 quantization of Linear layers
+#   onnx  - ONNX Runtime (needs `optimum[onnxruntime]`)
+MODEL_BACKEND = os.getenv("MODEL_BACKEND", "torch").lower()
+BACKENDS = ("torch", "int8", "onnx")
+
+
+def _check_backend(backend: str):
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown MODEL_BACKEND '{backend}', expected one of {BACKENDS}")
+
+
+# Fail at startup rather than load a mix of backends
+_check_backend(MODEL_BACKEND)
+
+
+def _quantize_int8(module):
+    import torch
+    return torch.quantization.quantize_dynamic(module, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def load_sentence_transformer(name: str, backend: str = MODEL_BACKEND):
+    _check_backend(backend)
+    from sentence_transformers import SentenceTransformer
+
+    if backend == "onnx":
+        return SentenceTransformer(name, backend="onnx")
+    model = SentenceTransformer(name, device="cpu")
+    if backend == "int8":
+        model = _quantize_int8(model)
+    return model
+
+
+def load_zero_shot_pipeline(name: str, backend: str = MODEL_BACKEND):
+    _check_backend(backend)
+    from transformers import pipeline
+
+    if backend == "torch":
+        return pipeline("zero-shot-classification", model=name)
+
+    from transformers import AutoTokenizer
+    tokenizer = AutoTokenizer.from_pretrained(name)
+    if backend == "onnx":
+        from optimum.onnxruntime import ORTModelForSequenceClassification
+        model = ORTModelForSequenceClassification.from_pretrained(name, export=True)
+    else:
+        from transformers import AutoModelForSequenceClassification
+        model = _quantize_int8(AutoModelForSequenceClassification.from_pretrained(name))
+    return pipeline("zero-shot-classification", model=model, tokenizer=tokenizer)
@@ -1,5 +1,23 @@
+import os
+import shutil
+import tempfile
+import multiprocessing
+from collections import deque
 from pypdf import PdfReader
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from app.services.telemetry import timed
+
+# "stream" (process pool, generator of pages) or "thread" (legacy)
+PDF_PARSE_MODE = os.getenv("PDF_PARSE_MODE", "stream").lower()
+PDF_PARSE_WORKERS = int(os.getenv("PDF_PARSE_WORKERS", str(min(8, os.cpu_count() or 2))))
+# Upper bound on pages being extracted or waiting to be consumed
+PDF_MAX_INFLIGHT_PAGES = int(os.getenv("PDF_MAX_INFLIGHT_PAGES", "16"))
+# Below this page count the process pool costs more than it saves
+PDF_MIN_PAGES_FOR_POOL = int(os.getenv("PDF_MIN_PAGES_FOR_POOL", "8"))
+
+_process_pool = None
+# Per worker process: (path, PdfReader) for the file currently being parsed
+_worker_reader = None
 
 def extract_page_text(page):
     """
@@ -10,22 +28,90 @@ def extract_page_text(page):
     except Exception:
         return ""
 
-def parse_pdf(file):
+def _extract_page_from_path(path: str, page_number: int) -> str:
+    """
+    Runs inside a pool worker. The reader is cached per worker so
+    consecutive pages of the same file don't re-parse the xref table.
+    """
+    global _worker_reader
+    if _worker_reader is None or _worker_reader[0] != path:
+        _worker_reader = (path, PdfReader(path))
+    return extract_page_text(_worker_reader[1].pages[page_number])
+
+def get_process_pool():
+    global _process_pool
+    if _process_pool is None:
+        # spawn: the API process is multi-threaded, forking it is unsafe
+        _process_pool = ProcessPoolExecutor(
+            max_workers=PDF_PARSE_WORKERS,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _process_pool
+
+def spool_upload(file) -> str:
+    """
+    Copy an upload to a temp file on disk so worker processes can open
+    it by path. Returns the path; the caller is responsible for removal.
+    """
+    source = getattr(file, "file", file)
+    source.seek(0)
+    with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as tmp:
+        shutil.copyfileobj(source, tmp, 1024 * 1024)
+    source.seek(0)
+    return tmp.name
+
+def iter_pdf_pages(file, max_in_flight: int = PDF_MAX_INFLIGHT_PAGES):
     """
-    Main entry point for PDF parsing. Uses a ThreadPoolExecutor 
-    to speed up text extraction for large documents.
+    Yield page texts in order while later pages are still being
+    extracted in the process pool. At most `max_in_flight` pages are
+    submitted ahead of the consumer, which caps memory regardless of
+    document size. `file` is an upload/file object or a path on disk.
     """
-    reader = PdfReader(file.file)
+    spooled = not isinstance(file, str)
+    path = spool_upload(file) if spooled else file
+    try:
+        reader = PdfReader(path)
+        num_pages = len(reader.pages)
+
+        if num_pages < PDF_MIN_PAGES_FOR_POOL:
+            for page in reader.pages:
+                yield extract_page_text(page)
+            return
+
+        pool = get_process_pool()
+        pending = deque()
+        next_page = 0
+        while next_page < num_pages or pending:
+            while next_page < num_pages and len(pending) < max_in_flight:
+                pending.append(pool.submit(_extract_page_from_path, path, next_page))
+                next_page += 1
+            yield pending.popleft().result()
+    finally:
+        if spooled:
+            os.remove(path)
+
+@timed("parse")
+def parse_pdf_pages(file) -> list:
+    """
+    Return the text of every page as a list.
+    """
+    if PDF_PARSE_MODE == "stream":
+        return list(iter_pdf_pages(file))
+
+    reader = PdfReader(file if isinstance(file, str) else file.file)
     pages = reader.pages
-    
+
     # Check if we should parallelize
     num_threads = min(8, len(pages))
-    
+
     if num_threads <= 1:
-        text = "".join([page.extract_text() or "" for page in pages])
-    else:
-        with ThreadPoolExecutor(max_workers=num_threads) as executor:
-            text_parts = list(executor.map(extract_page_text, pages))
-        text = "".join(text_parts)
-        
-    return text
+        return [page.extract_text() or "" for page in pages]
+    with ThreadPoolExecutor(max_workers=num_threads) as executor:
+        return list(executor.map(extract_page_text, pages))
+
+def parse_pdf(file):
+    """
+    Main entry point for PDF parsing. Returns the whole document as one
+    string; use iter_pdf_pages to consume pages as they are extracted.
+    """
+    return "".join(parse_pdf_pages(file))
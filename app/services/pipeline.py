@@ -0,0 +1,198 @@
+import os
+import uuid
+import queue
+import shutil
+import asyncio
+import threading
+
+from app.services.parser import iter_pdf_pages, parse_pdf_pages, PDF_PARSE_MODE, PDF_MAX_INFLIGHT_PAGES
+from app.services.classifier import classify_contract
+from app.services.embeddings import store_page_embeddings
+from app.services.content_cache import register_document, add_document_version
+from app.services.history_manager import add_action
+from app.services.rule_engine import DocumentScan, prune_document_text
+from app.services.corpus_index import get_corpus_index, CORPUS_SEARCH
+from app.services.telemetry import span
+from app.services.admission import run_cpu, run_io
+
+# Uploads waiting for (or being processed by) an ingest job
+UPLOAD_SPOOL_DIR = os.getenv("UPLOAD_SPOOL_DIR", "uploads")
+# Leading characters of a document used to classify it, and to preview it
+CLASSIFY_CHARS = 2000
+PREVIEW_CHARS = 500
+
+
+def save_upload(file) -> str:
+    """
+    Copy an upload into the spool directory so a job worker - possibly
+    in another process, possibly after a restart - can pick it up.
+    """
+    os.makedirs(UPLOAD_SPOOL_DIR, exist_ok=True)
+    path = os.path.abspath(os.path.join(UPLOAD_SPOOL_DIR, f"{uuid.uuid4().hex}.pdf"))
+    file.file.seek(0)
+    with open(path + ".tmp", "wb") as out:
+        shutil.copyfileobj(file.file, out, 1024 * 1024)
+    os.replace(path + ".tmp", path)
+    file.file.seek(0)
+    return path
+
+
+# Tells the indexer that parsing failed and the pages it got are partial
+_ABORT = object()
+
+
+def parse_and_index_pages(source, doc_id: str, version: int = None, stats: dict = None, on_head=None):
+    """
+    Parse a PDF page by page. Each page is handed to an indexer thread
+    and to the rule scan as soon as it is extracted, then dropped, so
+    only the pages in flight are held in memory and embedding overlaps
+    parsing. `on_head(text)` is called once with the first CLASSIFY_CHARS
+    characters as soon as they are parsed. Returns (page count, rule hit
+    count, wait), where wait() waits for indexing and returns its chunk
+    count (None on failure). `stats` is passed on to the indexer. If
+    parsing fails, the indexer is told to abandon the document (so a
+    partial new version never deletes the chunks of the one it replaces)
+    and joined before the error is raised.
+    """
+    # Bounded, so a slow indexer holds back the parser instead of
+    # letting parsed pages pile up
+    feed = queue.Queue(maxsize=PDF_MAX_INFLIGHT_PAGES)
+    outcome = {}
+
+    def drain():
+        while True:
+            page = feed.get()
+            if page is None or page is _ABORT:
+                outcome["drained"] = True
+                if page is _ABORT:
+                    raise RuntimeError("Parsing failed; indexing abandoned")
+                return
+            yield page
+
+    def index():
+        try:
+            outcome["count"] = store_page_embeddings(drain(), doc_id, stats=stats)
+        finally:
+            # An indexer that gave up early still empties the queue
+            while not outcome.get("drained"):
+                if feed.get() in (None, _ABORT):
+                    outcome["drained"] = True
+
+    indexer = threading.Thread(target=index, daemon=True)
+    indexer.start()
+
+    pages = iter_pdf_pages(source) if PDF_PARSE_MODE == "stream" else parse_pdf_pages(source)
+    scan = DocumentScan(doc_id, version)
+    head, count = "", 0
+    try:
+        with span("parse", doc_id=doc_id):
+            for page in pages:
+                count += 1
+                if on_head is not None:
+                    head += page
+                    if len(head) >= CLASSIFY_CHARS:
+                        on_head(head[:CLASSIFY_CHARS])
+                        on_head = None
+                feed.put(page)
+                scan.feed(page)
+        if on_head is not None:
+            on_head(head)
+        rule_hits = scan.finish()
+    except BaseException:
+        feed.put(_ABORT)
+        indexer.join()
+        raise
+    feed.put(None)
+
+    def wait():
+        indexer.join()
+        return outcome.get("count")
+
+    return count, rule_hits, wait
+
+
+async def ingest_upload(job: dict, stage) -> dict:
+    """
+    Job handler for "upload": classified -> parsed -> scanned -> embedded.
+    Classification starts as soon as the first pages are parsed, while
+    the rest of the document is still being parsed, scanned and indexed.
+    A payload "version" above 1 re-indexes an existing doc_id in place
+    with the new file; only its changed chunks are embedded.
+    """
+    payload = job["payload"]
+    doc_id = job["doc_id"]
+    path = payload["path"]
+    version = payload.get("version", 1)
+    index_stats = {}
+
+    loop = asyncio.get_running_loop()
+    head = loop.create_future()
+
+    def on_head(text):
+        loop.call_soon_threadsafe(head.set_result, text)
+
+    # Parsing holds its thread for the whole document (mostly waiting on
+    # the indexer), so it gets its own thread - one per job worker at most -
+    # rather than a CPU executor thread that classification would queue behind
+    parsing = asyncio.ensure_future(asyncio.to_thread(parse_and_index_pages, path, doc_id, version, index_stats, on_head))
+    try:
+        await asyncio.wait({head, parsing}, return_when=asyncio.FIRST_COMPLETED)
+        if not head.done():
+            await parsing  # raises the parse error
+        text = await head
+
+        classification = await run_cpu(classify_contract, text)
+        preview = text[:PREVIEW_CHARS]
+        if CORPUS_SEARCH:
+            # Indexing may already be under way; the type filter applies to the whole doc
+            await run_io(get_corpus_index().set_document, doc_id, classification.get("contract_type"))
+        add_action("UPLOAD", {
+            "filename": payload.get("filename"),
+            "doc_id": doc_id,
+            "version": version,
+            "classification": classification
+        })
+        await stage("classified", {"doc_id": doc_id, "classification": classification, "preview": preview})
+    except BaseException:
+        # Don't leave this attempt parsing (and indexing) under a retry
+        await asyncio.gather(parsing, return_exceptions=True)
+        raise
+
+    # Every clause rule has scanned each page as it was parsed
+    pages, rule_hits, wait_for_index = await parsing
+    await stage("parsed", {"pages": pages})
+    await stage("scanned", {"rule_hits": rule_hits})
+
+    # Only waits on the indexer thread, so it stays off the bounded executors
+    chunks = await asyncio.to_thread(wait_for_index)
+    if chunks is None:
+        raise RuntimeError(f"Indexing failed for {doc_id}")
+    # Analyses pick up the new version (and its rule hits) from here on
+    await run_io(add_document_version, doc_id, version, payload["file_hash"], index_stats)
+    await run_io(prune_document_text, doc_id, version)
+    # Only a fully indexed file may deduplicate later uploads to this doc_id
+    await run_io(register_document, payload["file_hash"], doc_id, classification, preview)
+    await stage("embedded", {"chunks": chunks, "index": index_stats})
+
+    os.remove(path)
+    return {
+        "doc_id": doc_id,
+        "version": version,
+        "classification": classification,
+        "preview": preview,
+        "pages": pages,
+        "rule_hits": rule_hits,
+        "chunks": chunks,
+        "index": index_stats
+    }
+
+
+def discard_upload(job: dict):
+    """
+    Failure handler for "upload": the job is out of attempts, so its
+    spooled file will not be read again.
+    """
+    try:
+        os.remove(job["payload"]["path"])
+    except OSError:
+        pass
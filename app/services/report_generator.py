@@ -1,4 +1,361 @@
+import abc
+import json
+import html
 import datetime
+from functools import lru_cache
+
+REPORT_FORMATS = ("text", "markdown", "html", "json")
+REPORT_MEDIA_TYPES = {
+    "text": "text/plain; charset=utf-8",
+    "markdown": "text/markdown; charset=utf-8",
+    "html": "text/html; charset=utf-8",
+    "json": "application/json"
+}
+DOMAINS = ("legal", "finance", "compliance", "operations")
+
+TITLES = {
+    "formal": "Comprehensive Contract Analysis Report",
+    "concise": "Contract Summary Brief",
+    "executive": "Executive Risk & Opportunity Overview",
+    "risk-focused": "High-Priority Risk Assessment Report"
+}
+
+INTROS = {
+    "formal": "This report provides a detailed multi-domain analysis of the contractual agreement, covering legal, financial, compliance, and operational aspects.",
+    "concise": "High-level summary of key contract points and risks.",
+    "executive": "Strategic overview of the contract's impact on business operations and financial stability.",
+    "risk-focused": "Critical focus on liability, compliance failures, and financial exposure identified in the contract."
+}
+
+# Tones that close with the executive summary
+SUMMARY_TONES = ("executive", "formal")
+
+# Real logic would use an LLM to synthesize this.
+# For now, we provide a template based on counts.
+SUMMARY_LEVELS = (
+    (5, "high", "HIGH ATTENTION REQUIRED",
+     "Re-negotiate key liability and termination clauses before proceeding."),
+    (2, "moderate", "MODERATE RISK",
+     "Proceed with caution; ensure all compliance documentation is in order."),
+    (-1, "low", "LOW RISK",
+     "Contract appears standard. Proceed to standard review board."),
+)
+
+
+def _summary_level(risk_count: int):
+    for threshold, level, status, recommendation in SUMMARY_LEVELS:
+        if risk_count > threshold:
+            return level, status, recommendation
+
+
+@lru_cache(maxsize=4096)
+def _label(key: str) -> str:
+    return key.replace('_', ' ').title()
+
+
+@lru_cache(maxsize=4096)
+def _is_risk(key: str) -> bool:
+    return "risk" in key.lower()
+
+
+def _flatten(value) -> str:
+    # Nested dicts (e.g. the inputs an agent used) as one readable line
+    if isinstance(value, dict):
+        return "; ".join(
+            f"{k}: {', '.join(map(str, v)) if isinstance(v, list) else v}" for k, v in value.items()
+        )
+    return str(value)
+
+
+class ReportTemplate(abc.ABC):
+    """
+    A report layout compiled for one (tone, structure, focus, format):
+    every static string is built once and the per-field writers are
+    picked up front, so rendering is a single pass over the agent
+    results appending pieces to a list. Subclasses supply the format.
+    """
+
+    def __init__(self, tone: str, structure: str, focus: str):
+        self.tone = tone
+        self.structure = structure
+        self.focus = focus
+        self.title = TITLES.get(tone, TITLES["formal"])
+        self.intro = INTROS.get(tone, INTROS["formal"])
+        self.summary = tone in SUMMARY_TONES
+        # An unknown focus falls back to the full report
+        self.only = focus if focus != "full" and focus in DOMAINS else None
+        self.bulleted = structure == "bulleted"
+        self._heads = {domain: self.section_head(domain) for domain in DOMAINS}
+
+    def includes(self, domain: str) -> bool:
+        return self.only is None or domain == self.only
+
+    def head(self, domain: str) -> str:
+        found = self._heads.get(domain)
+        return found if found is not None else self.section_head(domain)
+
+    # Format hooks
+
+    @abc.abstractmethod
+    def header(self, timestamp: str) -> str:
+        ...
+
+    @abc.abstractmethod
+    def section_head(self, domain: str) -> str:
+        ...
+
+    @abc.abstractmethod
+    def section(self, out: list, domain: str, content: dict, index: int) -> int:
+        """
+        Append one domain's section to `out`; returns the number of risks
+        it lists so the summary never has to walk the results again.
+        """
+
+    @abc.abstractmethod
+    def footer(self, risk_count: int) -> str:
+        ...
+
+
+class FieldTemplate(ReportTemplate):
+    """
+    A template that writes each section field by field: a list writer
+    and a scalar writer per format, then section_tail.
+    """
+
+    # Closes every section
+    section_tail = ""
+
+    def section(self, out: list, domain: str, content: dict, index: int) -> int:
+        out.append(self.head(domain))
+        risks = 0
+        for key, value in content.items():
+            if isinstance(value, list):
+                if _is_risk(key):
+                    risks += len(value)
+                self.list_field(out, _label(key), value)
+            else:
+                self.scalar_field(out, _label(key), value)
+        out.append(self.section_tail)
+        return risks
+
+    @abc.abstractmethod
+    def list_field(self, out: list, label: str, items: list):
+        ...
+
+    @abc.abstractmethod
+    def scalar_field(self, out: list, label: str, value):
+        ...
+
+
+class TextTemplate(FieldTemplate):
+    section_tail = "\n"
+
+    def __init__(self, tone, structure, focus):
+        super().__init__(tone, structure, focus)
+        self.bullet = "• " if self.bulleted else ""
+        rule = "=" * 60
+        self._header = f"{rule}\n{self.title.upper()}\nGenerated on: {{timestamp}}\n{rule}\n\n{self.intro}\n\n"
+        self._summary_head = f"{rule}\nEXECUTIVE SUMMARY & RECOMMENDATIONS\n{rule}\n"
+
+    def header(self, timestamp):
+        return self._header.format(timestamp=timestamp)
+
+    def section_head(self, domain):
+        return f"[{domain.upper()} ANALYSIS]\n{'-' * len(domain) + '-----------'}\n"
+
+    def list_field(self, out, label, items):
+        out.append(f"{self.bullet}{label}:\n")
+        if items:
+            out.append("  - " + "\n  - ".join(map(str, items)) + "\n")
+
+    def scalar_field(self, out, label, value):
+        out.append(f"{self.bullet}{label}: {value}\n")
+
+    def footer(self, risk_count):
+        if not self.summary:
+            return ""
+        _, status, recommendation = _summary_level(risk_count)
+        return f"{self._summary_head}STATUS: {status}\nRecommendation: {recommendation}\n"
+
+
+def _md(text) -> str:
+    # A handful of replace() passes beats translate() with multi-char targets
+    text = str(text)
+    for char in "\\`*_[]<>":
+        if char in text:
+            text = text.replace(char, "\\" + char)
+    return text
+
+
+class MarkdownTemplate(FieldTemplate):
+    section_tail = "\n"
+
+    def __init__(self, tone, structure, focus):
+        super().__init__(tone, structure, focus)
+        self._header = f"# {_md(self.title)}\n\n_Generated on: {{timestamp}}_\n\n{_md(self.intro)}\n\n"
+
+    def header(self, timestamp):
+        return self._header.format(timestamp=timestamp)
+
+    def section_head(self, domain):
+        return f"## {_md(domain.title())} Analysis\n\n"
+
+    def list_field(self, out, label, items):
+        prefix = "  - " if self.bulleted else "- "
+        out.append(f"- **{label}:**\n" if self.bulleted else f"**{label}:**\n\n")
+        if items:
+            out.append(prefix + ("\n" + prefix).join(map(_md, items)) + "\n")
+        if not self.bulleted:
+            out.append("\n")
+
+    def scalar_field(self, out, label, value):
+        if self.bulleted:
+            out.append(f"- **{label}:** {_md(_flatten(value))}\n")
+        else:
+            out.append(f"**{label}:** {_md(_flatten(value))}\n\n")
+
+    def footer(self, risk_count):
+        if not self.summary:
+            return ""
+        _, status, recommendation = _summary_level(risk_count)
+        return (f"## Executive Summary & Recommendations\n\n**Status:** {status}\n\n"
+                f"**Recommendation:** {recommendation}\n")
+
+
+class HtmlTemplate(FieldTemplate):
+    def __init__(self, tone, structure, focus):
+        super().__init__(tone, structure, focus)
+        title = html.escape(self.title)
+        self.section_tail = ("</ul>\n" if self.bulleted else "</dl>\n") + "</section>\n"
+        self._header = (
+            f'<!DOCTYPE html>\n<html lang="en">\n<head>\n<meta charset="utf-8">\n<title>{title}</title>\n'
+            f'</head>\n<body>\n<article class="report tone-{html.escape(tone)}">\n'
+            f'<header>\n<h1>{title}</h1>\n<p class="generated">Generated on: {{timestamp}}</p>\n</header>\n'
+            f'<p class="intro">{html.escape(self.intro)}</p>\n'
+        )
+
+    def header(self, timestamp):
+        return self._header.format(timestamp=html.escape(timestamp))
+
+    def section_head(self, domain):
+        body = "<ul>\n" if self.bulleted else "<dl>\n"
+        return (f'<section class="analysis" id="{html.escape(domain)}">\n'
+                f'<h2>{html.escape(domain.title())} Analysis</h2>\n{body}')
+
+    def list_field(self, out, label, items):
+        rows = "".join(f"<li>{item}</li>\n" for item in map(html.escape, map(str, items)))
+        if self.bulleted:
+            out.append(f"<li><strong>{html.escape(label)}:</strong>\n<ul>\n{rows}</ul>\n</li>\n")
+        else:
+            out.append(f"<dt>{html.escape(label)}</dt>\n<dd>\n<ul>\n{rows}</ul>\n</dd>\n")
+
+    def scalar_field(self, out, label, value):
+        value = html.escape(_flatten(value))
+        if self.bulleted:
+            out.append(f"<li><strong>{html.escape(label)}:</strong> {value}</li>\n")
+        else:
+            out.append(f"<dt>{html.escape(label)}</dt>\n<dd>{value}</dd>\n")
+
+    def footer(self, risk_count):
+        closing = "</article>\n</body>\n</html>\n"
+        if not self.summary:
+            return closing
+        level, status, recommendation = _summary_level(risk_count)
+        return (f'<section class="summary level-{level}">\n<h2>Executive Summary &amp; Recommendations</h2>\n'
+                f'<p class="status">{status}</p>\n<p class="recommendation">{html.escape(recommendation)}</p>\n'
+                f'</section>\n{closing}')
+
+
+class JsonTemplate(ReportTemplate):
+    """
+    One JSON object, emitted in pieces: metadata, a "sections" object
+    filled as each domain is rendered, then the risk count and summary.
+    """
+
+    def __init__(self, tone, structure, focus):
+        super().__init__(tone, structure, focus)
+        self._header = (
+            '{"title": ' + json.dumps(self.title) + ', "generated_on": {timestamp}, "tone": ' + json.dumps(tone)
+            + ', "focus": ' + json.dumps(focus) + ', "structure": ' + json.dumps(structure)
+            + ', "intro": ' + json.dumps(self.intro) + ', "sections": {'
+        )
+
+    def header(self, timestamp):
+        return self._header.replace("{timestamp}", json.dumps(timestamp), 1)
+
+    def section_head(self, domain):
+        return json.dumps(domain) + ": "
+
+    def section(self, out, domain, content, index):
+        if index:
+            out.append(", ")
+        out.append(self.head(domain))
+        out.append(json.dumps(content, default=str))
+        return sum(len(v) for k, v in content.items() if isinstance(v, list) and _is_risk(k))
+
+    def footer(self, risk_count):
+        closing = '}, "risk_count": ' + str(risk_count)
+        if self.summary:
+            level, status, recommendation = _summary_level(risk_count)
+            closing += ', "summary": ' + json.dumps(
+                {"level": level, "status": status, "recommendation": recommendation}
+            )
+        return closing + "}"
+
+
+_TEMPLATES = {
+    "text": TextTemplate,
+    "markdown": MarkdownTemplate,
+    "html": HtmlTemplate,
+    "json": JsonTemplate
+}
+
+
+@lru_cache(maxsize=256)
+def compile_template(tone: str = "formal", structure: str = "structured", focus: str = "full",
+                     format: str = "text") -> ReportTemplate:
+    if format not in _TEMPLATES:
+        raise ValueError(f"Unknown report format '{format}', expected one of {REPORT_FORMATS}")
+    return _TEMPLATES[format](tone, structure, focus)
+
+
+class ReportRenderer:
+    """
+    Incremental rendering with a compiled template: begin(), then
+    section() for each domain as its result becomes available, then
+    end(). Each call returns the next piece of the document, so a
+    report can be streamed while later agents are still running.
+    """
+
+    def __init__(self, template: ReportTemplate, timestamp: str = None):
+        self.template = template
+        self.timestamp = timestamp or datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        self.risk_count = 0
+        self._sections = 0
+
+    def begin(self) -> str:
+        return self.template.header(self.timestamp)
+
+    def section(self, domain: str, content: dict) -> str:
+        if not self.template.includes(domain):
+            return ""
+        out = []
+        self.risk_count += self.template.section(out, domain, content, self._sections)
+        self._sections += 1
+        return "".join(out)
+
+    def end(self) -> str:
+        return self.template.footer(self.risk_count)
+
+    def render(self, sections: dict) -> str:
+        out = [self.begin()]
+        for domain, content in sections.items():
+            if self.template.includes(domain):
+                self.risk_count += self.template.section(out, domain, content, self._sections)
+                self._sections += 1
+        out.append(self.end())
+        return "".join(out)
+
 
 def generate_report(
     legal: dict,
@@ -7,101 +364,20 @@ def generate_report(
     operations: dict,
     tone: str = "formal",
     focus: str = "full",
-    structure: str = "structured"
+    structure: str = "structured",
+    format: str = "text"
 ):
     """
     Generate a professional, multi-domain analysis report.
     Tones: formal, concise, executive, risk-focused
     Focus: full, legal, finance, compliance, operations
     Structure: structured, bulleted
+    Formats: text, markdown, html, json
     """
-
     sections = {
         "legal": legal,
         "finance": finance,
         "compliance": compliance,
         "operations": operations
     }
-
-    # Filter by focus
-    if focus != "full":
-        if focus in sections:
-            sections = {focus: sections[focus]}
-        else:
-            # Fallback if invalid focus
-            pass
-
-    # Header Generation based on tone
-    timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    
-    titles = {
-        "formal": "Comprehensive Contract Analysis Report",
-        "concise": "Contract Summary Brief",
-        "executive": "Executive Risk & Opportunity Overview",
-        "risk-focused": "High-Priority Risk Assessment Report"
-    }
-    
-    title = titles.get(tone, titles["formal"])
-    
-    report = f"{'='*60}\n"
-    report += f"{title.upper()}\n"
-    report += f"Generated on: {timestamp}\n"
-    report += f"{'='*60}\n\n"
-
-    # Tone-based Introduction
-    intros = {
-        "formal": "This report provides a detailed multi-domain analysis of the contractual agreement, covering legal, financial, compliance, and operational aspects.",
-        "concise": "High-level summary of key contract points and risks.",
-        "executive": "Strategic overview of the contract's impact on business operations and financial stability.",
-        "risk-focused": "Critical focus on liability, compliance failures, and financial exposure identified in the contract."
-    }
-    report += intros.get(tone, intros["formal"]) + "\n\n"
-
-    for domain, content in sections.items():
-        report += f"[{domain.upper()} ANALYSIS]\n"
-        report += f"{'-'*len(domain) + '-----------'}\n"
-        
-        if structure == "bulleted":
-            for key, value in content.items():
-                if isinstance(value, list):
-                    report += f"• {key.replace('_', ' ').title()}:\n"
-                    for item in value:
-                        report += f"  - {item}\n"
-                else:
-                    report += f"• {key.replace('_', ' ').title()}: {value}\n"
-        else: # structured
-            for key, value in content.items():
-                label = key.replace('_', ' ').title()
-                if isinstance(value, list):
-                    report += f"{label}:\n"
-                    for item in value:
-                        report += f"  - {item}\n"
-                else:
-                    report += f"{label}: {value}\n"
-        report += "\n"
-
-    # Executive Summary (Simulated synthesis)
-    if tone in ["executive", "formal"]:
-        report += f"{'='*60}\n"
-        report += "EXECUTIVE SUMMARY & RECOMMENDATIONS\n"
-        report += f"{'='*60}\n"
-        
-        # Real logic would use an LLM to synthesize this.
-        # For now, we provide a template based on counts.
-        risk_count = 0
-        for data in sections.values():
-            for k, v in data.items():
-                if "risk" in k.lower() and isinstance(v, list):
-                    risk_count += len(v)
-        
-        if risk_count > 5:
-            report += "STATUS: HIGH ATTENTION REQUIRED\n"
-            report += "Recommendation: Re-negotiate key liability and termination clauses before proceeding.\n"
-        elif risk_count > 2:
-            report += "STATUS: MODERATE RISK\n"
-            report += "Recommendation: Proceed with caution; ensure all compliance documentation is in order.\n"
-        else:
-            report += "STATUS: LOW RISK\n"
-            report += "Recommendation: Contract appears standard. Proceed to standard review board.\n"
-
-    return report
+    return ReportRenderer(compile_template(tone, structure, focus, format)).render(sections)
@@ -1,40 +1,180 @@
-from app.services.embeddings import get_pinecone_index, embed_text
+import os
+from typing import Dict
+import numpy as np
+from app.services.embeddings import embed_text, encode_texts
+from app.services.vector_store import get_vector_store
+from app.services.text_store import get_text_store
+from app.services.lexical_index import get_lexical_index, HYBRID_RETRIEVAL
+from app.services.telemetry import timed, span
 
 
 _cached_query = None
 
-def retrieve_context(doc_id: str, top_k: int = 5) -> str:
+def retrieve_context(doc_id: str, top_k: int = 5, query: str = None) -> str:
+    """
+    Context for one query (a generic "contract context" search if none
+    is given). A specific query is also looked up in the BM25 index and
+    the two rankings are fused.
+    """
     global _cached_query
-    index = get_pinecone_index()
+    index = get_vector_store()
     if index is None:
         return ""
 
-    if _cached_query is None:
-        _cached_query = embed_text("contract context")
-        
-    query_vector = _cached_query
+    if query is not None:
+        query_vector = embed_text(query)
+    else:
+        if _cached_query is None:
+            _cached_query = embed_text("contract context")
+        query_vector = _cached_query
     if not query_vector:
         return ""
+    hybrid = query is not None and HYBRID_RETRIEVAL
+    depth = max(top_k, RETRIEVAL_CANDIDATES) if hybrid else top_k
 
-    try:
-        result = index.query(
-            vector=query_vector,
-            top_k=top_k,
-            include_metadata=True,
-            filter={
-                "doc_id": doc_id,
-                "type": {"$ne": "agent_output"}  # IMPORTANT
-            }
-        )
-    except Exception as e:
-        print(f"Retrieval error: {e}")
-        return ""
+    result = index.query(
+        vector=query_vector,
+        top_k=depth,
+        include_metadata=False,
+        filter={
+            "doc_id": doc_id,
+            "type": {"$ne": "agent_output"}  # IMPORTANT
+        }
+    )
+
+    ids = [match["id"] for match in result["matches"]]
+    if hybrid:
+        ids = fuse_rankings([ids, get_lexical_index().search(doc_id, query, depth)], top_k)
+    texts = load_chunk_texts(doc_id, ids)
+    return " ".join(texts[chunk_id] for chunk_id in ids if chunk_id in texts)
+
+
+def load_chunk_texts(doc_id: str, ids: list) -> Dict[str, str]:
+    """
+    Text for the given chunk ids, read from the memory-mapped text store.
+    Chunks indexed before text moved out of vector metadata are fetched
+    from the vector store instead.
+    """
+    texts = get_text_store().get(doc_id, ids)
+    missing = [chunk_id for chunk_id in ids if chunk_id not in texts]
+    if missing:
+        try:
+            fetched = get_vector_store().fetch(missing, doc_id=doc_id)
+        except Exception as e:
+            print(f"Chunk text fetch error: {e}")
+            fetched = {}
+        texts.update({vid: meta["text"] for vid, meta in fetched.items() if meta.get("text")})
+    return texts
+
+
+# Per-agent retrieval queries. Each agent gets its own ranked context
+# instead of every agent sharing one generic "contract context" search.
+AGENT_QUERIES = {
+    "legal": [
+        "termination rights and notice period",
+        "limitation of liability and indemnification",
+        "governing law, jurisdiction and dispute resolution",
+        "obligations and warranties of the parties"
+    ],
+    "finance": [
+        "payment terms, invoices and due dates",
+        "fees, pricing and late payment penalties",
+        "damages, settlement costs and financial exposure"
+    ],
+    "compliance": [
+        "regulatory compliance and applicable laws",
+        "data protection, privacy and confidentiality",
+        "audit rights, records and reporting obligations"
+    ],
+    "operations": [
+        "service levels, delivery and performance obligations",
+        "timelines, milestones and operational responsibilities",
+        "force majeure, business continuity and subcontracting"
+    ]
+}
+
+# Reciprocal-rank-fusion damping constant
+RRF_K = 60
+# With hybrid retrieval, ids ranked per query (vector and BM25) before
+# fusion cuts them to top_k; only the winners' text is loaded
+RETRIEVAL_CANDIDATES = int(os.getenv("RETRIEVAL_CANDIDATES", "20"))
+
+_query_table = None  # (agent per row, normalised query matrix)
+
+
+def fuse_rankings(rankings: list, limit: int) -> list:
+    """
+    Reciprocal-rank fusion of ranked id lists: each id scores
+    1 / (RRF_K + rank) summed over the lists it appears in.
+    """
+    scores = {}
+    for ranking in rankings:
+        for rank, chunk_id in enumerate(ranking):
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + 1.0 / (RRF_K + rank + 1)
+    return sorted(scores, key=scores.get, reverse=True)[:limit]
+
+
+def get_query_table():
+    """
+    Embed every agent query once, as a single batch, into a matrix that
+    is reused by all later retrievals.
+    """
+    global _query_table
+    if _query_table is None:
+        owners = [agent for agent, queries in AGENT_QUERIES.items() for _ in queries]
+        texts = [query for queries in AGENT_QUERIES.values() for query in queries]
+        matrix = np.asarray(encode_texts(texts), dtype=np.float32)
+        matrix /= np.linalg.norm(matrix, axis=1, keepdims=True) + 1e-12
+        _query_table = (owners, matrix)
+    return _query_table
+
+@timed("retrieve")
+def retrieve_agent_contexts(doc_id: str, top_k: int = 5) -> Dict[str, str]:
+    """
+    Run all agent queries as one multi-vector search against the doc,
+    and (with HYBRID_RETRIEVAL) against the doc's BM25 index, so exact
+    legal terms rank even where embeddings blur them. Each agent's
+    result lists are fused with reciprocal-rank fusion, de-duplicating
+    chunks, and {agent: context} is returned. Vector store errors are
+    raised rather than answered with empty contexts, which the agents
+    would analyze (and cache) as a contract with nothing in it.
+    """
+    empty = {agent: "" for agent in AGENT_QUERIES}
+    index = get_vector_store()
+    if index is None:
+        return empty
 
-    texts = []
+    depth = max(top_k, RETRIEVAL_CANDIDATES) if HYBRID_RETRIEVAL else top_k
+    owners, matrix = get_query_table()
+    results = index.query_many(
+        matrix,
+        top_k=depth,
+        filter={
+            "doc_id": doc_id,
+            "type": {"$ne": "agent_output"}
+        },
+        # Ids and scores only; text is loaded for the fused winners
+        include_metadata=False
+    )
 
-    for match in result["matches"]:
-        metadata = match.get("metadata", {})
-        if "text" in metadata:
-            texts.append(metadata["text"])
+    rankings = {agent: [] for agent in AGENT_QUERIES}
+    for agent, result in zip(owners, results):
+        rankings[agent].append([match["id"] for match in result["matches"]])
+    if HYBRID_RETRIEVAL:
+        queries = [query for queries in AGENT_QUERIES.values() for query in queries]
+        try:
+            with span("lexical", doc_id=doc_id):
+                lexical = get_lexical_index().search_many(doc_id, queries, depth)
+        except Exception as e:
+            print(f"Lexical retrieval error: {e}")
+            lexical = []
+        for agent, ids in zip(owners, lexical):
+            rankings[agent].append(ids)
 
-    return " ".join(texts)
+    ranked = {agent: fuse_rankings(lists, top_k) for agent, lists in rankings.items()}
+    needed = list(dict.fromkeys(chunk_id for ids in ranked.values() for chunk_id in ids))
+    texts = load_chunk_texts(doc_id, needed)
+    return {
+        agent: " ".join(texts[chunk_id] for chunk_id in ids if chunk_id in texts)
+        for agent, ids in ranked.items()
+    }
@@ -0,0 +1,509 @@
+import os
+import re
+import time
+import json
+import bisect
+import heapq
+import hashlib
+import threading
+from dataclasses import dataclass
+from typing import Dict, List
+
+try:
+    from re import _parser as _sre_parse
+except ImportError:  # Python < 3.11
+    import sre_parse as _sre_parse
+
+from app.services.analysis_cache import get_analysis_cache
+from app.services.text_store import get_text_store
+from app.services.telemetry import record_span
+
+# JSON list of clause rules; see app/rules/contract_rules.json for the format
+RULES_FILE = os.getenv(
+    "RULES_FILE", os.path.join(os.path.dirname(os.path.dirname(__file__)), "rules", "contract_rules.json")
+)
+# Hits kept per rule per document; later occurrences are only counted
+RULE_MAX_HITS = int(os.getenv("RULE_MAX_HITS", "25"))
+# Characters of surrounding clause kept with each hit
+CLAUSE_EXCERPT_CHARS = int(os.getenv("CLAUSE_EXCERPT_CHARS", "240"))
+
+# Text store ids of a document's pages, kept for rescans, start with this
+# (documents scanned before that have their whole text under this id)
+DOCUMENT_TEXT_ID = "__document__"
+
+_END = ""
+_CLAUSE_BREAK = re.compile(r"[.;:!?]\s|\n\s*\n")
+
+_ruleset = None
+_ruleset_lock = threading.Lock()
+
+
+@dataclass
+class Rule:
+    id: str
+    agents: List[str]
+    category: str
+    finding: str
+    risk: str = None
+    severity: str = "low"
+
+
+def _normalise(phrase: str) -> str:
+    return " ".join(phrase.lower().split())
+
+
+def _trie_pattern(node: dict) -> str:
+    # One alternative per distinct next character, so the regex engine
+    # follows a single branch per input character whatever the number of
+    # terms. A phrase ending here makes the rest optional (greedy, so the
+    # longest term wins).
+    branches = []
+    for char in sorted(k for k in node if k != _END):
+        head = r"\s+" if char == " " else re.escape(char)
+        branches.append(head + _trie_pattern(node[char]))
+    if not branches:
+        return ""
+    if len(branches) == 1 and _END not in node:
+        return branches[0]
+    body = "(?:" + "|".join(branches) + ")"
+    return body + "?" if _END in node else body
+
+
+def _literal_runs(parsed) -> List[List[str]]:
+    # Options for the literals every match of `parsed` contains: each is
+    # a list of literals at least one of which occurs in any match
+    options, run = [], ""
+    for op, arg in parsed:
+        if op is _sre_parse.LITERAL:
+            run += chr(arg)
+            continue
+        if run:
+            options.append([run])
+            run = ""
+        if op is _sre_parse.SUBPATTERN:
+            options.extend(_literal_runs(arg[-1]))
+        elif op in (_sre_parse.MAX_REPEAT, _sre_parse.MIN_REPEAT) and arg[0] >= 1:
+            options.extend(_literal_runs(arg[2]))
+        elif op is _sre_parse.BRANCH:
+            branches = [_required_literals(branch) for branch in arg[1]]
+            if all(branches):
+                options.append([literal for branch in branches for literal in branch])
+    if run:
+        options.append([run])
+    return options
+
+
+def _required_literals(parsed) -> List[str]:
+    # The best option of _literal_runs (longest shortest literal), or []
+    # if a match needn't contain any literal
+    options = [[_normalise(literal) for literal in option] for option in _literal_runs(parsed)]
+    options = [option for option in options if all(option)]
+    if not options:
+        return []
+    return list(dict.fromkeys(max(options, key=lambda option: min(map(len, option)))))
+
+
+def _build_trie(phrases) -> dict:
+    trie = {}
+    for phrase in phrases:
+        node = trie
+        for char in phrase:
+            node = node.setdefault(char, {})
+        node[_END] = True
+    return trie
+
+
+class RuleSet:
+    """
+    Every rule's literal terms compiled into one character trie rendered
+    as a single regex, so terms are found in one left-to-right pass over
+    the text however many rules there are: at each position the engine
+    walks at most one trie branch instead of trying every term.
+
+    Rule regexes can't join that pass, so each is pre-filtered by the
+    literal text all its matches contain (e.g. "written" for
+    "\\d+ days' written notice"). The literals of all regexes form a
+    second trie pattern, and a regex is only run over text in which one
+    of its literals occurs. A regex with no such literal runs over all
+    text, so only those add a cost per regex rule.
+
+    Hits are reported at every position where a term or regex matches,
+    so hits of different rules may overlap. A rule's own hits don't.
+    Where terms share a prefix the longest one wins and the rules of its
+    shorter prefixes are reported with it.
+    """
+
+    def __init__(self, rules: List[dict]):
+        self.rules = []
+        self._terms = {}    # normalised term -> rule indexes
+        self._regexes = {}  # regex name -> rule index
+        self._sources = {}  # "terms" and regex names -> pattern, in scan order
+        self._literals = {}  # normalised literal -> names of the regexes needing it
+        self._unfiltered = []  # names of regexes without a required literal
+        terms = []
+        for spec in rules:
+            agents = spec["agent"] if isinstance(spec["agent"], list) else [spec["agent"]]
+            rule = Rule(spec["id"], agents, spec.get("category", spec["id"]), spec["finding"],
+                        spec.get("risk"), spec.get("severity", "low"))
+            index = len(self.rules)
+            self.rules.append(rule)
+            for term in spec.get("terms", []):
+                term = _normalise(term)
+                self._terms.setdefault(term, []).append(index)
+                terms.append(term)
+            for pattern in spec.get("regex", []):
+                name = f"r{len(self._regexes)}"
+                self._regexes[name] = index
+                self._sources[name] = re.compile(pattern, re.IGNORECASE)
+                literals = _required_literals(_sre_parse.parse(pattern, re.IGNORECASE))
+                for literal in literals:
+                    self._literals.setdefault(literal, []).append(name)
+                if not literals:
+                    self._unfiltered.append(name)
+
+        self._trie = _build_trie(terms)
+        if self._trie:
+            pattern = re.compile(r"(?<!\w)" + _trie_pattern(self._trie) + r"(?!\w)", re.IGNORECASE)
+            self._sources = {"terms": pattern, **self._sources}
+        self._rank = {name: rank for rank, name in enumerate(self._sources)}
+        self._literal_trie = _build_trie(self._literals)
+        self._literal_pattern = re.compile(_trie_pattern(self._literal_trie), re.IGNORECASE) \
+            if self._literal_trie else None
+        canonical = json.dumps(rules, sort_keys=True).encode()
+        self.fingerprint = hashlib.sha256(canonical).hexdigest()[:16]
+
+    @staticmethod
+    def _prefixes(trie: dict, table: dict, matched: str, whole_words: bool) -> list:
+        # Values of the matched phrase and of every shorter phrase it starts with
+        phrase = _normalise(matched)
+        found = []
+        node = trie
+        for i, char in enumerate(phrase):
+            node = node.get(char)
+            if node is None:
+                break
+            if _END in node and (not whole_words or i + 1 == len(phrase) or not phrase[i + 1].isalnum()):
+                found.extend(table.get(phrase[:i + 1], []))
+        return found
+
+    def _term_rules(self, matched: str) -> List[int]:
+        # Rules of the matched term and of every shorter term it starts with
+        return self._prefixes(self._trie, self._terms, matched, whole_words=True)
+
+    def _candidates(self, text: str, start: int) -> list:
+        # Regexes that may match in text[start:]: those whose literal
+        # occurs there, and those without one
+        wanted = len(self._regexes)
+        found = set(self._unfiltered)
+        pos = start
+        while self._literal_pattern is not None and len(found) < wanted:
+            match = self._literal_pattern.search(text, pos)
+            if match is None:
+                break
+            found.update(self._prefixes(self._literal_trie, self._literals, match.group(), whole_words=False))
+            pos = match.start() + 1
+        return sorted(found, key=self._rank.get)
+
+    def _clause(self, text: str, start: int, end: int):
+        lo = max(0, start - CLAUSE_EXCERPT_CHARS)
+        breaks = [m.end() for m in _CLAUSE_BREAK.finditer(text, lo, start)]
+        clause_start = breaks[-1] if breaks else lo
+        close = _CLAUSE_BREAK.search(text, end, end + CLAUSE_EXCERPT_CHARS)
+        clause_end = close.start() + 1 if close else min(len(text), end + CLAUSE_EXCERPT_CHARS)
+        return clause_start, clause_end
+
+    def _add_hits(self, group: str, match, text: str, offset: int, page_starts: List[int],
+                  seen: dict, ends: dict, hits: List[dict]):
+        # `text` is the scanned window and `offset` its position in the
+        # document; `ends` is where each rule's last hit ended
+        indexes = self._term_rules(match.group()) if group == "terms" else [self._regexes[group]]
+        for index in dict.fromkeys(indexes):
+            if offset + match.start() < ends.get(index, 0):
+                continue
+            ends[index] = offset + match.end()
+            seen[index] = seen.get(index, 0) + 1
+            if seen[index] > RULE_MAX_HITS:
+                continue
+            rule = self.rules[index]
+            start, end = match.span()
+            clause_start, clause_end = self._clause(text, start, end)
+            hit = {
+                "rule": rule.id,
+                "agents": rule.agents,
+                "category": rule.category,
+                "severity": rule.severity,
+                "finding": rule.finding,
+                "risk": rule.risk,
+                "start": offset + start,
+                "end": offset + end,
+                "match": match.group(),
+                "clause_start": offset + clause_start,
+                "clause_end": offset + clause_end,
+                "clause": " ".join(text[clause_start:clause_end].split()),
+            }
+            if page_starts is not None:
+                hit["page"] = bisect.bisect_right(page_starts, offset + start)
+            hits.append(hit)
+
+    def scan(self, text: str, page_starts: List[int] = None) -> List[dict]:
+        """
+        All rule hits in `text`, in document order, each with the matched
+        span, the surrounding clause span and excerpt, and the 1-based page
+        when `page_starts` (offset of each page in `text`) is given.
+        """
+        scan = RuleScan(self, pages=bool(page_starts))
+        if page_starts:
+            for start, end in zip(page_starts, list(page_starts[1:]) + [len(text)]):
+                scan.feed(text[start:end])
+        else:
+            scan.feed(text)
+        return scan.finish()
+
+    def route(self, hits: List[dict]) -> Dict[str, List[dict]]:
+        """
+        Group hits by the agent(s) their rule is addressed to.
+        """
+        routed = {}
+        for hit in hits:
+            for agent in hit["agents"]:
+                routed.setdefault(agent, []).append(hit)
+        return routed
+
+
+class RuleScan:
+    """
+    RuleSet.scan over a document fed one page at a time. Only a window
+    around the scan position is kept. A match is resolved once twice
+    CLAUSE_EXCERPT_CHARS of text follow its start, enough for the match
+    itself and its clause excerpt, so rule matches are assumed to be
+    shorter than CLAUSE_EXCERPT_CHARS.
+    """
+
+    def __init__(self, ruleset: RuleSet, pages: bool = True):
+        self.ruleset = ruleset
+        self.page_starts = [] if pages else None
+        self.window = ""
+        self.base = 0   # document offset of window[0]
+        self.pos = 0    # document offset the next match search starts at
+        self.seen = {}
+        self.ends = {}
+        self.hits = []
+
+    def feed(self, page: str):
+        if self.page_starts is not None:
+            self.page_starts.append(self.base + len(self.window))
+        self.window += page
+        self._scan(final=False)
+
+    def finish(self) -> List[dict]:
+        self._scan(final=True)
+        return self.hits
+
+    def _scan(self, final: bool):
+        ruleset = self.ruleset
+        limit = len(self.window) if final else len(self.window) - 2 * CLAUSE_EXCERPT_CHARS
+        local = self.pos - self.base
+        if local < limit:
+            names = ruleset._candidates(self.window, local)
+            if "terms" in ruleset._sources:
+                names.insert(0, "terms")
+            # Matches of every source merged by start, sources in rule
+            # order at the same start; each source resumes one character
+            # after its last match (or after its rule's last hit)
+            heap = []
+
+            def push(name, start):
+                match = ruleset._sources[name].search(self.window, start)
+                if match is not None and match.start() < limit:
+                    heapq.heappush(heap, (match.start(), ruleset._rank[name], name, match))
+
+            for name in names:
+                push(name, local)
+            while heap:
+                start, _, name, match = heapq.heappop(heap)
+                ruleset._add_hits(name, match, self.window, self.base, self.page_starts,
+                                  self.seen, self.ends, self.hits)
+                resume = start + 1
+                if name != "terms":
+                    resume = max(resume, self.ends.get(ruleset._regexes[name], 0) - self.base)
+                push(name, resume)
+            local = limit
+        self.pos = self.base + max(local, self.pos - self.base)
+        # Keep enough text behind the scan position for clause excerpts
+        cut = max(0, self.pos - self.base - CLAUSE_EXCERPT_CHARS)
+        if cut:
+            self.window = self.window[cut:]
+            self.base += cut
+
+
+def load_rules(path: str = RULES_FILE) -> RuleSet:
+    with open(path, "r") as f:
+        return RuleSet(json.load(f))
+
+
+def get_ruleset() -> RuleSet:
+    global _ruleset
+    if _ruleset is None:
+        with _ruleset_lock:
+            if _ruleset is None:
+                _ruleset = load_rules()
+    return _ruleset
+
+
+def _hits_key(ruleset: RuleSet, version: int = None) -> str:
+    if version and version > 1:
+        return f"rule_hits-{ruleset.fingerprint}-v{version}"
+    return f"rule_hits-{ruleset.fingerprint}"
+
+
+def _page_text_prefix(version: int = None) -> str:
+    return f"{DOCUMENT_TEXT_ID}{version or 1}/"
+
+
+class DocumentScan:
+    """
+    scan_document fed one page at a time, so ingest never holds the
+    whole document. Pages are scanned by a RuleScan and written to the
+    text store (in batches of about TEXT_BATCH_CHARS) for rescans.
+    """
+
+    TEXT_BATCH_CHARS = 256 * 1024
+
+    def __init__(self, doc_id: str, version: int = None):
+        self.doc_id = doc_id
+        self.version = version
+        self.ruleset = get_ruleset()
+        self.scan = RuleScan(self.ruleset)
+        self.prefix = _page_text_prefix(version)
+        self.pages = 0
+        self.pending = []
+        self.pending_chars = 0
+        self.seconds = 0.0
+
+    def _flush(self):
+        if self.pending:
+            get_text_store().put(self.doc_id, self.pending)
+            self.pending, self.pending_chars = [], 0
+
+    def feed(self, page: str):
+        t0 = time.perf_counter()
+        self.pending.append((f"{self.prefix}{self.pages}", page))
+        self.pending_chars += len(page)
+        self.pages += 1
+        if self.pending_chars >= self.TEXT_BATCH_CHARS:
+            self._flush()
+        self.scan.feed(page)
+        self.seconds += time.perf_counter() - t0
+
+    def finish(self) -> int:
+        """
+        Cache the hits per agent and return how many there are.
+        """
+        t0 = time.perf_counter()
+        self._flush()
+        hits = self.scan.finish()
+        get_analysis_cache().put(self.doc_id, _hits_key(self.ruleset, self.version), self.ruleset.route(hits))
+        record_span("rules", self.seconds + time.perf_counter() - t0, pages=self.pages)
+        return len(hits)
+
+
+def scan_document(doc_id: str, pages, version: int = None) -> int:
+    """
+    Scan a freshly parsed document (or a new version of one) once and
+    cache its hits per agent. Its text is kept in the text store, page
+    by page, so the document can be rescanned if the rules change.
+    Returns the number of hits.
+    """
+    scan = DocumentScan(doc_id, version)
+    for page in pages:
+        scan.feed(page)
+    return scan.finish()
+
+
+def prune_document_text(doc_id: str, version: int = None):
+    """
+    Drop the stored text of every other version once `version` is the
+    document's indexed version.
+    """
+    store = get_text_store()
+    keep = _page_text_prefix(version)
+    stale = [cid for cid in store.ids(doc_id)
+             if cid.startswith(DOCUMENT_TEXT_ID) and not cid.startswith(keep)]
+    if stale:
+        store.delete(doc_id, stale)
+
+
+def _document_pages(doc_id: str, version: int = None):
+    store = get_text_store()
+    prefix = _page_text_prefix(version)
+    ids = sorted((cid for cid in store.ids(doc_id) if cid.startswith(prefix)),
+                 key=lambda cid: int(cid[len(prefix):]))
+    if ids:
+        texts = store.get(doc_id, ids)
+        return [texts[cid] for cid in ids if cid in texts], True
+    # Documents scanned before text was stored per page
+    text = store.get(doc_id, [DOCUMENT_TEXT_ID]).get(DOCUMENT_TEXT_ID)
+    return (None if text is None else [text]), False
+
+
+def get_rule_hits(doc_id: str, version: int = None):
+    """
+    {agent: [hits]} for a version of a document, rescanning its stored
+    text when the rule set has changed since ingest. None if the document
+    was never scanned.
+    """
+    ruleset = get_ruleset()
+    cache = get_analysis_cache()
+    routed = cache.get(doc_id, _hits_key(ruleset, version))
+    if routed is not None:
+        return routed
+    pages, per_page = _document_pages(doc_id, version)
+    if pages is None:
+        return None
+    scan = RuleScan(ruleset, pages=per_page)
+    for page in pages:
+        scan.feed(page)
+    routed = ruleset.route(scan.finish())
+    cache.put(doc_id, _hits_key(ruleset, version), routed)
+    return routed
+
+
+def hits_for(agent: str, context) -> List[dict]:
+    """
+    Hits routed to `agent`: the ones from the ingest scan when the context
+    carries them, otherwise a scan of the agent's retrieved text.
+    """
+    if isinstance(context, dict):
+        if context.get("hits") is not None:
+            return context["hits"]
+        context = context.get("text", "")
+    ruleset = get_ruleset()
+    return ruleset.route(ruleset.scan(context or "")).get(agent, [])
+
+
+def findings(hits: List[dict]) -> List[str]:
+    return list(dict.fromkeys(hit["finding"] for hit in hits))
+
+
+def risks(hits: List[dict]) -> List[str]:
+    return list(dict.fromkeys(hit["risk"] for hit in hits if hit.get("risk")))
+
+
+def categories(hits: List[dict]) -> List[str]:
+    return list(dict.fromkeys(hit["category"] for hit in hits))
+
+
+def evidence(hits: List[dict], per_rule: int = 1) -> List[str]:
+    """
+    Readable references to the clauses behind the findings, the first
+    `per_rule` occurrences of each rule. Character offsets are left out
+    so an amendment that only shifts a clause does not change the text.
+    """
+    shown, lines = {}, []
+    for hit in hits:
+        shown[hit["rule"]] = shown.get(hit["rule"], 0) + 1
+        if shown[hit["rule"]] > per_rule:
+            continue
+        where = f" (p. {hit['page']})" if hit.get("page") else ""
+        lines.append(f"{hit['finding']}{where}: {hit['clause']}")
+    return lines
@@ -0,0 +1,380 @@
+import os
+import sys
+import time
+import uuid
+import inspect
+import threading
+import contextvars
+from collections import deque, Counter as _Tally
+from contextlib import contextmanager
+from functools import wraps
+from typing import Callable, Dict, Optional
+
+from starlette.datastructures import MutableHeaders
+from starlette.requests import Request
+
+# Per-request sampling profiles (?profile=1 or "X-Profile: 1") are only
+# honoured when this is on
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "0") in ("1", "true", "True")
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+# Recent request traces kept for GET /traces/{trace_id}
+TRACE_KEEP = int(os.getenv("TRACE_KEEP", "200"))
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_registry = []
+_registry_lock = threading.Lock()
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+_recent_traces = deque(maxlen=TRACE_KEEP)
+_profile_lock = threading.Lock()
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Metric:
+    """
+    Base for the small Prometheus-compatible metric types below. Values
+    are keyed by the tuple of label values. Passing `callback` makes a
+    metric whose values are read at scrape time: it returns
+    {label_values_tuple: value}.
+    """
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames=(), callback: Callable = None):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.callback = callback
+        self._values = {}
+        self._lock = threading.Lock()
+        with _registry_lock:
+            _registry.append(self)
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def samples(self):
+        values = self.callback() if self.callback else None
+        if values is None:
+            with self._lock:
+                values = dict(self._values)
+        for key, value in values.items():
+            yield self.name, _format_labels(self.labelnames, key), value
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        try:
+            for name, labels, value in self.samples():
+                lines.append(f"{name}{labels} {float(value)!r}")
+        except Exception as e:
+            lines.append(f"# {self.name} unavailable: {_escape(e)}")
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+                    break
+            else:
+                entry[0][-1] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def samples(self):
+        with self._lock:
+            values = {key: (list(counts), total, n) for key, (counts, total, n) in self._values.items()}
+        for key, (counts, total, n) in values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                le = f'le="{bound:g}"' if bound != "+Inf" else 'le="+Inf"'
+                yield self.name + "_bucket", _format_labels(self.labelnames, key, le), cumulative
+            yield self.name + "_sum", _format_labels(self.labelnames, key), total
+            yield self.name + "_count", _format_labels(self.labelnames, key), n
+
+
+def render_metrics() -> str:
+    """
+    Every registered metric in the Prometheus text exposition format.
+    Metrics are per process: with several uvicorn workers, each serves
+    its own numbers.
+    """
+    with _registry_lock:
+        metrics = list(_registry)
+    lines = []
+    for metric in metrics:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+REQUEST_SECONDS = Histogram(
+    "clausesense_http_request_duration_seconds",
+    "HTTP request latency by route", ["method", "route", "status"]
+)
+STAGE_SECONDS = Histogram(
+    "clausesense_stage_duration_seconds",
+    "Latency of each traced service call", ["stage"]
+)
+STAGE_ERRORS = Counter(
+    "clausesense_stage_errors_total",
+    "Traced service calls that raised", ["stage"]
+)
+MODEL_LOAD_SECONDS = Gauge(
+    "clausesense_model_load_seconds",
+    "Wall time taken to load each model", ["model"]
+)
+
+
+class Trace:
+    """
+    Spans recorded while handling one request. Shared by reference
+    through a context variable, so spans opened in asyncio.to_thread
+    workers land in the same trace.
+    """
+
+    def __init__(self, name: str):
+        self.id = uuid.uuid4().hex[:16]
+        self.name = name
+        self.started = time.perf_counter()
+        self.spans = []
+        self.profile = None
+        self._lock = threading.Lock()
+
+    def add(self, record: dict):
+        with self._lock:
+            self.spans.append(record)
+
+    def server_timing(self) -> str:
+        # Total time per stage name, in the Server-Timing header format
+        totals = {}
+        with self._lock:
+            for record in self.spans:
+                totals[record["name"]] = totals.get(record["name"], 0.0) + record["duration_ms"]
+        return ", ".join(f"{name};dur={ms:.2f}" for name, ms in totals.items())
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s["start_ms"])
+        return {"trace_id": self.id, "name": self.name, "spans": spans, "profile": self.profile}
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """
+    Time a block: feeds the stage latency histogram and, inside a traced
+    request, adds a span to the request's trace. Yields the span record;
+    its "duration_ms" is filled in when the block exits.
+    """
+    trace = _current_trace.get()
+    t0 = time.perf_counter()
+    record = {"name": name, "thread": threading.current_thread().name}
+    if attributes:
+        record["attributes"] = attributes
+    try:
+        yield record
+    except BaseException:
+        record["error"] = True
+        STAGE_ERRORS.inc(stage=name)
+        raise
+    finally:
+        _finish(trace, record, t0, time.perf_counter() - t0)
+
+
+def _finish(trace, record: dict, t0: float, seconds: float):
+    record["duration_ms"] = round(seconds * 1000, 3)
+    STAGE_SECONDS.observe(seconds, stage=record["name"])
+    if trace is not None:
+        record["start_ms"] = round((t0 - trace.started) * 1000, 3)
+        trace.add(record)
+
+
+def record_span(name: str, seconds: float, **attributes):
+    """
+    Record a span measured elsewhere, e.g. time accumulated across the
+    steps of a generator, as if it had just ended.
+    """
+    record = {"name": name, "thread": threading.current_thread().name}
+    if attributes:
+        record["attributes"] = attributes
+    _finish(_current_trace.get(), record, time.perf_counter() - seconds, seconds)
+
+
+def timed(name: str):
+    """
+    Decorator form of span() for plain and async functions.
+    """
+    def decorate(fn):
+        if inspect.iscoroutinefunction(fn):
+            @wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with span(name):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def get_trace(trace_id: str) -> Optional[dict]:
+    for trace in list(_recent_traces):
+        if trace["trace_id"] == trace_id:
+            return trace
+    return None
+
+
+class SamplingProfiler:
+    """
+    Statistical profiler built on sys._current_frames(): a background
+    thread snapshots every other thread's stack at a fixed interval and
+    counts identical stacks (collapsed "outer;...;inner" format, ready
+    for flamegraph tools). It samples the whole process, so concurrent
+    requests show up too; threads parked in a wait are skipped.
+    """
+
+    _IDLE = {"wait", "select", "poll", "_wait_for_tstate_lock", "sleep", "_worker"}
+
+    def __init__(self, interval_ms: float = PROFILE_INTERVAL_MS):
+        self.interval = interval_ms / 1000
+        self.stacks = _Tally()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    @staticmethod
+    def _collapse(frame) -> str:
+        parts = []
+        while frame is not None:
+            code = frame.f_code
+            parts.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+            frame = frame.f_back
+        return ";".join(reversed(parts))
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident == own or frame.f_code.co_name in self._IDLE:
+                    continue
+                self.stacks[self._collapse(frame)] += 1
+            self.samples += 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True, name="sampling-profiler")
+        self._thread.start()
+
+    def stop(self, top: int = 100) -> dict:
+        self._stop.set()
+        self._thread.join()
+        return {
+            "interval_ms": self.interval * 1000,
+            "samples": self.samples,
+            "stacks": [{"stack": stack, "count": count} for stack, count in self.stacks.most_common(top)]
+        }
+
+
+def _wants_profile(request) -> bool:
+    return PROFILING_ENABLED and (
+        request.query_params.get("profile") in ("1", "true")
+        or request.headers.get("x-profile") in ("1", "true")
+    )
+
+
+class TelemetryMiddleware:
+    """
+    ASGI middleware: opens a trace per request, records request latency
+    by route template, and returns X-Trace-Id and Server-Timing headers.
+    Requests that ask for it are profiled (one at a time). The trace and
+    profile close once the app has finished sending the response, so
+    streamed responses are measured to their last chunk, and they close
+    however the response ends (body sent, client gone, error).
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        request = Request(scope)
+        trace = Trace(f"{request.method} {request.url.path}")
+        token = _current_trace.set(trace)
+        profiler = None
+        if _wants_profile(request) and _profile_lock.acquire(blocking=False):
+            profiler = SamplingProfiler()
+            profiler.start()
+        status = 500
+
+        async def send_traced(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = MutableHeaders(scope=message)
+                headers["X-Trace-Id"] = trace.id
+                # Server-Timing can only cover the spans finished before the headers
+                timing = trace.server_timing()
+                if timing:
+                    headers["Server-Timing"] = timing
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_traced)
+        finally:
+            _current_trace.reset(token)
+            if profiler is not None:
+                trace.profile = profiler.stop()
+                _profile_lock.release()
+            elapsed = time.perf_counter() - trace.started
+            route = scope.get("route")
+            REQUEST_SECONDS.observe(
+                elapsed,
+                method=request.method,
+                route=getattr(route, "path", "unmatched"),
+                status=status
+            )
+            record = trace.to_dict()
+            record["duration_ms"] = round(elapsed * 1000, 3)
+            record["status"] = status
+            _recent_traces.append(record)
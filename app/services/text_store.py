@@ -0,0 +1,190 @@
+import os
+import re
+import json
+import mmap
+import uuid
+import fcntl
+import threading
+from contextlib import contextmanager
+
+TEXT_STORE_DIR = os.getenv("TEXT_STORE_DIR", "chunk_text")
+# Keep the full chunk text in vector metadata as well (the old layout,
+# needed if several machines share one Pinecone index but not this dir)
+CHUNK_TEXT_IN_METADATA = os.getenv("CHUNK_TEXT_IN_METADATA", "0") in ("1", "true", "True")
+
+_store = None
+
+
+class TextStore:
+    """
+    Chunk text kept out of the vector index. Each doc has an append-only
+    UTF-8 blob that is memory-mapped for reads, and a small JSON index of
+    (offset, length) per chunk id naming the blob it points into.
+    Rewriting a chunk appends a new copy and repoints the index;
+    deleting chunks writes a compacted blob under a new name, so readers
+    in other processes never see offsets into the wrong file. Writers of
+    a doc hold an flock on its .lock file, so appends and compactions
+    from several server processes don't lose each other's chunks.
+    """
+
+    def __init__(self, root: str = TEXT_STORE_DIR):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self._lock = threading.RLock()
+        self._write_lock = threading.Lock()
+        self._index = {}  # doc key -> (index file version, blob name, {chunk id: (offset, length)})
+        self._maps = {}   # blob name -> (mmap, size)
+
+    def _key(self, doc_id) -> str:
+        return re.sub(r"[^A-Za-z0-9_.-]", "_", str(doc_id))
+
+    def _index_path(self, key: str) -> str:
+        return os.path.join(self.root, key + ".json")
+
+    def _load_index(self, key: str):
+        path = self._index_path(key)
+        try:
+            info = os.stat(path)
+            version = (info.st_ino, info.st_mtime_ns, info.st_size)
+        except OSError:
+            version = None
+        # Another worker process may have written the doc since we read it
+        cached = self._index.get(key)
+        if cached is not None and cached[0] == version:
+            return cached[1], cached[2]
+        blob, index = f"{key}.txt", {}
+        if version is not None:
+            with open(path, "r") as f:
+                saved = json.load(f)
+            blob = saved["blob"]
+            index = {cid: (offset, length) for cid, (offset, length) in zip(saved["ids"], saved["spans"])}
+        self._index[key] = (version, blob, index)
+        return blob, index
+
+    def _save_index(self, key: str, blob: str, index: dict):
+        path = self._index_path(key)
+        with open(path + ".tmp", "w") as f:
+            json.dump({"blob": blob, "ids": list(index), "spans": list(index.values())}, f)
+        os.replace(path + ".tmp", path)
+        self._index.pop(key, None)
+
+    @contextmanager
+    def _doc_lock(self, key: str):
+        # Serialises writers of a doc: the thread lock within this process,
+        # the flock across processes
+        with self._write_lock, open(os.path.join(self.root, key + ".lock"), "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            yield
+
+    def _close_map(self, blob: str):
+        entry = self._maps.pop(blob, None)
+        if entry is not None:
+            entry[0].close()
+
+    def put(self, doc_id, items: list):
+        """
+        Store (chunk id, text) pairs for a document.
+        """
+        if not items:
+            return
+        key = self._key(doc_id)
+        with self._doc_lock(key), self._lock:
+            blob, index = self._load_index(key)
+            index = dict(index)
+            with open(os.path.join(self.root, blob), "ab") as f:
+                offset = f.tell()
+                for cid, text in items:
+                    data = text.encode("utf-8")
+                    f.write(data)
+                    index[cid] = (offset, len(data))
+                    offset += len(data)
+            self._save_index(key, blob, index)
+
+    def _view(self, blob: str, needed: int):
+        # Blobs only grow, so an existing map stays valid for the offsets
+        # it covers; remap when a chunk lies past its end
+        entry = self._maps.get(blob)
+        if entry is None or entry[1] < needed:
+            self._close_map(blob)
+            path = os.path.join(self.root, blob)
+            try:
+                size = os.path.getsize(path)
+            except OSError:
+                return None
+            if size == 0:
+                return None
+            with open(path, "rb") as f:
+                entry = (mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ), size)
+            self._maps[blob] = entry
+        return entry[0]
+
+    def get(self, doc_id, ids) -> dict:
+        """
+        Text for each requested id that is stored; unknown ids are omitted.
+        """
+        key = self._key(doc_id)
+        with self._lock:
+            blob, index = self._load_index(key)
+            spans = {cid: index[cid] for cid in ids if cid in index}
+            if not spans:
+                return {}
+            view = self._view(blob, max(offset + length for offset, length in spans.values()))
+            if view is None:
+                return {}
+            return {cid: view[offset:offset + length].decode("utf-8") for cid, (offset, length) in spans.items()}
+
+    def delete(self, doc_id, ids: list = None):
+        """
+        Drop some chunks (compacting the blob) or the whole document.
+        """
+        key = self._key(doc_id)
+        with self._doc_lock(key), self._lock:
+            blob, index = self._load_index(key)
+            if ids is None:
+                keep = []
+            else:
+                drop = set(ids)
+                keep = [cid for cid in index if cid not in drop]
+                if len(keep) == len(index):
+                    return
+
+            if keep:
+                texts = self.get(doc_id, keep)
+                new_blob = f"{key}.{uuid.uuid4().hex[:8]}.txt"
+                compacted, offset = {}, 0
+                with open(os.path.join(self.root, new_blob), "wb") as f:
+                    for cid in keep:
+                        data = texts[cid].encode("utf-8")
+                        f.write(data)
+                        compacted[cid] = (offset, len(data))
+                        offset += len(data)
+                self._save_index(key, new_blob, compacted)
+            elif os.path.exists(self._index_path(key)):
+                os.remove(self._index_path(key))
+                self._index.pop(key, None)
+
+            self._close_map(blob)
+            try:
+                os.remove(os.path.join(self.root, blob))
+            except OSError:
+                pass
+
+    def ids(self, doc_id) -> list:
+        key = self._key(doc_id)
+        with self._lock:
+            _, index = self._load_index(key)
+            return list(index)
+
+    def stats(self, doc_id) -> dict:
+        key = self._key(doc_id)
+        with self._lock:
+            blob, index = self._load_index(key)
+        path = os.path.join(self.root, blob)
+        return {"chunks": len(index), "bytes": os.path.getsize(path) if os.path.exists(path) else 0}
+
+
+def get_text_store() -> TextStore:
+    global _store
+    if _store is None:
+        _store = TextStore(TEXT_STORE_DIR)
+    return _store
@@ -0,0 +1,198 @@
+import os
+import time
+import queue
+import random
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, List
+
+from app.services.telemetry import Counter
+
+# Vectors per upsert request (Pinecone accepts up to ~100-200 per call)
+UPSERT_BATCH_SIZE = int(os.getenv("UPSERT_BATCH_SIZE", "100"))
+# Upsert requests in flight at once, shared by every caller in the process
+UPSERT_MAX_IN_FLIGHT = int(os.getenv("UPSERT_MAX_IN_FLIGHT", "4"))
+UPSERT_MAX_RETRIES = int(os.getenv("UPSERT_MAX_RETRIES", "5"))
+UPSERT_BACKOFF_BASE = float(os.getenv("UPSERT_BACKOFF_BASE", "0.25"))
+UPSERT_BACKOFF_MAX = float(os.getenv("UPSERT_BACKOFF_MAX", "10"))
+# Small writes (agent outputs, final reports) are held this long to be
+# sent together with other requests' writes
+UPSERT_COALESCE_MS = float(os.getenv("UPSERT_COALESCE_MS", "50"))
+
+_writer = None
+_writer_lock = threading.Lock()
+
+UPSERT_BATCHES = Counter(
+    "clausesense_upsert_batches_total", "Upsert requests by outcome", ["result"]
+)
+UPSERT_VECTORS = Counter(
+    "clausesense_upserted_vectors_total", "Vectors written by the bulk writer"
+)
+
+
+class UpsertError(RuntimeError):
+    """
+    Raised when a batch still fails after every retry. Upserts are keyed
+    by deterministic ids, so the whole write can safely be retried later.
+    """
+
+    def __init__(self, failed_ids: list, cause: Exception):
+        super().__init__(f"{len(failed_ids)} vectors failed to upsert: {cause}")
+        self.failed_ids = failed_ids
+        self.cause = cause
+
+
+def _retryable(exc: Exception) -> bool:
+    # Client errors other than rate limiting won't succeed on a retry
+    status = getattr(exc, "status", None) or getattr(exc, "status_code", None)
+    if isinstance(status, int) and 400 <= status < 500 and status != 429:
+        return False
+    return not isinstance(exc, (ValueError, TypeError))
+
+
+class BulkWriter:
+    """
+    Pipelined upserts. submit() splits vectors into batches and hands
+    them to a small thread pool, blocking only while UPSERT_MAX_IN_FLIGHT
+    requests are already outstanding, so callers keep encoding the next
+    batch while earlier ones are on the wire. Failed batches are retried
+    with exponential backoff and jitter; because vector ids are
+    deterministic, a retried batch simply overwrites whatever landed.
+
+    enqueue() is for single small writes: a background thread gathers
+    them from every request for up to UPSERT_COALESCE_MS and sends them
+    as one batch.
+    """
+
+    def __init__(self, store_loader: Callable, batch_size: int = UPSERT_BATCH_SIZE,
+                 max_in_flight: int = UPSERT_MAX_IN_FLIGHT, max_retries: int = UPSERT_MAX_RETRIES,
+                 coalesce_ms: float = UPSERT_COALESCE_MS):
+        self._store_loader = store_loader
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.coalesce = coalesce_ms / 1000.0
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._executor = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="upsert")
+        self._small = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self._stats = {"batches": 0, "vectors": 0, "retries": 0, "failed_batches": 0,
+                       "coalesced_batches": 0, "coalesced_vectors": 0, "in_flight": 0}
+        self._coalescer = threading.Thread(target=self._coalesce_loop, name="upsert-coalescer", daemon=True)
+        self._coalescer.start()
+
+    def _count(self, **deltas):
+        with self._stats_lock:
+            for key, delta in deltas.items():
+                self._stats[key] += delta
+
+    def _send(self, batch: list) -> int:
+        attempt = 0
+        try:
+            while True:
+                try:
+                    store = self._store_loader()
+                    if store is None:
+                        raise RuntimeError("Vector store is not available")
+                    store.upsert(batch)
+                    self._count(batches=1, vectors=len(batch))
+                    UPSERT_BATCHES.inc(result="ok")
+                    UPSERT_VECTORS.inc(len(batch))
+                    return len(batch)
+                except Exception as e:
+                    attempt += 1
+                    if attempt > self.max_retries or not _retryable(e):
+                        self._count(failed_batches=1)
+                        UPSERT_BATCHES.inc(result="failed")
+                        raise UpsertError([v["id"] for v in batch], e) from e
+                    self._count(retries=1)
+                    UPSERT_BATCHES.inc(result="retried")
+                    delay = min(UPSERT_BACKOFF_MAX, UPSERT_BACKOFF_BASE * 2 ** (attempt - 1))
+                    time.sleep(delay * (0.5 + random.random() / 2))
+        finally:
+            self._count(in_flight=-1)
+            self._slots.release()
+
+    def submit(self, vectors: list) -> List[Future]:
+        """
+        Queue vectors for upsert; one Future per batch, resolving to the
+        number of vectors written or raising UpsertError.
+        """
+        futures = []
+        for i in range(0, len(vectors), self.batch_size):
+            self._slots.acquire()
+            self._count(in_flight=1)
+            futures.append(self._executor.submit(self._send, vectors[i:i + self.batch_size]))
+        return futures
+
+    def write(self, vectors: list) -> int:
+        """
+        Upsert and wait. Every batch is attempted even if one fails; the
+        first failure is re-raised with the ids of all failed vectors.
+        """
+        return wait_all(self.submit(vectors))
+
+    def enqueue(self, vector: dict) -> Future:
+        future = Future()
+        self._small.put((vector, future))
+        return future
+
+    def _coalesce_loop(self):
+        while True:
+            items = [self._small.get()]
+            deadline = time.monotonic() + self.coalesce
+            while len(items) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    items.append(self._small.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            # Last write wins when the same id was queued twice
+            latest = {vector["id"]: vector for vector, _ in items}
+            self._count(coalesced_batches=1, coalesced_vectors=len(items))
+            futures = self.submit(list(latest.values()))
+
+            def settle(done, items=items):
+                error = done.exception()
+                for _, future in items:
+                    if error is not None:
+                        future.set_exception(error)
+                    else:
+                        future.set_result(1)
+            futures[0].add_done_callback(settle)
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["queued_small_writes"] = self._small.qsize()
+        stats["avg_coalesced_batch"] = (
+            round(stats["coalesced_vectors"] / stats["coalesced_batches"], 2) if stats["coalesced_batches"] else 0.0
+        )
+        return stats
+
+
+def wait_all(futures: List[Future]) -> int:
+    written = 0
+    failed_ids = []
+    first_error = None
+    for future in futures:
+        try:
+            written += future.result()
+        except UpsertError as e:
+            failed_ids.extend(e.failed_ids)
+            first_error = first_error or e.cause
+    if failed_ids:
+        raise UpsertError(failed_ids, first_error)
+    return written
+
+
+def get_upsert_writer() -> BulkWriter:
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                from app.services.vector_store import get_vector_store
+                _writer = BulkWriter(get_vector_store)
+    return _writer
@@ -0,0 +1,478 @@
+import os
+import io
+import re
+import json
+import fcntl
+import threading
+import contextvars
+import numpy as np
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+from app.services.telemetry import timed
+
+load_dotenv()
+
+# "pinecone" (default) or "local"
+VECTOR_STORE = os.getenv("VECTOR_STORE", "pinecone").lower()
+LOCAL_INDEX_DIR = os.getenv("LOCAL_INDEX_DIR", "vector_index")
+# On-disk row format of the local index: float32, float16 or int8
+LOCAL_VECTOR_DTYPE = os.getenv("LOCAL_VECTOR_DTYPE", "float16").lower()
+VECTOR_DTYPES = ("float32", "float16", "int8")
+# Requests of one query_many call in flight at once against Pinecone
+PINECONE_QUERY_CONCURRENCY = int(os.getenv("PINECONE_QUERY_CONCURRENCY", "8"))
+
+_store = None
+
+
+def _matches_filter(metadata: dict, flt: dict) -> bool:
+    """
+    Evaluate the subset of Pinecone's metadata filter language we use:
+    plain equality, $eq, $ne, $in and $nin.
+    """
+    if not flt:
+        return True
+    for key, cond in flt.items():
+        value = metadata.get(key)
+        if isinstance(cond, dict):
+            for op, operand in cond.items():
+                if op == "$eq" and value != operand:
+                    return False
+                if op == "$ne" and value == operand:
+                    return False
+                if op == "$in" and value not in operand:
+                    return False
+                if op == "$nin" and value in operand:
+                    return False
+        elif value != cond:
+            return False
+    return True
+
+
+class VectorStore:
+    """
+    Minimal interface shared by every vector backend. Vectors and query
+    results use Pinecone's dict shapes so callers don't care which
+    backend is active.
+    """
+
+    def upsert(self, vectors: list):
+        raise NotImplementedError
+
+    def query(self, vector, top_k: int = 5, filter: dict = None, include_metadata: bool = True) -> dict:
+        raise NotImplementedError
+
+    def query_many(self, vectors, top_k: int = 5, filter: dict = None, include_metadata: bool = True) -> list:
+        """
+        Run several queries with the same filter; one result per vector.
+        """
+        return [self.query(v, top_k=top_k, filter=filter, include_metadata=include_metadata) for v in vectors]
+
+    def fetch(self, ids: list, doc_id: str = None) -> dict:
+        """
+        Metadata for the given vector ids, as {id: metadata}.
+        """
+        raise NotImplementedError
+
+    def delete(self, ids: list = None, filter: dict = None):
+        raise NotImplementedError
+
+
+class PineconeStore(VectorStore):
+    """
+    Thin adapter over a Pinecone index handle.
+    """
+
+    def __init__(self, index):
+        self.index = index
+        self._query_pool = ThreadPoolExecutor(max_workers=PINECONE_QUERY_CONCURRENCY, thread_name_prefix="query")
+
+    @timed("upsert")
+    def upsert(self, vectors: list):
+        self.index.upsert([
+            {**vec, "values": np.asarray(vec["values"], dtype=np.float32).tolist()} for vec in vectors
+        ])
+
+    @timed("query")
+    def query(self, vector, top_k: int = 5, filter: dict = None, include_metadata: bool = True) -> dict:
+        return self.index.query(
+            # Plain floats: the client's request model rejects numpy scalars
+            vector=np.asarray(vector, dtype=np.float32).ravel().tolist(),
+            top_k=top_k,
+            include_metadata=include_metadata,
+            filter=filter
+        )
+
+    def query_many(self, vectors, top_k: int = 5, filter: dict = None, include_metadata: bool = True) -> list:
+        """
+        Pinecone takes one vector per query, so the requests are issued
+        concurrently: the caller waits for the slowest one, not their sum.
+        """
+        vectors = list(vectors)
+        if len(vectors) <= 1:
+            return super().query_many(vectors, top_k=top_k, filter=filter, include_metadata=include_metadata)
+        # Each request runs in the caller's context so its span joins the trace
+        futures = [
+            self._query_pool.submit(contextvars.copy_context().run, self.query, vector, top_k, filter, include_metadata)
+            for vector in vectors
+        ]
+        return [future.result() for future in futures]
+
+    def fetch(self, ids: list, doc_id: str = None) -> dict:
+        if not ids:
+            return {}
+        response = self.index.fetch(ids=list(ids))
+        vectors = response["vectors"] if isinstance(response, dict) else response.vectors
+        return {
+            vid: (vec["metadata"] if isinstance(vec, dict) else vec.metadata) or {}
+            for vid, vec in vectors.items()
+        }
+
+    def delete(self, ids: list = None, filter: dict = None):
+        if ids:
+            self.index.delete(ids=ids)
+        elif filter:
+            self.index.delete(filter=filter)
+
+
+class LocalVectorStore(VectorStore):
+    """
+    In-process vector index. Each doc_id gets its own contiguous matrix of
+    L2-normalised rows saved as .npy and memory-mapped on read, plus a
+    JSON sidecar holding ids and metadata. Rows are stored as float16 or
+    int8 (with a per-row scale) unless LOCAL_VECTOR_DTYPE=float32.
+    Queries are a matrix product over row blocks followed by an
+    argpartition top-k. Writers of a doc hold an flock on its .lock file,
+    so several server processes can share one index directory.
+    """
+
+    # Rows converted to float32 at a time while scoring compact matrices
+    SCORE_BLOCK = 8192
+
+    def __init__(self, root: str = LOCAL_INDEX_DIR, dtype: str = LOCAL_VECTOR_DTYPE):
+        if dtype not in VECTOR_DTYPES:
+            raise ValueError(f"Unknown LOCAL_VECTOR_DTYPE '{dtype}', expected one of {VECTOR_DTYPES}")
+        self.root = root
+        self.dtype = dtype
+        os.makedirs(root, exist_ok=True)
+        self._lock = threading.RLock()
+        self._write_lock = threading.Lock()
+        self._cache = {}  # doc key -> (sidecar version, (matrix, scales, ids, metadata))
+
+    def _key(self, doc_id) -> str:
+        return re.sub(r"[^A-Za-z0-9_.-]", "_", str(doc_id or "_default"))
+
+    def _paths(self, key: str):
+        base = os.path.join(self.root, key)
+        return base + ".npy", base + ".json", base + ".scale.npy"
+
+    def _load(self, key: str):
+        with self._lock:
+            matrix_path, meta_path, scale_path = self._paths(key)
+            try:
+                info = os.stat(meta_path)
+                version = (info.st_ino, info.st_mtime_ns, info.st_size)
+            except OSError:
+                return None
+            # Another worker process may have rewritten the doc since we read it
+            cached = self._cache.get(key)
+            if cached is not None and cached[0] == version:
+                return cached[1]
+            if not os.path.exists(matrix_path):
+                return None
+            matrix = np.load(matrix_path, mmap_mode="r")
+            scales = np.load(scale_path) if matrix.dtype == np.int8 else None
+            with open(meta_path, "r") as f:
+                sidecar = json.load(f)
+            # Rows are written before the sidecar, so a writer caught
+            # mid-append can leave more rows than ids; the sidecar decides
+            count = min(len(matrix), len(sidecar["ids"]), len(scales) if scales is not None else len(matrix))
+            entry = (
+                matrix[:count], scales[:count] if scales is not None else None,
+                sidecar["ids"][:count], sidecar["metadata"][:count]
+            )
+            self._cache[key] = (version, entry)
+            return entry
+
+    def _encode(self, matrix: np.ndarray):
+        if self.dtype == "int8":
+            scales = np.abs(matrix).max(axis=1) / 127.0
+            scales[scales == 0] = 1.0
+            quantized = np.round(matrix / scales[:, None]).astype(np.int8)
+            return quantized, scales.astype(np.float32)
+        return matrix.astype(self.dtype), None
+
+    @staticmethod
+    def _dense(matrix, scales, rows=None) -> np.ndarray:
+        block = matrix if rows is None else matrix[rows]
+        block = np.asarray(block, dtype=np.float32)
+        if scales is not None:
+            block = block * (scales if rows is None else scales[rows])[:, None]
+        return block
+
+    @contextmanager
+    def _doc_lock(self, key: str):
+        # Serialises writers of a doc: the thread lock within this process,
+        # the flock across processes. Readers take neither.
+        with self._write_lock, open(os.path.join(self.root, key + ".lock"), "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            yield
+
+    def _save_sidecar(self, key: str, ids: list, metadata: list):
+        meta_path = self._paths(key)[1]
+        with open(meta_path + ".tmp", "w") as f:
+            json.dump({"ids": ids, "metadata": metadata}, f)
+        os.replace(meta_path + ".tmp", meta_path)
+        self._cache.pop(key, None)
+
+    def _save(self, key: str, matrix: np.ndarray, ids: list, metadata: list):
+        matrix_path, meta_path, scale_path = self._paths(key)
+        stored, scales = self._encode(matrix)
+        # Write to temp files first so readers never see a half-written
+        # doc; the sidecar goes last since readers key their cache on it
+        with open(matrix_path + ".tmp", "wb") as f:
+            np.save(f, stored)
+        if scales is not None:
+            with open(scale_path + ".tmp", "wb") as f:
+                np.save(f, scales)
+        os.replace(matrix_path + ".tmp", matrix_path)
+        if scales is not None:
+            os.replace(scale_path + ".tmp", scale_path)
+        self._save_sidecar(key, ids, metadata)
+
+    def _write_rows(self, key: str, existing, count: int, rows: dict, ids: list, metadata: list) -> bool:
+        """
+        Write changed and new rows into a doc's existing files instead of
+        rewriting them: each row goes to its offset (new ones after the
+        current end), then the .npy header is patched with the new row
+        count (np.save leaves room in the header for the first dimension
+        to grow) and the sidecar replaced. Returns False, having written
+        nothing, if the files can't be extended in place (e.g. the
+        LOCAL_VECTOR_DTYPE setting has changed since they were written).
+        """
+        positions = sorted(rows)
+        stored, scales = self._encode(self._normalize(np.vstack([rows[pos] for pos in positions])))
+        if (scales is None) != (existing[1] is None):
+            return False
+        matrix_path, _, scale_path = self._paths(key)
+        plans = []
+        for path, block in [(matrix_path, stored)] + ([(scale_path, scales)] if scales is not None else []):
+            with open(path, "rb") as f:
+                version = np.lib.format.read_magic(f)
+                if version == (1, 0):
+                    shape, fortran, dtype = np.lib.format.read_array_header_1_0(f)
+                    write_header = np.lib.format.write_array_header_1_0
+                elif version == (2, 0):
+                    shape, fortran, dtype = np.lib.format.read_array_header_2_0(f)
+                    write_header = np.lib.format.write_array_header_2_0
+                else:
+                    return False
+                data_offset = f.tell()
+            if fortran or dtype != block.dtype or shape[1:] != block.shape[1:] or shape[0] < count:
+                return False
+            header = io.BytesIO()
+            write_header(header, {
+                "descr": np.lib.format.dtype_to_descr(dtype),
+                "fortran_order": False,
+                "shape": (len(ids),) + shape[1:],
+            })
+            if header.tell() != data_offset:
+                return False
+            plans.append((path, block, data_offset, header.getvalue()))
+
+        split = int(np.searchsorted(positions, count))
+        for path, block, data_offset, header in plans:
+            row_bytes = block[0].nbytes
+            with open(path, "r+b") as f:
+                for i in range(split):
+                    f.seek(data_offset + positions[i] * row_bytes)
+                    f.write(block[i].tobytes())
+                f.seek(data_offset + count * row_bytes)
+                f.write(block[split:].tobytes())
+                f.seek(0)
+                f.write(header)
+        self._save_sidecar(key, ids, metadata)
+        return True
+
+    def _doc_keys(self):
+        return [name[:-4] for name in os.listdir(self.root) if name.endswith(".npy") and not name.endswith(".scale.npy")]
+
+    @staticmethod
+    def _normalize(matrix: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+    @timed("upsert")
+    def upsert(self, vectors: list):
+        grouped = {}
+        for vec in vectors:
+            key = self._key(vec.get("metadata", {}).get("doc_id"))
+            grouped.setdefault(key, []).append(vec)
+
+        for key, items in grouped.items():
+            with self._doc_lock(key):
+                existing = self._load(key)
+                if existing is not None:
+                    ids, metadata = list(existing[2]), list(existing[3])
+                else:
+                    ids, metadata = [], []
+                count = len(ids)
+
+                positions = {vid: i for i, vid in enumerate(ids)}
+                rows = {}
+                for vec in items:
+                    pos = positions.setdefault(vec["id"], len(ids))
+                    if pos == len(ids):
+                        ids.append(vec["id"])
+                        metadata.append(vec.get("metadata", {}))
+                    else:
+                        metadata[pos] = vec.get("metadata", {})
+                    rows[pos] = np.asarray(vec["values"], dtype=np.float32)
+
+                if existing is not None and self._write_rows(key, existing, count, rows, ids, metadata):
+                    continue
+                # New doc, or files that can't be extended: rewrite them
+                matrix = np.empty((len(ids), len(next(iter(rows.values())))), dtype=np.float32)
+                if existing is not None:
+                    matrix[:count] = self._dense(existing[0], existing[1])
+                for pos, row in rows.items():
+                    matrix[pos] = row
+                self._save(key, self._normalize(matrix), ids, metadata)
+
+    def query(self, vector, top_k: int = 5, filter: dict = None, include_metadata: bool = True) -> dict:
+        return self.query_many([vector], top_k=top_k, filter=filter, include_metadata=include_metadata)[0]
+
+    def _score(self, matrix, scales, rows, queries: np.ndarray) -> np.ndarray:
+        # float32 matrices are scored in place on the memory map; compact
+        # ones are widened a block at a time to keep the BLAS path
+        if matrix.dtype == np.float32 and scales is None:
+            return (matrix if rows is None else matrix[rows]) @ queries.T
+        count = matrix.shape[0] if rows is None else len(rows)
+        scores = np.empty((count, len(queries)), dtype=np.float32)
+        for start in range(0, count, self.SCORE_BLOCK):
+            block_rows = slice(start, start + self.SCORE_BLOCK) if rows is None else rows[start:start + self.SCORE_BLOCK]
+            scores[start:start + self.SCORE_BLOCK] = self._dense(matrix, scales, block_rows) @ queries.T
+        return scores
+
+    @timed("query")
+    def query_many(self, vectors, top_k: int = 5, filter: dict = None, include_metadata: bool = True) -> list:
+        """
+        Score every query against each candidate doc with a single
+        matrix-matrix product, then take a per-query top-k.
+        """
+        flt = dict(filter or {})
+        doc_cond = flt.get("doc_id")
+        if doc_cond is not None and not isinstance(doc_cond, dict):
+            keys = [self._key(doc_cond)]
+        else:
+            keys = self._doc_keys()
+
+        queries = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        valid = norms[:, 0] > 0
+        norms[~valid] = 1.0
+        queries = queries / norms
+
+        candidates = [[] for _ in range(len(queries))]
+        for key in keys:
+            entry = self._load(key)
+            if entry is None:
+                continue
+            matrix, scales, ids, metadata = entry
+            mask = np.fromiter(
+                (_matches_filter(m, flt) for m in metadata), dtype=bool, count=len(metadata)
+            )
+            if not mask.any():
+                continue
+            rows = np.flatnonzero(mask)
+            scores = self._score(matrix, scales, None if mask.all() else rows, queries)  # (rows, queries)
+            k = min(top_k, len(rows))
+            top = np.argpartition(-scores, k - 1, axis=0)[:k]
+            for q in range(len(queries)):
+                for i in top[:, q]:
+                    candidates[q].append((float(scores[i, q]), ids[rows[i]], metadata[rows[i]]))
+
+        results = []
+        for q, found in enumerate(candidates):
+            if not valid[q]:
+                results.append({"matches": []})
+                continue
+            found.sort(key=lambda c: c[0], reverse=True)
+            matches = []
+            for score, vid, meta in found[:top_k]:
+                match = {"id": vid, "score": score}
+                if include_metadata:
+                    match["metadata"] = meta
+                matches.append(match)
+            results.append({"matches": matches})
+        return results
+
+    def fetch(self, ids: list, doc_id: str = None) -> dict:
+        keys = [self._key(doc_id)] if doc_id is not None else self._doc_keys()
+        wanted = set(ids)
+        found = {}
+        for key in keys:
+            entry = self._load(key)
+            if entry is None:
+                continue
+            for vid, meta in zip(entry[2], entry[3]):
+                if vid in wanted:
+                    found[vid] = meta
+        return found
+
+    def delete(self, ids: list = None, filter: dict = None):
+        flt = dict(filter or {})
+        doc_cond = flt.get("doc_id")
+        if doc_cond is not None and not isinstance(doc_cond, dict):
+            keys = [self._key(doc_cond)]
+        else:
+            keys = self._doc_keys()
+        drop_ids = set(ids or [])
+
+        for key in keys:
+            with self._doc_lock(key):
+                entry = self._load(key)
+                if entry is None:
+                    continue
+                matrix, scales, vec_ids, metadata = entry
+                keep = [
+                    i for i, (vid, meta) in enumerate(zip(vec_ids, metadata))
+                    if not ((vid in drop_ids) or (not drop_ids and _matches_filter(meta, flt)))
+                ]
+                if len(keep) == len(vec_ids):
+                    continue
+                if not keep:
+                    for path in self._paths(key):
+                        if os.path.exists(path):
+                            os.remove(path)
+                    self._cache.pop(key, None)
+                    continue
+                self._save(
+                    key,
+                    self._dense(matrix, scales, keep),
+                    [vec_ids[i] for i in keep],
+                    [metadata[i] for i in keep]
+                )
+
+    def storage_bytes(self) -> int:
+        return sum(os.path.getsize(os.path.join(self.root, name)) for name in os.listdir(self.root))
+
+
+def get_vector_store():
+    """
+    Return the configured vector store (VECTOR_STORE=pinecone|local),
+    or None if the Pinecone backend is selected but unavailable.
+    """
+    global _store
+    if _store is None:
+        if VECTOR_STORE == "local":
+            print(f"Using local vector index at {LOCAL_INDEX_DIR}")
+            _store = LocalVectorStore(LOCAL_INDEX_DIR)
+        else:
+            from app.services.embeddings import get_pinecone_index
+            index = get_pinecone_index()
+            if index is None:
+                return None
+            _store = PineconeStore(index)
+    return _store
@@ -0,0 +1,164 @@
+import gc
+import os
+import time
+import threading
+from typing import Callable, Dict, List, Tuple
+
+from app.services.telemetry import Gauge
+
+# Answer 503 on model-backed endpoints while warm-up is still running,
+# instead of letting requests block on the lazy loaders
+READY_GATE = os.getenv("READY_GATE", "1") not in ("0", "false", "False")
+
+_process_started = time.time()
+_ready_at = None
+_components: Dict[str, dict] = {}
+_lock = threading.Lock()
+
+
+def _load_embedding_model():
+    from app.services.embeddings import get_model
+    return get_model()
+
+
+def _load_classifier():
+    from app.services.classifier import get_classifier
+    return get_classifier()
+
+
+def _load_query_table():
+    from app.services.retriever import get_query_table
+    return get_query_table()
+
+
+def _connect_vector_store():
+    from app.services.vector_store import get_vector_store
+    return get_vector_store()
+
+
+# (name, loader, required). Loaders return None on failure. Optional
+# components degrade gracefully (e.g. classification falls back to
+# "Unknown") so they don't hold back readiness.
+COMPONENTS: List[Tuple[str, Callable, bool]] = [
+    ("embedding_model", _load_embedding_model, True),
+    ("classifier", _load_classifier, False),
+    ("vector_store", _connect_vector_store, True),
+    ("query_table", _load_query_table, True),
+]
+# Safe to load in a parent process before forking: weights only, no
+# threads, no inference, no sockets
+PRELOAD_COMPONENTS = ("embedding_model", "classifier")
+
+for _name, _, _ in COMPONENTS:
+    _components[_name] = {"status": "pending"}
+
+
+def mark_process_start():
+    """
+    Restart the cold-start clock, e.g. in a freshly forked worker.
+    """
+    global _process_started, _ready_at
+    _process_started = time.time()
+    _ready_at = None
+
+
+def _set(name: str, **fields):
+    with _lock:
+        _components[name] = fields
+
+
+def warm_up(names=None):
+    """
+    Load each component in order, recording its status and load time.
+    Components that are already loaded (e.g. inherited from a preloading
+    parent) finish instantly.
+    """
+    global _ready_at
+    for name, loader, _ in COMPONENTS:
+        if names is not None and name not in names:
+            continue
+        _set(name, status="loading")
+        started = time.perf_counter()
+        try:
+            loaded = loader()
+            error = None if loaded is not None else "unavailable"
+        except Exception as e:
+            error = str(e)
+        seconds = round(time.perf_counter() - started, 3)
+        if error:
+            print(f"Warm-up: {name} failed after {seconds}s: {error}")
+            _set(name, status="failed", seconds=seconds, error=error)
+        else:
+            _set(name, status="ready", seconds=seconds)
+
+    if names is None and _ready_at is None:
+        _ready_at = time.time()
+        print(f"Warm-up finished {round(_ready_at - _process_started, 2)}s after process start.")
+
+
+def preload():
+    """
+    Load model weights in a parent process before it forks its workers,
+    then freeze the GC so the inherited objects are never written to by
+    a collection and their pages stay shared copy-on-write.
+    """
+    warm_up(PRELOAD_COMPONENTS)
+    gc.collect()
+    gc.freeze()
+    print(f"Preloaded {', '.join(PRELOAD_COMPONENTS)} in parent {os.getpid()}; "
+          f"{gc.get_freeze_count()} objects frozen.")
+
+
+def is_warming() -> bool:
+    with _lock:
+        return any(c["status"] in ("pending", "loading") for c in _components.values())
+
+
+def is_ready() -> bool:
+    with _lock:
+        required = [name for name, _, required in COMPONENTS if required]
+        return all(_components[name]["status"] == "ready" for name in required)
+
+
+def memory_usage() -> dict:
+    """
+    This process's memory in MB. PSS splits shared pages between the
+    processes mapping them, so summing it over workers gives the real
+    footprint; RSS counts shared weights once per worker.
+    """
+    fields = {"Rss": "rss_mb", "Pss": "pss_mb", "Shared_Clean": "shared_mb",
+              "Shared_Dirty": "shared_mb", "Private_Clean": "private_mb", "Private_Dirty": "private_mb"}
+    usage = {}
+    try:
+        with open("/proc/self/smaps_rollup") as f:
+            for line in f:
+                key, _, rest = line.partition(":")
+                if key in fields:
+                    usage[fields[key]] = usage.get(fields[key], 0.0) + int(rest.split()[0]) / 1024
+    except OSError:
+        import resource
+        usage["max_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return {key: round(value, 1) for key, value in usage.items()}
+
+
+def readiness() -> dict:
+    with _lock:
+        components = {name: dict(status) for name, status in _components.items()}
+    return {
+        "ready": is_ready(),
+        "pid": os.getpid(),
+        "cold_start_seconds": round(_ready_at - _process_started, 3) if _ready_at else None,
+        "uptime_seconds": round(time.time() - _process_started, 3),
+        "components": components,
+        "memory": memory_usage()
+    }
+
+
+Gauge("clausesense_cold_start_seconds", "Process start to end of warm-up",
+      callback=lambda: {(): _ready_at - _process_started} if _ready_at else {})
+Gauge("clausesense_process_memory_mb", "Process memory from smaps_rollup",
+      ["kind"], callback=lambda: {(kind,): value for kind, value in memory_usage().items()})
+Gauge("clausesense_component_ready", "1 once a warm-up component has loaded",
+      ["component"], callback=lambda: {
+          (name,): 1.0 if status["status"] == "ready" else 0.0 for name, status in dict(_components).items()
+      })
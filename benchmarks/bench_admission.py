@@ -0,0 +1,94 @@
+"""
+Interactive latency while a bulk client floods the server: the shared
+default executor (what every request used before) against the
+lane-prioritised executor, with and without load shedding.
+
+    python -m benchmarks.bench_admission --bulk-inflight 400 --interactive 50 --task-ms 5
+
+A bulk client keeps --bulk-inflight tasks outstanding (submitting a new
+one as each finishes, or after a short back-off when rejected) for as
+long as interactive requests keep arriving (one every --gap-ms). Each task holds a thread for --task-ms (a sleep,
+standing in for a vector store call). Shedding rejects bulk work
+beyond SHED_QUEUE_DEPTH * BULK_SHED_FRACTION queued tasks.
+"""
+import argparse
+import concurrent.futures
+import json
+import threading
+import time
+
+import numpy as np
+
+from app.services.admission import LaneExecutor, SHED_QUEUE_DEPTH, BULK_SHED_FRACTION
+
+
+def work(seconds: float):
+    time.sleep(seconds)
+
+
+def run(submit, backlog, args, shed: bool) -> dict:
+    task = args.task_ms / 1000
+    stop = threading.Event()
+    bulk = []
+    counts = {"submitted": 0, "rejected": 0}
+
+    slots = threading.Semaphore(args.bulk_inflight)
+
+    def flood():
+        while not stop.is_set():
+            if not slots.acquire(timeout=0.1):
+                continue
+            if shed and backlog() >= SHED_QUEUE_DEPTH * BULK_SHED_FRACTION:
+                counts["rejected"] += 1
+                slots.release()
+                time.sleep(0.001)
+                continue
+            counts["submitted"] += 1
+            future = submit("bulk", work, task)
+            future.add_done_callback(lambda _: slots.release())
+            bulk.append(future)
+
+    flooder = threading.Thread(target=flood, daemon=True)
+    flooder.start()
+    time.sleep(0.5)
+    latencies = []
+    for _ in range(args.interactive):
+        t0 = time.perf_counter()
+        submit("interactive", work, task).result()
+        latencies.append(time.perf_counter() - t0)
+        time.sleep(args.gap_ms / 1000)
+    stop.set()
+    flooder.join()
+    backlog_left = backlog()
+    for future in bulk:
+        future.cancel()
+    concurrent.futures.wait(bulk)
+    return {
+        "interactive_p50_ms": round(float(np.percentile(latencies, 50)) * 1000, 1),
+        "interactive_p95_ms": round(float(np.percentile(latencies, 95)) * 1000, 1),
+        "bulk_submitted": counts["submitted"],
+        "bulk_rejected": counts["rejected"],
+        "bulk_backlog_at_end": backlog_left,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--bulk-inflight", type=int, default=400)
+    parser.add_argument("--interactive", type=int, default=50)
+    parser.add_argument("--task-ms", type=float, default=5)
+    parser.add_argument("--gap-ms", type=float, default=10)
+    parser.add_argument("--threads", type=int, default=8)
+    args = parser.parse_args()
+
+    shared = concurrent.futures.ThreadPoolExecutor(args.threads)
+    rows = {"shared_executor": run(lambda lane, fn, *a: shared.submit(fn, *a),
+                                   lambda: shared._work_queue.qsize(), args, shed=False)}
+    lanes = LaneExecutor("bench", args.threads)
+    rows["lane_executor"] = run(lanes.submit, lanes.backlog, args, shed=False)
+    rows["lane_executor_with_shedding"] = run(lanes.submit, lanes.backlog, args, shed=True)
+    print(json.dumps(rows, indent=2))
+
+
+if __name__ == "__main__":
+    main()
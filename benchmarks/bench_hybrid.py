@@ -0,0 +1,114 @@
+"""
+Retrieval hit rate of dense-only, BM25-only and hybrid (reciprocal-rank
+fused) ranking on a synthetic contract with planted clauses, plus the
+cost of building, storing and querying the BM25 index.
+
+    python -m benchmarks.bench_hybrid --pages 50 --top-k 1 3 5
+    python -m benchmarks.bench_hybrid --model   # use all-MiniLM-L6-v2
+
+A query hits if one of its top-k chunks contains the planted sentence.
+Hybrid fuses the top --candidates of each list and keeps the top k.
+Each query names the clause's number ("termination notice period 417"),
+which the hashing stand-in embeds like any other word but a real
+sentence embedding mostly ignores; that is the exact-term case BM25 is
+there for.
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+import numpy as np
+
+from app.services.chunker import chunk_pages
+from app.services.lexical_index import DocIndex, LexicalIndex
+from app.services.retriever import fuse_rankings, RETRIEVAL_CANDIDATES
+from benchmarks.standins import HashingEmbedder
+from benchmarks.synthetic import generate_contract
+
+
+def hit_rate(rankings, chunks, facts) -> float:
+    hits = sum(
+        1 for ranking, (_, sentence) in zip(rankings, facts)
+        if any(sentence in chunks[i].text for i in ranking)
+    )
+    return round(hits / len(facts), 3)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=50)
+    parser.add_argument("--top-k", type=int, nargs="+", default=[1, 3, 5])
+    parser.add_argument("--candidates", type=int, default=RETRIEVAL_CANDIDATES,
+                        help="ids ranked per list before fusion (RETRIEVAL_CANDIDATES)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--model", action="store_true", help="use the real SentenceTransformer")
+    args = parser.parse_args()
+
+    pages, facts = generate_contract(args.pages, args.seed)
+    chunks = list(chunk_pages(pages))
+    ids = [str(i) for i in range(len(chunks))]
+    queries = [query for query, _ in facts]
+    if args.model:
+        from app.services.embeddings import get_model
+        model = get_model()
+    else:
+        model = HashingEmbedder()
+
+    matrix = np.asarray(model.encode([c.text for c in chunks]), dtype=np.float32)
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True) + 1e-12
+    vectors = np.asarray(model.encode(queries), dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-12
+    dense = [list(np.argsort(-row)) for row in vectors @ matrix.T]
+
+    with tempfile.TemporaryDirectory() as root:
+        store = LexicalIndex(root)
+        t0 = time.perf_counter()
+        store.put("doc", list(zip(ids, (c.text for c in chunks))))
+        build_ms = (time.perf_counter() - t0) * 1000
+        index_bytes = os.path.getsize(os.path.join(root, "doc.npz"))
+        t0 = time.perf_counter()
+        store.search("doc", queries[0], 1)
+        load_ms = (time.perf_counter() - t0) * 1000
+
+        top = max(max(args.top_k), args.candidates)
+        latencies = []
+        lexical = []
+        for query in queries:
+            t0 = time.perf_counter()
+            lexical.append([int(i) for i in store.search("doc", query, top)])
+            latencies.append(time.perf_counter() - t0)
+
+    rows = []
+    for k in args.top_k:
+        depth = max(k, args.candidates)
+        hybrid = [
+            [int(i) for i in fuse_rankings([[str(i) for i in d[:depth]], [str(i) for i in b[:depth]]], k)]
+            for d, b in zip(dense, lexical)
+        ]
+        rows.append({
+            "top_k": k,
+            "dense_hit_rate": hit_rate([d[:k] for d in dense], chunks, facts),
+            "bm25_hit_rate": hit_rate([b[:k] for b in lexical], chunks, facts),
+            "hybrid_hit_rate": hit_rate(hybrid, chunks, facts),
+        })
+
+    print(json.dumps({
+        "chunks": len(chunks),
+        "queries": len(queries),
+        "index": {
+            "build_ms": round(build_ms, 2),
+            "bytes": index_bytes,
+            "terms": len(DocIndex.build(list(zip(ids, (c.text for c in chunks)))).terms),
+            "first_load_ms": round(load_ms, 3),
+        },
+        "lexical_query_us": {
+            "p50": round(float(np.percentile(latencies, 50)) * 1e6, 1),
+            "p95": round(float(np.percentile(latencies, 95)) * 1e6, 1),
+        },
+        "hit_rate": rows,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Parity check and latency/throughput benchmark for the optimized CPU
+model backends (MODEL_BACKEND=int8|onnx) against the PyTorch baseline.
+
+    python -m benchmarks.bench_models --backend int8
+    python -m benchmarks.bench_models --backend onnx --texts 256
+
+Exits non-zero if embeddings or classifier outputs drift beyond the
+given tolerances, so it can gate a backend switch.
+"""
+import argparse
+import json
+import sys
+import time
+import numpy as np
+
+from app.services.classifier import LABELS
+from app.services.model_backend import load_sentence_transformer, load_zero_shot_pipeline, BACKENDS
+from benchmarks.synthetic import generate_contract
+
+EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+CLASSIFIER_MODEL = "typeform/distilbert-base-uncased-mnli"
+
+
+def timed(fn, repeats):
+    latencies = []
+    result = None
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        result = fn()
+        latencies.append((time.perf_counter() - t0) * 1000)
+    return result, latencies
+
+
+def summarize(latencies, items):
+    latencies = np.asarray(latencies)
+    return {
+        "p50_ms": round(float(np.percentile(latencies, 50)), 2),
+        "p95_ms": round(float(np.percentile(latencies, 95)), 2),
+        "items_per_s": round(items * 1000 / float(latencies.mean()), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--backend", choices=[b for b in BACKENDS if b != "torch"], default="int8")
+    parser.add_argument("--texts", type=int, default=128)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--min-cosine", type=float, default=0.99)
+    parser.add_argument("--max-score-diff", type=float, default=0.05)
+    args = parser.parse_args()
+
+    pages, _ = generate_contract(pages=max(4, args.texts // 8))
+    texts = [p[:800] for p in pages][:args.texts]
+    while len(texts) < args.texts:
+        texts += texts[:args.texts - len(texts)]
+
+    report = {"backend": args.backend, "texts": len(texts)}
+    failures = []
+
+    # Embeddings
+    encoders = {name: load_sentence_transformer(EMBEDDING_MODEL, name) for name in ("torch", args.backend)}
+    vectors = {}
+    for name, model in encoders.items():
+        model.encode(texts[:8])  # warm-up
+        vectors[name], latencies = timed(lambda: model.encode(texts, batch_size=64), args.repeats)
+        report[f"embedding_{name}"] = summarize(latencies, len(texts))
+    a, b = (np.asarray(vectors[n], dtype=np.float32) for n in ("torch", args.backend))
+    cosine = (a * b).sum(axis=1) / (np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1))
+    report["embedding_min_cosine"] = round(float(cosine.min()), 5)
+    if cosine.min() < args.min_cosine:
+        failures.append(f"embedding cosine {cosine.min():.4f} < {args.min_cosine}")
+
+    # Zero-shot classifier
+    classifiers = {name: load_zero_shot_pipeline(CLASSIFIER_MODEL, name) for name in ("torch", args.backend)}
+    samples = texts[:min(16, len(texts))]
+    outputs = {}
+    for name, clf in classifiers.items():
+        clf(samples[0][:1500], LABELS)  # warm-up
+        outputs[name], latencies = timed(lambda: [clf(t[:1500], LABELS) for t in samples], max(1, args.repeats // 2))
+        report[f"classifier_{name}"] = summarize(latencies, len(samples))
+    label_mismatches = 0
+    max_diff = 0.0
+    for ref, opt in zip(outputs["torch"], outputs[args.backend]):
+        if ref["labels"][0] != opt["labels"][0]:
+            label_mismatches += 1
+        ref_scores = dict(zip(ref["labels"], ref["scores"]))
+        opt_scores = dict(zip(opt["labels"], opt["scores"]))
+        max_diff = max(max_diff, max(abs(ref_scores[l] - opt_scores[l]) for l in LABELS))
+    report["classifier_label_mismatches"] = label_mismatches
+    report["classifier_max_score_diff"] = round(max_diff, 4)
+    if label_mismatches:
+        failures.append(f"{label_mismatches} classifier label mismatches")
+    if max_diff > args.max_score_diff:
+        failures.append(f"classifier score diff {max_diff:.4f} > {args.max_score_diff}")
+
+    report["parity"] = "ok" if not failures else failures
+    print(json.dumps(report, indent=2))
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+"""
+End-to-end benchmark and load test for the upload -> analyze pipeline.
+
+Drives each stage directly (parse_pdf, store_embeddings,
+retrieve_agent_contexts, the agent graph, generate_report) and then
+the HTTP surface (/upload, /analyze, /batch-analyze) through the ASGI
+app, on synthetic contracts. Models and the vector store are replaced
+by local stand-ins unless --real-models is given.
+
+    python -m benchmarks.bench_pipeline --pages 10 50 --iterations 20
+    python -m benchmarks.bench_pipeline --save benchmarks/baselines/local.json
+    python -m benchmarks.bench_pipeline --compare benchmarks/baselines/local.json
+
+Reports p50/p95/p99 latency, throughput and peak RSS per stage.
+--compare exits non-zero when any stage's p95 regresses by more than
+--threshold. The HTTP stages need `httpx`.
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+import numpy as np
+
+from benchmarks.standins import install_standins
+from benchmarks.synthetic import generate_contract, make_pdf
+
+
+def _reset_peak_rss() -> bool:
+    # Linux: writing 5 to clear_refs resets VmHWM, giving per-stage peaks
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _peak_rss_mb() -> float:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+class Stage:
+    """
+    Collects latencies for one named stage.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.latencies = []
+        self.wall = 0.0
+        self.peak_rss_mb = 0.0
+
+    def summary(self) -> dict:
+        lat = np.asarray(self.latencies)
+        return {
+            "count": len(lat),
+            "p50_ms": round(float(np.percentile(lat, 50)), 3),
+            "p95_ms": round(float(np.percentile(lat, 95)), 3),
+            "p99_ms": round(float(np.percentile(lat, 99)), 3),
+            "throughput_per_s": round(len(lat) / self.wall, 2) if self.wall else None,
+            "peak_rss_mb": round(self.peak_rss_mb, 1),
+        }
+
+
+def measure(stages: dict, name: str, fn, iterations: int):
+    stage = stages.setdefault(name, Stage(name))
+    _reset_peak_rss()
+    started = time.perf_counter()
+    result = None
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        result = fn()
+        stage.latencies.append((time.perf_counter() - t0) * 1000)
+    stage.wall += time.perf_counter() - started
+    stage.peak_rss_mb = max(stage.peak_rss_mb, _peak_rss_mb())
+    return result
+
+
+async def measure_async(stages: dict, name: str, make_coro, iterations: int, concurrency: int = 1):
+    stage = stages.setdefault(name, Stage(name))
+    _reset_peak_rss()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            t0 = time.perf_counter()
+            result = await make_coro()
+            stage.latencies.append((time.perf_counter() - t0) * 1000)
+            return result
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(one() for _ in range(iterations)))
+    stage.wall += time.perf_counter() - started
+    stage.peak_rss_mb = max(stage.peak_rss_mb, _peak_rss_mb())
+    return results
+
+
+def bench_services(stages: dict, page_counts, iterations: int):
+    from app.services.parser import parse_pdf
+    from app.services.embeddings import store_embeddings
+    from app.services.retriever import retrieve_agent_contexts
+    from app.services.report_generator import generate_report
+    from app.graph.contract_graph import contract_graph
+
+    for pages in page_counts:
+        page_texts, _ = generate_contract(pages, seed=pages)
+        pdf = make_pdf(page_texts)
+        suffix = f"[{pages}p]"
+
+        text = measure(stages, f"parse_pdf{suffix}",
+                       lambda: parse_pdf(SimpleNamespace(file=io.BytesIO(pdf))), iterations)
+        doc_id = f"bench-{pages}"
+        measure(stages, f"store_embeddings{suffix}", lambda: store_embeddings(text, doc_id), iterations)
+        contexts = measure(stages, f"retrieve_context{suffix}", lambda: retrieve_agent_contexts(doc_id), iterations)
+
+        run = measure(
+            stages, f"agents{suffix}",
+            lambda: asyncio.run(contract_graph.run(doc_id, contexts, persist=False, use_cache=False)),
+            iterations
+        )
+        results = run["results"]
+        measure(stages, f"generate_report{suffix}", lambda: generate_report(**results), iterations)
+
+
+async def bench_http(stages: dict, page_counts, iterations: int, concurrency: int, batch_size: int):
+    import httpx
+    from app.main import app
+
+    for handler in app.router.on_startup:
+        await handler()
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=300) as client:
+        while (await client.get("/ready")).status_code != 200:
+            await asyncio.sleep(0.05)
+        for pages in page_counts:
+            suffix = f"[{pages}p]"
+            counter = iter(range(10 ** 9))
+            doc_ids = []
+
+            async def upload():
+                # Distinct seeds so the dedup cache doesn't short-circuit the upload
+                pdf = make_pdf(generate_contract(pages, seed=1000 + next(counter))[0])
+                response = await client.post("/upload", files={"file": ("bench.pdf", pdf, "application/pdf")})
+                response.raise_for_status()
+                doc_ids.append(response.json()["doc_id"])
+
+            await measure_async(stages, f"POST /upload{suffix}", upload, iterations, concurrency)
+
+            async def analyze():
+                doc_id = doc_ids[next(counter) % len(doc_ids)]
+                response = await client.post("/analyze", params={"doc_id": doc_id})
+                response.raise_for_status()
+
+            await measure_async(stages, f"POST /analyze{suffix}", analyze, iterations, concurrency)
+
+            async def batch():
+                response = await client.post("/batch-analyze", json=doc_ids[:batch_size])
+                response.raise_for_status()
+
+            await measure_async(stages, f"POST /batch-analyze{suffix}", batch, max(1, iterations // 5), 1)
+
+
+def compare(current: dict, baseline: dict, threshold: float) -> list:
+    regressions = []
+    for name, stats in current["stages"].items():
+        base = baseline.get("stages", {}).get(name)
+        if not base or not base.get("p95_ms"):
+            continue
+        change = (stats["p95_ms"] - base["p95_ms"]) / base["p95_ms"]
+        stats["p95_change"] = round(change, 3)
+        if change > threshold:
+            regressions.append(f"{name}: p95 {base['p95_ms']}ms -> {stats['p95_ms']}ms (+{change:.0%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, nargs="+", default=[10, 50])
+    parser.add_argument("--iterations", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, default=4, help="concurrent HTTP requests")
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--skip-http", action="store_true")
+    parser.add_argument("--real-models", action="store_true", help="use the configured models and vector store")
+    parser.add_argument("--save", help="write results as a JSON baseline")
+    parser.add_argument("--compare", help="baseline JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed p95 regression ratio")
+    args = parser.parse_args()
+
+    save = os.path.abspath(args.save) if args.save else None
+    baseline_path = os.path.abspath(args.compare) if args.compare else None
+    workdir = tempfile.mkdtemp(prefix="clausesense-bench-")
+    if args.real_models:
+        os.chdir(workdir)
+    else:
+        install_standins(workdir)
+
+    stages = {}
+    bench_services(stages, args.pages, args.iterations)
+    if not args.skip_http:
+        asyncio.run(bench_http(stages, args.pages, args.iterations, args.concurrency, args.batch_size))
+
+    report = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "standins": not args.real_models,
+        "pages": args.pages,
+        "iterations": args.iterations,
+        "per_stage_peak_rss": _reset_peak_rss(),
+        "stages": {name: stage.summary() for name, stage in stages.items()},
+    }
+
+    regressions = []
+    if baseline_path:
+        with open(baseline_path) as f:
+            regressions = compare(report, json.load(f), args.threshold)
+        report["regressions"] = regressions
+
+    print(json.dumps(report, indent=2))
+    if save:
+        os.makedirs(os.path.dirname(save) or ".", exist_ok=True)
+        with open(save, "w") as f:
+            json.dump(report, f, indent=2)
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+Report rendering time for analyses with many findings: the compiled
+templates in every format against the previous string-concatenating
+generator (kept here as the baseline), plus the time to the first
+streamed piece.
+
+    python -m benchmarks.bench_report --findings 100 1000 10000 50000
+
+Findings are spread evenly over every list field of the four agent
+results; each is a clause-evidence-sized string. The text output of the
+new renderer is checked against the baseline before timing.
+"""
+import argparse
+import datetime
+import json
+import time
+
+from app.services.report_generator import REPORT_FORMATS, ReportRenderer, compile_template, generate_report
+
+FIELDS = {
+    "legal": ["key_findings", "risks", "categories", "clauses"],
+    "finance": ["used_legal_findings", "key_terms", "financial_risks", "clauses"],
+    "compliance": ["checks_performed", "compliance_risks", "clauses"],
+    "operations": ["optimization_suggestions", "operational_risks", "clauses"],
+}
+
+
+def make_sections(findings: int) -> dict:
+    per_field = max(1, findings // sum(len(f) for f in FIELDS.values()))
+    sections = {}
+    for domain, fields in FIELDS.items():
+        content = {"agent": domain.title()}
+        for field in fields:
+            content[field] = [
+                f"{field} {i}: Either party may terminate this Agreement by giving {i} days written notice (p. {i % 40})"
+                for i in range(per_field)
+            ]
+        sections[domain] = content
+    return sections
+
+
+def legacy_report(legal, finance, compliance, operations, tone="formal", focus="full", structure="structured"):
+    # The generator as it was before templates, for comparison
+    sections = {"legal": legal, "finance": finance, "compliance": compliance, "operations": operations}
+    if focus != "full" and focus in sections:
+        sections = {focus: sections[focus]}
+    timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    titles = {
+        "formal": "Comprehensive Contract Analysis Report",
+        "concise": "Contract Summary Brief",
+        "executive": "Executive Risk & Opportunity Overview",
+        "risk-focused": "High-Priority Risk Assessment Report"
+    }
+    title = titles.get(tone, titles["formal"])
+    report = f"{'='*60}\n"
+    report += f"{title.upper()}\n"
+    report += f"Generated on: {timestamp}\n"
+    report += f"{'='*60}\n\n"
+    intros = {
+        "formal": "This report provides a detailed multi-domain analysis of the contractual agreement, covering legal, financial, compliance, and operational aspects.",
+        "concise": "High-level summary of key contract points and risks.",
+        "executive": "Strategic overview of the contract's impact on business operations and financial stability.",
+        "risk-focused": "Critical focus on liability, compliance failures, and financial exposure identified in the contract."
+    }
+    report += intros.get(tone, intros["formal"]) + "\n\n"
+    for domain, content in sections.items():
+        report += f"[{domain.upper()} ANALYSIS]\n"
+        report += f"{'-'*len(domain) + '-----------'}\n"
+        for key, value in content.items():
+            prefix = "• " if structure == "bulleted" else ""
+            label = key.replace('_', ' ').title()
+            if isinstance(value, list):
+                report += f"{prefix}{label}:\n"
+                for item in value:
+                    report += f"  - {item}\n"
+            else:
+                report += f"{prefix}{label}: {value}\n"
+        report += "\n"
+    if tone in ["executive", "formal"]:
+        report += f"{'='*60}\n"
+        report += "EXECUTIVE SUMMARY & RECOMMENDATIONS\n"
+        report += f"{'='*60}\n"
+        risk_count = 0
+        for data in sections.values():
+            for k, v in data.items():
+                if "risk" in k.lower() and isinstance(v, list):
+                    risk_count += len(v)
+        if risk_count > 5:
+            report += "STATUS: HIGH ATTENTION REQUIRED\n"
+            report += "Recommendation: Re-negotiate key liability and termination clauses before proceeding.\n"
+        elif risk_count > 2:
+            report += "STATUS: MODERATE RISK\n"
+            report += "Recommendation: Proceed with caution; ensure all compliance documentation is in order.\n"
+        else:
+            report += "STATUS: LOW RISK\n"
+            report += "Recommendation: Contract appears standard. Proceed to standard review board.\n"
+    return report
+
+
+def best_ms(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return round(best * 1000, 3)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--findings", type=int, nargs="+", default=[100, 1000, 10000, 50000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rows = []
+    for findings in args.findings:
+        sections = make_sections(findings)
+
+        def without_timestamp(report):
+            return [line for line in report.splitlines() if not line.startswith("Generated on:")]
+        if without_timestamp(legacy_report(**sections)) != without_timestamp(generate_report(**sections)):
+            raise SystemExit(f"text report differs from the baseline at {findings} findings")
+
+        row = {"findings": findings, "legacy_text_ms": best_ms(lambda: legacy_report(**sections), args.repeat)}
+        for fmt in REPORT_FORMATS:
+            row[f"{fmt}_ms"] = best_ms(lambda: generate_report(**sections, format=fmt), args.repeat)
+            row[f"{fmt}_kb"] = round(len(generate_report(**sections, format=fmt).encode()) / 1024, 1)
+
+        def first_piece():
+            renderer = ReportRenderer(compile_template("formal", "structured", "full", "text"))
+            renderer.begin()
+            renderer.section("legal", sections["legal"])
+        row["stream_first_section_ms"] = best_ms(first_piece, args.repeat)
+        json.loads(generate_report(**sections, format="json"))
+        rows.append(row)
+
+    print(json.dumps(rows, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Clause-rule scanning cost as the rule set grows: the compiled trie
+pattern (one pass for all rules) against a flat alternation of the same
+terms and against scanning once per rule.
+
+    python -m benchmarks.bench_rules --pages 100 --rules 100 1000 5000 --regex 0 100
+
+Synthetic rules are random 2-4 word phrases over a legal vocabulary
+plus the default rules from app/rules/contract_rules.json, so the
+document produces real hits. --regex adds that many synthetic regex
+rules ("<word> <number> <word>"), which are pre-filtered by their
+literals rather than scanned one by one. Per-rule scanning is skipped above
+--per-rule-limit rules because it takes too long to be useful.
+"""
+import argparse
+import json
+import random
+import re
+import time
+
+from app.services.rule_engine import RULES_FILE, RuleSet, _normalise
+from benchmarks.synthetic import generate_contract
+
+VOCABULARY = (
+    "agreement party parties supplier client services fees payment invoice term termination notice "
+    "liability damages indemnify claims confidential information data breach law court renewal "
+    "period days months written consent breach remedy cure obligations warranty insurance audit "
+    "records subcontractor service level credit uptime availability delivery acceptance change "
+    "order schedule price increase tax penalty interest assignment control transfer export"
+).split()
+
+
+def synthetic_rules(count: int, regexes: int = 0, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    with open(RULES_FILE) as f:
+        rules = json.load(f)
+    agents = ["legal", "finance", "compliance", "operations"]
+    for i in range(max(0, count - len(rules))):
+        terms = [" ".join(rng.choice(VOCABULARY) for _ in range(rng.randint(2, 4))) for _ in range(3)]
+        rules.append({"id": f"synthetic_{i}", "agent": rng.choice(agents), "finding": f"Synthetic rule {i}",
+                      "terms": terms})
+    for i in range(regexes):
+        first, second = rng.choice(VOCABULARY), rng.choice(VOCABULARY)
+        rules.append({"id": f"synthetic_regex_{i}", "agent": rng.choice(agents), "finding": f"Synthetic regex {i}",
+                      "regex": [rf"\b{first}\s+\(?\d+\)?\s+{second}"]})
+    return rules
+
+
+def best_of(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=100)
+    parser.add_argument("--rules", type=int, nargs="+", default=[100, 1000, 5000])
+    parser.add_argument("--regex", type=int, nargs="+", default=[0, 100])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--per-rule-limit", type=int, default=1000)
+    args = parser.parse_args()
+
+    pages, _ = generate_contract(args.pages, seed=3)
+    text = "".join(pages)
+    rows = []
+    for count, regexes in ((c, r) for c in args.rules for r in args.regex):
+        rules = synthetic_rules(count, regexes)
+
+        t0 = time.perf_counter()
+        ruleset = RuleSet(rules)
+        compile_s = time.perf_counter() - t0
+        hits = ruleset.scan(text)
+        trie_s = best_of(lambda: ruleset.scan(text), args.repeat)
+
+        terms = sorted({_normalise(t) for rule in rules for t in rule.get("terms", [])}, key=len, reverse=True)
+        flat = re.compile(r"(?<!\w)(?:" + "|".join(re.escape(t).replace(r"\ ", r"\s+") for t in terms) + r")(?!\w)",
+                          re.IGNORECASE)
+        flat_s = best_of(lambda: sum(1 for _ in flat.finditer(text)), args.repeat)
+
+        row = {
+            "rules": len(rules),
+            "regex_rules": regexes,
+            "terms": len(terms),
+            "text_chars": len(text),
+            "hits": len(hits),
+            "compile_ms": round(compile_s * 1000, 1),
+            "trie_scan_ms": round(trie_s * 1000, 2),
+            "flat_alternation_scan_ms": round(flat_s * 1000, 2),
+            "trie_mb_per_s": round(len(text) / trie_s / 1e6, 1),
+        }
+        if len(rules) <= args.per_rule_limit:
+            patterns = [re.compile(r"(?<!\w)(?:" + "|".join(re.escape(_normalise(t)).replace(r"\ ", r"\s+")
+                                                           for t in rule.get("terms", [])) + r")(?!\w)",
+                                   re.IGNORECASE)
+                        for rule in rules if rule.get("terms")]
+            row["per_rule_scan_ms"] = round(
+                best_of(lambda: sum(1 for p in patterns for _ in p.finditer(text)), 1) * 1000, 2
+            )
+        rows.append(row)
+
+    print(json.dumps(rows, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Corpus search latency and recall of the IVF index against exact search
+as the corpus grows.
+
+    python -m benchmarks.bench_search --sizes 10000 100000 --queries 200
+    python -m benchmarks.bench_search --sizes 1000000 --nprobe 8 16
+
+Vectors are synthetic 384-d unit rows drawn around rows/200 random
+"clause" centres so neighbourhoods look like real embedding space.
+Rows go through CorpusIndex.add() in 100-vector batches (as they do
+during indexing) into a scratch SQLite file; exact search is a full
+float32 matrix product over the same rows.
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from app.services import corpus_index
+
+
+def clustered(count: int, centre_rows: np.ndarray, rng) -> np.ndarray:
+    rows = centre_rows[rng.integers(0, len(centre_rows), size=count)].copy()
+    rows += 0.6 * rng.standard_normal(rows.shape).astype(np.float32)
+    return rows / np.linalg.norm(rows, axis=1, keepdims=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[4, 8, 16])
+    parser.add_argument("--docs", type=int, default=500, help="documents the rows are spread over")
+    args = parser.parse_args()
+
+    rows_out = []
+    for size in args.sizes:
+        rng = np.random.default_rng(size)
+        centres = rng.standard_normal((max(16, size // 200), args.dim)).astype(np.float32)
+        matrix = clustered(size, centres, rng)
+        queries = clustered(args.queries, centres, rng)
+
+        corpus_index.CORPUS_INDEX_DB = os.path.join(tempfile.mkdtemp(prefix="clausesense-search-"), "corpus.db")
+        corpus_index._local.conn = None
+        index = corpus_index.CorpusIndex()
+
+        t0 = time.perf_counter()
+        per_doc = max(1, size // args.docs)
+        for start in range(0, size, 100):
+            doc_id = f"doc{start // per_doc}"
+            index.add(doc_id, [{"id": f"{doc_id}_{start + i}", "values": row}
+                               for i, row in enumerate(matrix[start:start + 100])])
+        add_s = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        index._sync()
+        # Training runs in the background; wait for the trained lists
+        index.wait_for_rebuild()
+        load_s = time.perf_counter() - t0
+
+        exact_latency, exact_ids = [], []
+        for query in queries:
+            t0 = time.perf_counter()
+            scores = matrix @ query
+            top = np.argpartition(-scores, args.top_k)[:args.top_k]
+            exact_latency.append(time.perf_counter() - t0)
+            exact_ids.append({int(i) + 1 for i in top})  # SQLite rows start at 1
+
+        for nprobe in args.nprobe:
+            latency, recall = [], []
+            for query, truth in zip(queries, exact_ids):
+                t0 = time.perf_counter()
+                result = index.search(query, top_k=args.top_k, per_doc=0, nprobe=nprobe)
+                latency.append(time.perf_counter() - t0)
+                found = {int(m["id"].rsplit("_", 1)[1]) + 1 for m in result["matches"]}
+                recall.append(len(found & truth) / len(truth))
+            stats = index.stats()
+            rows_out.append({
+                "rows": size,
+                "lists": stats["lists"],
+                "nprobe": nprobe,
+                "add_vectors_per_s": int(size / add_s),
+                "load_and_train_s": round(load_s, 2),
+                "exact_p50_ms": round(float(np.percentile(exact_latency, 50)) * 1000, 2),
+                "ivf_p50_ms": round(float(np.percentile(latency, 50)) * 1000, 2),
+                "ivf_p95_ms": round(float(np.percentile(latency, 95)) * 1000, 2),
+                f"recall@{args.top_k}": round(float(np.mean(recall)), 4),
+                "memory_mb": stats["memory_mb"],
+            })
+
+    print(json.dumps(rows_out, indent=2))
+
+
+if __name__ == "__main__":
+    main()
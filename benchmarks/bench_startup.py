@@ -0,0 +1,154 @@
+"""
+Cold-start time and per-worker memory of a multi-worker deployment,
+with and without preloading the models in the parent process.
+
+    python -m benchmarks.bench_startup --workers 4
+    python -m benchmarks.bench_startup --workers 4 --modes uvicorn preload
+
+Modes:
+    uvicorn  - `uvicorn --workers N`: every worker loads its own models
+    gunicorn - gunicorn.conf.py with PRELOAD_MODELS=0 (same, under gunicorn)
+    preload  - gunicorn.conf.py with PRELOAD_MODELS=1: weights are loaded
+               once in the master and shared copy-on-write
+
+For each mode the server is started in a scratch directory, /ready is
+polled until it answers 200, and the RSS/PSS of the master and every
+worker is read from /proc. Summed PSS is the real footprint; summed RSS
+counts shared pages once per process. Linux only; needs the real model
+dependencies, gunicorn and httpx. VECTOR_STORE defaults to "local" so no
+Pinecone account is needed.
+"""
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _children(pid: int) -> list:
+    found = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # The command name may contain spaces; ppid follows the ")"
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        if ppid == pid:
+            found.append(int(entry))
+            found.extend(_children(int(entry)))
+    return found
+
+
+def _memory(pid: int) -> dict:
+    usage = {"rss_mb": 0.0, "pss_mb": 0.0, "shared_mb": 0.0}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                key, _, rest = line.partition(":")
+                value = int(rest.split()[0]) / 1024 if rest.strip() else 0
+                if key == "Rss":
+                    usage["rss_mb"] += value
+                elif key == "Pss":
+                    usage["pss_mb"] += value
+                elif key in ("Shared_Clean", "Shared_Dirty"):
+                    usage["shared_mb"] += value
+    except OSError:
+        pass
+    return {key: round(value, 1) for key, value in usage.items()}
+
+
+def _command(mode: str, workers: int, port: int) -> list:
+    if mode == "uvicorn":
+        return [sys.executable, "-m", "uvicorn", "app.main:app",
+                "--port", str(port), "--workers", str(workers)]
+    return [sys.executable, "-m", "gunicorn", "app.main:app",
+            "-c", os.path.join(REPO, "gunicorn.conf.py"),
+            "--bind", f"127.0.0.1:{port}", "--workers", str(workers)]
+
+
+def run_mode(mode: str, workers: int, port: int, timeout: float, settle: float) -> dict:
+    env = dict(os.environ)
+    env["PYTHONPATH"] = REPO + os.pathsep + env.get("PYTHONPATH", "")
+    env.setdefault("VECTOR_STORE", "local")
+    env["PRELOAD_MODELS"] = "1" if mode == "preload" else "0"
+    workdir = tempfile.mkdtemp(prefix=f"clausesense-startup-{mode}-")
+
+    started = time.perf_counter()
+    server = subprocess.Popen(_command(mode, workers, port), cwd=workdir, env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{port}/ready"
+    first_ready = None
+    per_worker = {}
+    try:
+        with httpx.Client(timeout=5) as client:
+            deadline = time.perf_counter() + timeout
+            # Keep polling after the first 200 to hear from as many workers as possible
+            while time.perf_counter() < deadline:
+                if first_ready is not None and (
+                    len(per_worker) >= workers or time.perf_counter() - started - first_ready > settle
+                ):
+                    break
+                try:
+                    response = client.get(url)
+                except httpx.HTTPError:
+                    time.sleep(0.2)
+                    continue
+                body = response.json()
+                if response.status_code == 200:
+                    if first_ready is None:
+                        first_ready = time.perf_counter() - started
+                    per_worker[body["pid"]] = body["cold_start_seconds"]
+                time.sleep(0.05)
+
+        processes = {"master": _memory(server.pid)}
+        for pid in _children(server.pid):
+            processes[str(pid)] = _memory(pid)
+    finally:
+        server.send_signal(signal.SIGTERM)
+        try:
+            server.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            server.kill()
+
+    return {
+        "mode": mode,
+        "workers": workers,
+        "first_ready_seconds": round(first_ready, 2) if first_ready is not None else None,
+        "worker_cold_start_seconds": per_worker,
+        "processes": processes,
+        "total_rss_mb": round(sum(p["rss_mb"] for p in processes.values()), 1),
+        "total_pss_mb": round(sum(p["pss_mb"] for p in processes.values()), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--modes", nargs="+", default=["uvicorn", "preload"],
+                        choices=["uvicorn", "gunicorn", "preload"])
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--timeout", type=float, default=600, help="seconds to wait for /ready")
+    parser.add_argument("--settle", type=float, default=30, help="extra seconds to wait for every worker")
+    args = parser.parse_args()
+
+    results = [run_mode(mode, args.workers, args.port, args.timeout, args.settle) for mode in args.modes]
+    print(json.dumps(results, indent=2))
+    print()
+    print(f"{'mode':<10}{'ready s':>10}{'total RSS MB':>15}{'total PSS MB':>15}")
+    for result in results:
+        print(f"{result['mode']:<10}{str(result['first_ready_seconds']):>10}"
+              f"{result['total_rss_mb']:>15}{result['total_pss_mb']:>15}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Storage size, query latency, recall and per-query payload of the local
+index layouts: float32 rows with chunk text in metadata (the old
+layout) against float32/float16/int8 rows with text in the text store.
+
+    python -m benchmarks.bench_storage --pages 200 --queries 200
+
+Recall@k is measured against exact float32 scores. "payload" is the
+JSON size of one query's results plus, for the new layouts, the text of
+the chunks that are actually used.
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from app.services.chunker import chunk_pages
+from app.services.text_store import TextStore
+from app.services.vector_store import LocalVectorStore
+from benchmarks.standins import HashingEmbedder
+from benchmarks.synthetic import generate_contract
+
+
+def dir_bytes(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=5)
+    args = parser.parse_args()
+
+    pages, facts = generate_contract(args.pages, seed=7)
+    chunks = list(chunk_pages(pages))
+    embedder = HashingEmbedder()
+    matrix = np.asarray(embedder.encode([c.text for c in chunks]), dtype=np.float32)
+    queries = np.asarray(embedder.encode([query for query, _ in facts][:args.queries]), dtype=np.float32)
+    doc_id = "bench"
+    ids = [f"{doc_id}_{i}" for i in range(len(chunks))]
+
+    def metadata(chunk, with_text):
+        meta = {"doc_id": doc_id, "type": "contract_chunk", "page": chunk.page, "page_end": chunk.page_end,
+                "char_start": chunk.char_start, "char_end": chunk.char_end}
+        if with_text:
+            meta["text"] = chunk.text
+        return meta
+
+    exact = None
+    rows = []
+    layouts = [("float32 + text in metadata", "float32", True), ("float32", "float32", False),
+               ("float16", "float16", False), ("int8", "int8", False)]
+    for label, dtype, text_in_metadata in layouts:
+        root = tempfile.mkdtemp(prefix="clausesense-storage-")
+        store = LocalVectorStore(os.path.join(root, "vectors"), dtype)
+        texts = TextStore(os.path.join(root, "text"))
+        store.upsert([
+            {"id": vid, "values": row, "metadata": metadata(chunk, text_in_metadata)}
+            for vid, row, chunk in zip(ids, matrix, chunks)
+        ])
+        if not text_in_metadata:
+            texts.put(doc_id, [(vid, chunk.text) for vid, chunk in zip(ids, chunks)])
+
+        latencies, payloads, found = [], [], []
+        for query in queries:
+            t0 = time.perf_counter()
+            result = store.query(query, top_k=args.top_k, filter={"doc_id": doc_id}, include_metadata=text_in_metadata)
+            hit_ids = [m["id"] for m in result["matches"]]
+            if text_in_metadata:
+                context = [m["metadata"]["text"] for m in result["matches"]]
+            else:
+                loaded = texts.get(doc_id, hit_ids)
+                context = [loaded[vid] for vid in hit_ids]
+            latencies.append((time.perf_counter() - t0) * 1000)
+            payloads.append(len(json.dumps(result)) + (0 if text_in_metadata else sum(len(t) for t in context)))
+            found.append(hit_ids)
+
+        if exact is None:
+            exact = found
+        recall = np.mean([len(set(a) & set(b)) / len(b) for a, b in zip(found, exact) if b])
+        rows.append({
+            "layout": label,
+            "vectors": len(ids),
+            "vector_bytes": dir_bytes(os.path.join(root, "vectors")),
+            "text_bytes": dir_bytes(os.path.join(root, "text")) if not text_in_metadata else 0,
+            "query_p50_ms": round(float(np.percentile(latencies, 50)), 3),
+            "query_p95_ms": round(float(np.percentile(latencies, 95)), 3),
+            f"recall@{args.top_k}": round(float(recall), 4),
+            "avg_payload_bytes": int(np.mean(payloads)),
+        })
+
+    print(json.dumps(rows, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+Upsert throughput: the old one-batch-at-a-time loop against the bulk
+writer at several in-flight limits, plus single-vector agent writes sent
+one by one versus coalesced.
+
+    python -m benchmarks.bench_upsert
+    python -m benchmarks.bench_upsert --vectors 20000 --rtt-ms 40 --failure-rate 0.05
+    python -m benchmarks.bench_upsert --backend local
+
+The default backend is a remote-service stand-in with a configurable
+round-trip time and transient failure rate; `--backend local` writes
+through LocalVectorStore on disk instead.
+"""
+import argparse
+import json
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from app.services.upsert_writer import BulkWriter, UpsertError
+from app.services.vector_store import LocalVectorStore
+from benchmarks.standins import RemoteStoreStandin
+
+
+def make_vectors(count: int, dim: int, doc_id: str = "bench", seed: int = 0) -> list:
+    rng = np.random.default_rng(seed)
+    matrix = rng.standard_normal((count, dim)).astype(np.float32)
+    return [
+        {"id": f"{doc_id}_{i}", "values": matrix[i], "metadata": {"doc_id": doc_id, "type": "contract_chunk", "text": f"chunk {i}"}}
+        for i in range(count)
+    ]
+
+
+def sequential(store, vectors: list, batch_size: int) -> dict:
+    # The previous store_embeddings behaviour: one request at a time, no retry
+    failed = 0
+    for i in range(0, len(vectors), batch_size):
+        try:
+            store.upsert(vectors[i:i + batch_size])
+        except Exception:
+            failed += len(vectors[i:i + batch_size])
+    return {"failed_vectors": failed}
+
+
+def bulk(store, vectors: list, batch_size: int, in_flight: int) -> dict:
+    writer = BulkWriter(lambda: store, batch_size=batch_size, max_in_flight=in_flight)
+    try:
+        writer.write(vectors)
+        failed = 0
+    except UpsertError as e:
+        failed = len(e.failed_ids)
+    stats = writer.stats()
+    return {"failed_vectors": failed, "retries": stats["retries"]}
+
+
+def small_writes(store, count: int, dim: int, writers: int, coalesce: bool) -> dict:
+    vectors = make_vectors(count, dim, doc_id="agents", seed=1)
+    writer = BulkWriter(lambda: store, max_in_flight=writers) if coalesce else None
+    futures = []
+    dropped = []
+    lock = threading.Lock()
+
+    def worker(part):
+        for vec in part:
+            if writer is not None:
+                future = writer.enqueue(vec)
+                with lock:
+                    futures.append(future)
+            else:
+                try:
+                    store.upsert([vec])
+                except Exception:
+                    with lock:
+                        dropped.append(vec["id"])
+
+    threads = [threading.Thread(target=worker, args=(vectors[i::writers],)) for i in range(writers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    failed = len(dropped)
+    for future in futures:
+        try:
+            future.result()
+        except UpsertError:
+            failed += 1
+    result = {"failed_vectors": failed}
+    if writer is not None:
+        result["avg_coalesced_batch"] = writer.stats()["avg_coalesced_batch"]
+    return result
+
+
+def timed_run(label: str, make_store, fn, count: int) -> dict:
+    store = make_store()
+    started = time.perf_counter()
+    outcome = fn(store)
+    elapsed = time.perf_counter() - started
+    stored = len(store.vectors) if hasattr(store, "vectors") else None
+    return {"case": label, "seconds": round(elapsed, 3), "vectors_per_s": round(count / elapsed, 1),
+            "requests": getattr(store, "requests", None), "stored": stored, **outcome}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vectors", type=int, default=5000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--in-flight", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--small-writes", type=int, default=400, help="single-vector agent writes")
+    parser.add_argument("--writers", type=int, default=8, help="concurrent threads issuing small writes")
+    parser.add_argument("--backend", choices=["remote", "local"], default="remote")
+    parser.add_argument("--rtt-ms", type=float, default=20.0)
+    parser.add_argument("--failure-rate", type=float, default=0.02)
+    args = parser.parse_args()
+
+    if args.backend == "local":
+        def make_store():
+            return LocalVectorStore(tempfile.mkdtemp(prefix="clausesense-upsert-"))
+    else:
+        def make_store():
+            return RemoteStoreStandin(rtt_ms=args.rtt_ms, failure_rate=args.failure_rate)
+
+    vectors = make_vectors(args.vectors, args.dim)
+    results = [timed_run("sequential", make_store, lambda s: sequential(s, vectors, args.batch_size), len(vectors))]
+    for in_flight in args.in_flight:
+        results.append(timed_run(
+            f"bulk in_flight={in_flight}", make_store,
+            lambda s, n=in_flight: bulk(s, vectors, args.batch_size, n), len(vectors)
+        ))
+    results.append(timed_run(
+        "small writes, one request each", make_store,
+        lambda s: small_writes(s, args.small_writes, args.dim, args.writers, coalesce=False), args.small_writes
+    ))
+    results.append(timed_run(
+        "small writes, coalesced", make_store,
+        lambda s: small_writes(s, args.small_writes, args.dim, args.writers, coalesce=True), args.small_writes
+    ))
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Cost of indexing and analysing an amended contract: uploading the new
+version as a fresh document (what /upload used to do) against
+re-indexing it as a version of the original doc_id, which embeds and
+upserts only the changed chunks and re-runs only the agents whose
+clauses changed.
+
+    python -m benchmarks.bench_versions --pages 50 200 --amended 1 5
+
+Runs on the local stand-ins (hashing embedder, local vector index) in a
+scratch directory. An amendment bumps the first number on each of
+`--amended` random pages. The embedding cache is cleared before every
+run so unchanged chunks are not hidden by it.
+"""
+import argparse
+import asyncio
+import json
+import random
+import re
+import tempfile
+import time
+import uuid
+
+from benchmarks.standins import HashingEmbedder, install_standins
+from benchmarks.synthetic import generate_contract
+
+
+class CountingEmbedder(HashingEmbedder):
+    def __init__(self):
+        super().__init__()
+        self.encoded = 0
+
+    def encode(self, sentences, **kwargs):
+        self.encoded += 1 if isinstance(sentences, str) else len(sentences)
+        return super().encode(sentences, **kwargs)
+
+
+def amend(pages: list, count: int, seed: int) -> list:
+    rng = random.Random(seed)
+    amended = list(pages)
+    for i in rng.sample(range(len(pages)), min(count, len(pages))):
+        amended[i] = re.sub(r"\d+", lambda m: str(int(m.group()) + 1), amended[i], count=1)
+    return amended
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, nargs="+", default=[50, 200])
+    parser.add_argument("--amended", type=int, nargs="+", default=[1, 5])
+    args = parser.parse_args()
+
+    install_standins(tempfile.mkdtemp(prefix="clausesense-versions-"))
+    from app.services import embeddings, content_cache
+    from app.services.rule_engine import scan_document, get_rule_hits
+    from app.graph.contract_graph import contract_graph
+
+    model = CountingEmbedder()
+    embeddings._model = model
+
+    def index(pages, doc_id, version):
+        content_cache._conn().execute("DELETE FROM embeddings")
+        content_cache._conn().commit()
+        model.encoded = 0
+        stats = {}
+        t0 = time.perf_counter()
+        embeddings.store_page_embeddings(pages, doc_id, stats=stats)
+        scan_document(doc_id, pages, version)
+        seconds = time.perf_counter() - t0
+        routed = get_rule_hits(doc_id, version)
+        timings = asyncio.run(contract_graph.run(
+            doc_id, {name: {"text": "", "hits": routed.get(name, [])} for name in contract_graph.nodes},
+            persist=False, doc_version=version
+        ))["timings"]
+        ran = sum(1 for name in contract_graph.nodes if not timings[name].get("cached"))
+        return {"index_s": round(seconds, 3), "encoded": model.encoded, "upserted": stats["added"],
+                "deleted": stats["removed"], "agents_run": ran}
+
+    rows = []
+    for pages_count in args.pages:
+        pages, _ = generate_contract(pages_count, seed=pages_count)
+        for amended_count in args.amended:
+            amended = amend(pages, amended_count, seed=amended_count)
+            doc_id = str(uuid.uuid4())
+            index(pages, doc_id, 1)
+            rows.append({
+                "pages": pages_count,
+                "amended_pages": amended_count,
+                "as_new_document": index(amended, str(uuid.uuid4()), 1),
+                "as_version": index(amended, doc_id, 2),
+            })
+
+    print(json.dumps(rows, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+"""
+Local multi-node cluster: N node processes (app.main, each in its own
+scratch directory with its own vector index, caches, job queue and
+history) behind the router (app.router), all on this machine.
+
+    python -m benchmarks.cluster_local --nodes 3 --docs 24 --pages 10
+    python -m benchmarks.cluster_local --nodes 1 3 --docs 24
+    python -m benchmarks.cluster_local --nodes 3 --keep-running
+
+Nodes use the offline stand-ins (hashing embedder, keyword classifier,
+local vector index) unless --real-models is given. Each run uploads
+--docs synthetic contracts through the router and analyzes every
+document. It then re-uploads one (it must deduplicate on its owner),
+runs one batch, a text search and a clause search, and checks that every
+document request reached the node owning its doc_id. Prints timings,
+the per-node document split and the checks. --keep-running leaves the
+cluster up until Ctrl-C.
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+import numpy as np
+
+from benchmarks.synthetic import generate_contract, make_pdf
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def serve_node(port: int, workdir: str, real_models: bool):
+    # Runs in a node process: all relative data paths land in `workdir`
+    if real_models:
+        os.chdir(workdir)
+    else:
+        from benchmarks.standins import install_standins
+        install_standins(workdir)
+    import uvicorn
+    from app.main import app
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning")
+
+
+def start_cluster(nodes: int, real_models: bool):
+    env = dict(os.environ)
+    env["PYTHONPATH"] = REPO + os.pathsep + env.get("PYTHONPATH", "")
+    env.setdefault("VECTOR_STORE", "local")
+    env["CLUSTER_ROUTED"] = "1"
+    processes, urls, workdirs = [], [], []
+    for i in range(nodes):
+        port = free_port()
+        workdir = tempfile.mkdtemp(prefix=f"clausesense-node{i}-")
+        command = [sys.executable, "-m", "benchmarks.cluster_local", "node", "--port", str(port),
+                   "--workdir", workdir] + (["--real-models"] if real_models else [])
+        processes.append(subprocess.Popen(command, cwd=REPO, env=env))
+        urls.append(f"http://127.0.0.1:{port}")
+        workdirs.append(workdir)
+
+    router_port = free_port()
+    router_env = dict(env, CLUSTER_NODES=",".join(urls))
+    router_env.pop("CLUSTER_ROUTED")
+    processes.append(subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.router:app", "--port", str(router_port), "--log-level", "warning"],
+        cwd=REPO, env=router_env
+    ))
+    return f"http://127.0.0.1:{router_port}", urls, processes, workdirs
+
+
+def stop_cluster(processes, workdirs):
+    for process in processes:
+        process.send_signal(signal.SIGTERM)
+    for process in processes:
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+    for workdir in workdirs:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+async def wait_ready(client: httpx.AsyncClient, timeout: float):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        try:
+            if (await client.get("/ready")).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(0.2)
+    raise SystemExit("cluster did not become ready")
+
+
+def percentile_ms(values, q) -> float:
+    return round(float(np.percentile(values, q)) * 1000, 1) if values else None
+
+
+async def workload(router: str, args) -> dict:
+    pdfs = [make_pdf(generate_contract(args.pages, seed=i)[0]) for i in range(args.docs)]
+    limit = asyncio.Semaphore(args.concurrency)
+    async with httpx.AsyncClient(base_url=router, timeout=600) as client:
+        await wait_ready(client, args.ready_timeout)
+
+        async def timed(method, path, **kwargs):
+            async with limit:
+                t0 = time.perf_counter()
+                response = await client.request(method, path, **kwargs)
+                return response, time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        uploads = await asyncio.gather(*(
+            timed("POST", "/upload", files={"file": (f"contract{i}.pdf", pdf, "application/pdf")})
+            for i, pdf in enumerate(pdfs)
+        ))
+        upload_s = time.perf_counter() - t0
+        failed = [r.text for r, _ in uploads if r.status_code != 200]
+        if failed:
+            raise SystemExit(f"upload failed: {failed[0]}")
+        doc_ids = [r.json()["doc_id"] for r, _ in uploads]
+        placed = {doc_id: r.headers["x-cluster-node"] for doc_id, (r, _) in zip(doc_ids, uploads)}
+
+        t0 = time.perf_counter()
+        analyses = await asyncio.gather(*(timed("POST", "/analyze", params={"doc_id": d}) for d in doc_ids))
+        analyze_s = time.perf_counter() - t0
+        owners = {d: (await client.get(f"/cluster/owner/{d}")).json()["node"] for d in doc_ids}
+        routing_ok = all(
+            r.status_code == 200 and r.headers["x-cluster-node"] == owners[d] == placed[d]
+            for d, (r, _) in zip(doc_ids, analyses)
+        )
+
+        # Files deduplicate once indexed, which /analyze has waited for
+        again = await client.post("/upload", files={"file": ("copy.pdf", pdfs[0], "application/pdf")})
+        dedup_ok = again.json().get("deduplicated") is True and again.json()["doc_id"] == doc_ids[0]
+
+        t0 = time.perf_counter()
+        batch = (await client.post("/batch-analyze", json=doc_ids)).json()
+        batch_s = time.perf_counter() - t0
+
+        search_times, search = [], None
+        for _ in range(args.searches):
+            t0 = time.perf_counter()
+            search = await client.post("/search", json={"query": "termination notice period", "top_k": 10})
+            search_times.append(time.perf_counter() - t0)
+        matches = search.json()["matches"]
+        clause = await client.post("/search", json={"clause_id": matches[0]["id"], "top_k": 5}) if matches else None
+
+        per_node = {}
+        for node in placed.values():
+            per_node[node] = per_node.get(node, 0) + 1
+        return {
+            "docs": args.docs,
+            "upload_docs_per_s": round(args.docs / upload_s, 2),
+            "analyze_docs_per_s": round(args.docs / analyze_s, 2),
+            "analyze_p50_ms": percentile_ms([s for _, s in analyses], 50),
+            "analyze_p95_ms": percentile_ms([s for _, s in analyses], 95),
+            "batch_s": round(batch_s, 2),
+            "batch_succeeded": sum(1 for r in batch if isinstance(r, dict) and "analysis" in r),
+            "search_p50_ms": percentile_ms(search_times, 50),
+            "search_nodes_in_top_k": len({m["node"] for m in matches}),
+            "clause_search_status": clause.status_code if clause is not None else None,
+            "docs_per_node": per_node,
+            "checks": {"routing": routing_ok, "dedup": dedup_ok},
+        }
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "node":
+        parser = argparse.ArgumentParser()
+        parser.add_argument("command")
+        parser.add_argument("--port", type=int, required=True)
+        parser.add_argument("--workdir", required=True)
+        parser.add_argument("--real-models", action="store_true")
+        args = parser.parse_args()
+        serve_node(args.port, args.workdir, args.real_models)
+        return
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--nodes", type=int, nargs="+", default=[3])
+    parser.add_argument("--docs", type=int, default=24)
+    parser.add_argument("--pages", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--searches", type=int, default=20)
+    parser.add_argument("--ready-timeout", type=float, default=300)
+    parser.add_argument("--real-models", action="store_true")
+    parser.add_argument("--keep-running", action="store_true")
+    args = parser.parse_args()
+
+    rows = []
+    for nodes in args.nodes:
+        router, urls, processes, workdirs = start_cluster(nodes, args.real_models)
+        try:
+            row = asyncio.run(workload(router, args))
+            row = {"nodes": nodes, **row}
+            rows.append(row)
+            print(json.dumps(row, indent=2), flush=True)
+            if args.keep_running:
+                print(f"Router at {router}, nodes at {', '.join(urls)}; Ctrl-C to stop", flush=True)
+                signal.sigwait([signal.SIGINT, signal.SIGTERM])
+        finally:
+            stop_cluster(processes, workdirs)
+
+    if len(rows) > 1:
+        print(json.dumps(rows, indent=2))
+
+
+if __name__ == "__main__":
+    main()
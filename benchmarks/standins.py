@@ -0,0 +1,101 @@
+"""
+Offline stand-ins used by the benchmarks so they run without model
+downloads or a Pinecone account.
+"""
+import re
+import zlib
+import numpy as np
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+class HashingEmbedder:
+    """
+    Deterministic bag-of-words embedder with the SentenceTransformer
+    `encode` signature. Lexical overlap stands in for semantic
+    similarity, which is enough to compare chunking and retrieval
+    strategies relative to each other.
+    """
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+
+    def _encode_one(self, text: str) -> np.ndarray:
+        vec = np.zeros(self.dim, dtype=np.float32)
+        for word in _WORD.findall(text.lower()):
+            vec[zlib.crc32(word.encode()) % self.dim] += 1.0
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm else vec
+
+    def encode(self, sentences, batch_size: int = 64, show_progress_bar: bool = False, **kwargs):
+        if isinstance(sentences, str):
+            return self._encode_one(sentences)
+        if not sentences:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        return np.vstack([self._encode_one(s) for s in sentences])
+
+
+class KeywordZeroShot:
+    """
+    Zero-shot pipeline stand-in: scores labels by word overlap with the
+    text and returns the transformers pipeline's output shape.
+    """
+
+    def __call__(self, text: str, labels):
+        words = set(_WORD.findall(text.lower()))
+        raw = np.array([1 + len(words & set(_WORD.findall(label.lower()))) for label in labels], dtype=np.float32)
+        scores = raw / raw.sum()
+        order = np.argsort(-scores)
+        return {"labels": [labels[i] for i in order], "scores": [float(scores[i]) for i in order]}
+
+
+def install_standins(workdir: str = None):
+    """
+    Point the app at local stand-ins: the in-process vector index, the
+    hashing embedder and the keyword classifier. All on-disk state goes
+    under `workdir` (the current directory by default). Must run before
+    the app modules create their stores.
+    """
+    import os
+    if workdir:
+        os.makedirs(workdir, exist_ok=True)
+        os.chdir(workdir)
+    os.environ["VECTOR_STORE"] = "local"
+
+    from app.services import vector_store, embeddings, classifier
+    vector_store.VECTOR_STORE = "local"
+    vector_store._store = None
+    embeddings._model = HashingEmbedder()
+    classifier._classifier = KeywordZeroShot()
+
+
+class RemoteStoreStandin:
+    """
+    Vector store that behaves like a remote service: every upsert costs a
+    round trip plus a per-vector transfer time, requests run concurrently
+    (no global lock), and a fraction fail with a transient error. Writes
+    land in a dict so idempotency can be checked afterwards.
+    """
+
+    def __init__(self, rtt_ms: float = 20.0, per_vector_us: float = 50.0, failure_rate: float = 0.0, seed: int = 0):
+        import random
+        import threading
+        self.rtt = rtt_ms / 1000
+        self.per_vector = per_vector_us / 1e6
+        self.failure_rate = failure_rate
+        self.vectors = {}
+        self.requests = 0
+        self.failures = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def upsert(self, vectors: list):
+        import time
+        time.sleep(self.rtt + self.per_vector * len(vectors))
+        with self._lock:
+            self.requests += 1
+            if self._random.random() < self.failure_rate:
+                self.failures += 1
+                raise ConnectionError("simulated transient upsert failure")
+            for vec in vectors:
+                self.vectors[vec["id"]] = vec
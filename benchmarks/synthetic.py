@@ -0,0 +1,110 @@
+"""
+Synthetic contract generator shared by the benchmarks.
+"""
+import random
+
+SECTIONS = [
+    ("TERM AND TERMINATION", "termination notice period", "Either party may terminate this Agreement by giving {n} days written notice to the other party."),
+    ("FEES AND PAYMENT", "payment due date invoices", "All invoices are payable within {n} days of receipt and late payments accrue interest."),
+    ("LIMITATION OF LIABILITY", "liability cap amount", "The aggregate liability of the Supplier is capped at {n} thousand dollars per contract year."),
+    ("INDEMNIFICATION", "indemnify third party claims", "The Supplier shall indemnify the Client against third party claims arising within {n} months."),
+    ("CONFIDENTIALITY", "confidential information survival", "Confidential information must be protected for {n} years after disclosure."),
+    ("DATA PROTECTION", "personal data breach notification", "Any personal data breach must be notified within {n} hours of discovery."),
+    ("SERVICE LEVELS", "uptime service level credits", "The Supplier guarantees {n} percent monthly uptime or service credits apply."),
+    ("GOVERNING LAW", "governing law jurisdiction courts", "This Agreement is governed by the laws of State {n} and its courts."),
+    ("RENEWAL", "automatic renewal term", "This Agreement renews automatically for successive terms of {n} months."),
+    ("FORCE MAJEURE", "force majeure events delay", "Neither party is liable for delays caused by force majeure events lasting under {n} days."),
+]
+
+FILLER = [
+    "The parties acknowledge that this clause has been negotiated in good faith.",
+    "Nothing in this clause limits any other right or remedy available under this Agreement.",
+    "Each party shall bear its own costs in connection with the matters described herein.",
+    "References to a party include its permitted successors and assigns.",
+    "Headings are for convenience only and do not affect interpretation.",
+    "Any notice under this clause shall be given in writing to the address stated above.",
+]
+
+
+def generate_contract(pages: int = 10, seed: int = 0, filler_per_section: int = 12):
+    """
+    Return (page_texts, facts). Each fact is (query, sentence) for a
+    planted clause sentence that a good retriever should surface.
+    """
+    rng = random.Random(seed)
+    lines = ["MASTER SERVICES AGREEMENT", ""]
+    facts = []
+    section_number = 1
+    while len(facts) < pages * 3:
+        title, query, template = SECTIONS[(section_number - 1) % len(SECTIONS)]
+        n = rng.randint(2, 999)
+        fact = template.format(n=n)
+        body = [rng.choice(FILLER) for _ in range(filler_per_section)]
+        body.insert(rng.randint(1, len(body) - 1), fact)
+        lines.append(f"{section_number}. {title}")
+        lines.append(f"{section_number}.1 " + " ".join(body))
+        facts.append((f"{query} {n}", fact))
+        section_number += 1
+
+    text = "\n".join(lines) + "\n"
+    page_size = max(1, len(text) // pages)
+    page_texts = [text[i:i + page_size] for i in range(0, len(text), page_size)]
+    return page_texts, facts
+
+
+def _pdf_escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def make_pdf(page_texts, line_width: int = 95, lines_per_page: int = 64) -> bytes:
+    """
+    Minimal single-font PDF writer so benchmarks don't need a PDF
+    library. Each page text is wrapped at `line_width` characters;
+    overflow beyond `lines_per_page` is dropped.
+    """
+    objects = []
+
+    def add(body: bytes) -> int:
+        objects.append(body)
+        return len(objects)
+
+    font = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    pages_id = len(objects) + 1
+    objects.append(None)  # placeholder for the page tree
+    page_ids = []
+
+    for text in page_texts:
+        lines = []
+        for raw in text.split("\n"):
+            lines.extend(raw[i:i + line_width] for i in range(0, max(len(raw), 1), line_width))
+        lines = lines[:lines_per_page]
+        ops = ["BT", "/F1 8 Tf", "11 TL", "30 810 Td"]
+        ops += [f"({_pdf_escape(line)}) Tj T*" for line in lines]
+        ops.append("ET")
+        stream = "\n".join(ops).encode("latin-1", "replace")
+        content = add(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        page_ids.append(add(
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 %d 0 R >> >> /Contents %d 0 R >>" % (pages_id, font, content)
+        ))
+
+    kids = b" ".join(b"%d 0 R" % pid for pid in page_ids)
+    objects[pages_id - 1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(page_ids))
+    catalog = add(b"<< /Type /Catalog /Pages %d 0 R >>" % pages_id)
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, catalog, xref)
+    return bytes(out)
+
+
+def generate_contract_pdf(pages: int = 10, seed: int = 0) -> bytes:
+    page_texts, _ = generate_contract(pages, seed)
+    return make_pdf(page_texts)
@@ -0,0 +1,34 @@
+"""
+Gunicorn settings for running several uvicorn workers with the model
+weights loaded once in the master and shared with every worker.
+
+    gunicorn app.main:app -c gunicorn.conf.py
+
+PRELOAD_MODELS=0 falls back to each worker loading its own copy.
+"""
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:8001")
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+worker_class = "uvicorn.workers.UvicornWorker"
+# Model loading happens before workers accept requests; /ready gates traffic
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "300"))
+
+PRELOAD_MODELS = os.getenv("PRELOAD_MODELS", "1") not in ("0", "false", "False")
+# Import the app in the master so its module state is inherited by the forks
+preload_app = PRELOAD_MODELS
+
+# Forking after the tokenizers' thread pool has started can deadlock
+os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+
+
+def when_ready(server):
+    # Runs in the master after the app is imported and before any fork
+    if PRELOAD_MODELS:
+        from app.services.warmup import preload
+        preload()
+
+
+def post_fork(server, worker):
+    from app.services.warmup import mark_process_start
+    mark_process_start()